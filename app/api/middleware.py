@@ -0,0 +1,72 @@
+import time
+from urllib.parse import parse_qs
+from ..utils.metrics import metrics_registry
+
+REQUEST_LATENCY = metrics_registry.histogram(
+    "device_service_http_request_duration_seconds",
+    "HTTP request latency (until response headers are sent) by route template, excluding long-polls and streams",
+    ["method", "route", "status"]
+)
+HELD_REQUEST_DURATION = metrics_registry.histogram(
+    "device_service_http_held_request_duration_seconds",
+    "Time until response headers for requests held open by design, by route template and kind (long_poll, stream)",
+    ["route", "kind"],
+    buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 120)
+)
+
+
+def _is_long_poll(scope) -> bool:
+    """帶 wait > 0 的請求（/ProxyStatus 長輪詢）會刻意暫停到狀態變更或逾時"""
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("wait")
+    try:
+        return bool(values) and float(values[-1]) > 0
+    except ValueError:
+        return False
+
+
+class RequestMetricsMiddleware:
+    """記錄每個路由的請求延遲（純 ASGI 中介層，不緩衝回應內容）
+
+    以路由樣板（例如 /ProxyStatus/{proxyid}）作為標籤，避免 proxyid 造成標籤數量爆增；
+    延遲量測到送出回應標頭為止，長連線的串流端點不會被連線時間扭曲。
+    長輪詢（wait > 0）與 SSE 串流（text/event-stream）刻意保持連線，另記到 HELD_REQUEST_DURATION，
+    不混入一般請求的延遲分布；WebSocket 不經過此中介層。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        recorded = False
+
+        long_poll = _is_long_poll(scope)
+
+        def record(status, stream=False):
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            elapsed = time.perf_counter() - started
+            if stream or long_poll:
+                HELD_REQUEST_DURATION.labels(route_path, "stream" if stream else "long_poll").observe(elapsed)
+            else:
+                REQUEST_LATENCY.labels(scope["method"], route_path, str(status)).observe(elapsed)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                record(message["status"], stream=content_type.startswith(b"text/event-stream"))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            record(500)
+            raise
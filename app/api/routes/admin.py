@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from ...config_mqtt import settings
+
+
+def require_admin_endpoints():
+    """管理端點預設關閉，未啟用時視為不存在"""
+    if not settings.ADMIN_ENDPOINTS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+def _profiling():
+    """分析工具模組（cProfile、pstats、tracemalloc）在第一次使用管理端點時才匯入，不計入 app.main 的匯入成本"""
+    from ...utils import profiler
+    return profiler
+
+
+router = APIRouter(dependencies=[Depends(require_admin_endpoints)])
+
+# pstats 可接受的排序欄位（pstats.SortKey 的值）；在分析開始前驗證，避免跑完整段分析才因 KeyError 回傳 500
+_SORT_KEYS = ("calls", "cumulative", "filename", "line", "name", "nfl", "pcalls", "stdname", "time")
+_SORT_PATTERN = "^(" + "|".join(_SORT_KEYS) + ")$"
+
+@router.get("/admin/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10.0, gt=0, description="分析秒數"),
+    mode: str = Query("sampling", pattern="^(sampling|cprofile)$",
+                      description="sampling：所有執行緒的取樣（collapsed stack）；cprofile：事件迴圈執行緒（pstats）"),
+    interval_ms: float = Query(5.0, ge=1, le=1000, description="取樣間隔（毫秒，僅 sampling）"),
+    sort: str = Query("cumulative", pattern=_SORT_PATTERN, description="pstats 排序欄位（僅 cprofile）"),
+    limit: int = Query(100, ge=1, le=1000, description="pstats 輸出筆數（僅 cprofile）")
+):
+    """限時效能分析；sampling 的結果可直接交給 flamegraph.pl 或 speedscope"""
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be <= {settings.PROFILE_MAX_SECONDS}")
+    profiling = _profiling()
+    try:
+        if mode == "cprofile":
+            return await profiling.profiler.cprofile(seconds, sort=sort, limit=limit)
+        return await profiling.profiler.sample(seconds, interval=interval_ms / 1000)
+    except profiling.ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.post("/admin/tracemalloc/start")
+async def start_tracemalloc(frames: int = Query(1, ge=1, le=50, description="每筆配置保留的堆疊深度")):
+    """開始追蹤記憶體配置，並以目前狀態作為比較基準"""
+    return _profiling().memory_tracker.start(frames)
+
+@router.get("/admin/tracemalloc/diff")
+async def tracemalloc_diff(
+    limit: int = Query(30, ge=1, le=500),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")
+):
+    """與上一次快照比較，列出成長最多的配置位置"""
+    try:
+        return _profiling().memory_tracker.diff(limit=limit, group_by=group_by)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.post("/admin/tracemalloc/stop")
+async def stop_tracemalloc():
+    """停止追蹤並釋放追蹤資料"""
+    return _profiling().memory_tracker.stop()
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException
+from ...services.device_processor import device_processor
+
+router = APIRouter()
+
+@router.get("/Availability")
+async def get_all_availability():
+    """獲取所有設備與 Controller_type 的可用率、MTBF、MTTR（1h / 24h / 7d）"""
+    return device_processor.availability_tracker.summary()
+
+@router.get("/Availability/ControllerType/{controller_type}")
+async def get_controller_type_availability(controller_type: str):
+    """獲取特定 Controller_type 的可用率、MTBF、MTTR"""
+    report = device_processor.availability_tracker.controller_type_report(controller_type)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"No availability data for controller type {controller_type}")
+    return report
+
+@router.get("/Availability/{proxyid}")
+async def get_device_availability(proxyid: int):
+    """獲取特定設備的可用率、MTBF、MTTR"""
+    report = device_processor.availability_tracker.device_report(proxyid)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"No availability data for proxyid {proxyid}")
+    return report
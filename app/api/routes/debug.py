@@ -0,0 +1,75 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Query
+from ...config_mqtt import settings
+from ...services.command_queue import command_queue
+from ...services.device_processor import device_processor
+from ...utils.loop_monitor import loop_lag_monitor
+from ...utils.startup import startup_timer
+from ...utils.tracing import export_otlp, group_by_trace, to_otlp, tracer
+
+router = APIRouter()
+
+@router.get("/debug/startup")
+async def get_startup_report():
+    """啟動耗時報告：匯入時間與各啟動階段（MQTT 連線、資料庫表格、快取預載）的開始時間與耗時"""
+    return startup_timer.report()
+
+@router.get("/debug/loop")
+async def get_loop_report():
+    """事件迴圈延遲與最近的阻塞紀錄（阻塞當下的堆疊與 app 內的阻塞位置）"""
+    return loop_lag_monitor.report()
+
+@router.get("/debug/traces")
+async def get_traces(
+    proxyid: Optional[int] = Query(None, description="只列出此設備的 span"),
+    trace_id: Optional[str] = Query(None, pattern="^[0-9a-f]{32}$", description="只列出此 trace 的 span（32 位小寫十六進位）"),
+    limit: int = Query(200, ge=1, le=20000, description="最多回傳的 span 數（由新到舊）"),
+    format: str = Query("json", pattern="^(json|otlp)$", description="json：依 trace 分組；otlp：OTLP/JSON")
+):
+    """最近記錄的追蹤（巡檢、設備探測與其中的 TCP 連線、/Health、/start、快取更新、MQTT 發佈）"""
+    spans = tracer.find(proxyid=proxyid, trace_id=trace_id, limit=limit)
+    if format == "otlp":
+        return to_otlp(spans)
+    return {
+        "sample_rate": tracer.sample_rate,
+        "buffered_spans": len(tracer.spans),
+        "traces": group_by_trace(spans),
+    }
+
+@router.post("/debug/traces/export")
+async def export_traces(
+    proxyid: Optional[int] = Query(None, description="只匯出此設備的 span"),
+    limit: int = Query(20000, ge=1, le=1000000)
+):
+    """將緩衝區中的 span 以 OTLP/JSON 寫入 TRACE_EXPORT_DIR"""
+    spans = tracer.find(proxyid=proxyid, limit=limit)
+    os.makedirs(settings.TRACE_EXPORT_DIR, exist_ok=True)
+    path = os.path.join(settings.TRACE_EXPORT_DIR, f"traces_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json")
+    # 大量 span 的序列化與寫檔移到執行緒，不阻塞事件迴圈
+    return {"path": path, "spans": await asyncio.to_thread(export_otlp, path, spans)}
+
+@router.get("/debug/commands")
+async def get_command_queue():
+    """指令佇列：等待中與送出中的指令、被操作員 Stop/Pause 暫停自動啟動的設備"""
+    return command_queue.report()
+
+@router.get("/debug/timeouts")
+async def get_probe_timeouts(proxyid: Optional[int] = Query(None)):
+    """各設備探測步驟的 RTT 估計（srtt、rttvar、樣本數、退避）與目前套用的逾時"""
+    return {
+        "enabled": device_processor.timeouts.enabled,
+        "bounds_s": [device_processor.timeouts.min_timeout, device_processor.timeouts.max_timeout],
+        "min_by_kind_s": device_processor.timeouts.min_timeouts,
+        "devices": device_processor.timeouts.report(proxyid),
+    }
+
+@router.get("/debug/flaps")
+async def get_flap_damping(proxyid: Optional[int] = Query(None)):
+    """各設備採用的上線/離線狀態、尚未達遲滯門檻的相反觀測次數、抖動懲罰值與是否抑制中"""
+    return {
+        "suppressed": device_processor.flap_damper.suppressed_count(),
+        "devices": device_processor.flap_damper.report(proxyid),
+    }
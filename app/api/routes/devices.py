@@ -1,12 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import json
+import re
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Awaitable, List, Optional
 from ...database import get_db
 from ...models.device import DeviceCreate, DeviceUpdate, DeviceInDB, DeviceListResponse
+from ...services.command_queue import IdempotencyKeyConflict
 from ...services.device_manager import DeviceServiceManager
 
 router = APIRouter()
 
+# If-None-Match 的 entity-tag（RFC 9110 §8.8.3）：可帶 W/ 弱驗證前綴，多個以逗號分隔
+_ENTITY_TAG = re.compile(r'(?:W/)?("[^"]*")')
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否與目前的 ETag 相符（RFC 9110 §13.1.2：弱比較，"*" 符合任何現有表示）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in _ENTITY_TAG.findall(if_none_match)
+
+
 @router.get("/DeviceServiceConfig", response_model=DeviceListResponse)
 async def get_all_devices(
     page: int = Query(1, ge=1, description="頁碼"),
@@ -18,19 +35,14 @@ async def get_all_devices(
 ):
     """獲取所有設備服務配置"""
     manager = DeviceServiceManager(db)
-    devices = manager.get_all_devices()
+    # 在資料庫分頁（offset/limit），總數以 COUNT 取得
+    devices, total = manager.get_device_page(page, size)
 
     # 將SQLAlchemy模型轉換為Pydantic模型
     device_in_db_list = [DeviceInDB.model_validate(device.__dict__) for device in devices]
 
-    # 簡單的分頁處理（這裡可以根據需要實現更複雜的分頁邏輯）
-    total = len(device_in_db_list)
-    start = (page - 1) * size
-    end = start + size
-    paginated_devices = device_in_db_list[start:end]
-
     return DeviceListResponse(
-        data=paginated_devices,
+        data=device_in_db_list,
         total=total,
         page=page,
         size=size
@@ -69,59 +81,210 @@ async def delete_device(proxyid: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Device not found")
     return {"message": f"Device {proxyid} deleted successfully"}
 
-@router.post("/Start/{proxyid}")
-async def start_proxy(proxyid: int, db: Session = Depends(get_db)):
-    """啟動代理服務"""
-    manager = DeviceServiceManager(db)
-    result = manager.start_proxy(proxyid)
+# 同一 key 的重複請求（例如自動化重試）在 COMMAND_IDEMPOTENCY_TTL 內直接取得第一次的結果；
+# key 綁定第一次請求的 proxyid 與指令，用於其他設備或指令時回傳 409
+_IDEMPOTENCY_KEY = Header(None, alias="Idempotency-Key", description="重試時帶相同的值可避免重複送出")
+
+async def _command_response(call: Awaitable[dict]) -> dict:
+    try:
+        result = await call
+    except IdempotencyKeyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if "error" in result:
         raise HTTPException(status_code=404, detail=result["error"])
+    if result["status"] != "success":
+        raise HTTPException(status_code=502, detail=result)
     return result
 
+def _group_targets(manager: DeviceServiceManager, proxyid: Optional[List[int]],
+                   controller_type: Optional[List[str]], all_devices: bool):
+    """群組目標；未指定 proxyid 與 controller_type 時必須明確帶 all=true，避免誤打參數影響全廠設備"""
+    if not proxyid and not controller_type and not all_devices:
+        raise HTTPException(status_code=422,
+                            detail="Specify proxyid or controller_type, or all=true to target every enabled device")
+    return manager.get_command_targets(proxyid, controller_type)
+
+def _group_command_response(command: str, proxyid: Optional[List[int]], controller_type: Optional[List[str]],
+                            all_devices: bool, concurrency: Optional[int], idempotency_key: Optional[str],
+                            db: Session) -> StreamingResponse:
+    manager = DeviceServiceManager(db)
+    # 在回應開始前查好目標設備，串流期間不再使用資料庫連線
+    devices, missing = _group_targets(manager, proxyid, controller_type, all_devices)
+
+    async def ndjson():
+        async for item in manager.run_proxy_command_group(command, devices, missing, concurrency, idempotency_key):
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.post("/Start/{proxyid}")
+async def start_proxy(proxyid: int, idempotency_key: Optional[str] = _IDEMPOTENCY_KEY, db: Session = Depends(get_db)):
+    """啟動代理服務"""
+    manager = DeviceServiceManager(db)
+    return await _command_response(manager.start_proxy(proxyid, idempotency_key))
+
 @router.post("/Stop/{proxyid}")
-async def stop_proxy(proxyid: int, db: Session = Depends(get_db)):
+async def stop_proxy(proxyid: int, idempotency_key: Optional[str] = _IDEMPOTENCY_KEY, db: Session = Depends(get_db)):
     """停止代理服務"""
     manager = DeviceServiceManager(db)
-    result = manager.stop_proxy(proxyid)
-    if "error" in result:
-        raise HTTPException(status_code=404, detail=result["error"])
-    return result
+    return await _command_response(manager.stop_proxy(proxyid, idempotency_key))
 
 @router.post("/Pause/{proxyid}")
-async def pause_proxy(proxyid: int, db: Session = Depends(get_db)):
+async def pause_proxy(proxyid: int, idempotency_key: Optional[str] = _IDEMPOTENCY_KEY, db: Session = Depends(get_db)):
     """暫停代理服務"""
     manager = DeviceServiceManager(db)
-    result = manager.pause_proxy(proxyid)
-    if "error" in result:
-        raise HTTPException(status_code=404, detail=result["error"])
-    return result
+    return await _command_response(manager.pause_proxy(proxyid, idempotency_key))
 
 @router.post("/Resume/{proxyid}")
-async def resume_proxy(proxyid: int, db: Session = Depends(get_db)):
+async def resume_proxy(proxyid: int, idempotency_key: Optional[str] = _IDEMPOTENCY_KEY, db: Session = Depends(get_db)):
     """恢復代理服務"""
     manager = DeviceServiceManager(db)
-    result = manager.resume_proxy(proxyid)
+    return await _command_response(manager.resume_proxy(proxyid, idempotency_key))
+
+_GROUP_TARGET_DOC = "指定 proxyid（可重複）、Controller_type（可重複，僅已啟用設備）；皆未指定時須帶 all=true 才會以全部已啟用設備為目標"
+_ALL_DEVICES = Query(False, alias="all", description="未指定 proxyid 與 controller_type 時，以全部已啟用設備為目標")
+
+@router.post("/Start")
+async def start_proxy_group(
+    proxyid: Optional[List[int]] = Query(None, description=_GROUP_TARGET_DOC),
+    controller_type: Optional[List[str]] = Query(None),
+    all_devices: bool = _ALL_DEVICES,
+    concurrency: Optional[int] = Query(None, ge=1, le=1000, description="同時進行的指令數"),
+    idempotency_key: Optional[str] = _IDEMPOTENCY_KEY,
+    db: Session = Depends(get_db)
+):
+    """群組啟動代理服務：並行送出，以 NDJSON 逐筆回傳各設備結果，最後一行為統計"""
+    return _group_command_response("start", proxyid, controller_type, all_devices, concurrency,
+                                   idempotency_key, db)
+
+@router.post("/Stop")
+async def stop_proxy_group(
+    proxyid: Optional[List[int]] = Query(None, description=_GROUP_TARGET_DOC),
+    controller_type: Optional[List[str]] = Query(None),
+    all_devices: bool = _ALL_DEVICES,
+    concurrency: Optional[int] = Query(None, ge=1, le=1000, description="同時進行的指令數"),
+    idempotency_key: Optional[str] = _IDEMPOTENCY_KEY,
+    db: Session = Depends(get_db)
+):
+    """群組停止代理服務（NDJSON 串流結果）"""
+    return _group_command_response("stop", proxyid, controller_type, all_devices, concurrency,
+                                   idempotency_key, db)
+
+@router.post("/Pause")
+async def pause_proxy_group(
+    proxyid: Optional[List[int]] = Query(None, description=_GROUP_TARGET_DOC),
+    controller_type: Optional[List[str]] = Query(None),
+    all_devices: bool = _ALL_DEVICES,
+    concurrency: Optional[int] = Query(None, ge=1, le=1000, description="同時進行的指令數"),
+    idempotency_key: Optional[str] = _IDEMPOTENCY_KEY,
+    db: Session = Depends(get_db)
+):
+    """群組暫停代理服務（NDJSON 串流結果）"""
+    return _group_command_response("pause", proxyid, controller_type, all_devices, concurrency,
+                                   idempotency_key, db)
+
+@router.post("/Resume")
+async def resume_proxy_group(
+    proxyid: Optional[List[int]] = Query(None, description=_GROUP_TARGET_DOC),
+    controller_type: Optional[List[str]] = Query(None),
+    all_devices: bool = _ALL_DEVICES,
+    concurrency: Optional[int] = Query(None, ge=1, le=1000, description="同時進行的指令數"),
+    idempotency_key: Optional[str] = _IDEMPOTENCY_KEY,
+    db: Session = Depends(get_db)
+):
+    """群組恢復代理服務（NDJSON 串流結果）"""
+    return _group_command_response("resume", proxyid, controller_type, all_devices, concurrency,
+                                   idempotency_key, db)
+
+_MAX_AGE_DOC = "此秒數內的探測結果直接回傳（預設 PROBE_FRESHNESS_WINDOW，0 表示一律重新探測）"
+
+@router.post("/Probe/{proxyid}")
+async def probe_proxy(
+    proxyid: int,
+    max_age: Optional[float] = Query(None, ge=0, description=_MAX_AGE_DOC),
+    db: Session = Depends(get_db)
+):
+    """立即探測代理服務；同一設備進行中的探測（含背景巡檢）共用結果，回傳 source 與 age_seconds"""
+    manager = DeviceServiceManager(db)
+    result = await manager.probe_proxy(proxyid, max_age)
     if "error" in result:
         raise HTTPException(status_code=404, detail=result["error"])
     return result
 
-@router.get("/ProxyStatus")
-async def get_all_proxy_status(db: Session = Depends(get_db)):
-    """獲取所有代理服務狀態"""
+@router.post("/Probe")
+async def probe_proxy_group(
+    proxyid: Optional[List[int]] = Query(None, description=_GROUP_TARGET_DOC),
+    controller_type: Optional[List[str]] = Query(None),
+    all_devices: bool = _ALL_DEVICES,
+    concurrency: Optional[int] = Query(None, ge=1, le=1000, description="同時進行的探測數"),
+    max_age: Optional[float] = Query(None, ge=0, description=_MAX_AGE_DOC),
+    db: Session = Depends(get_db)
+):
+    """群組立即探測（NDJSON 串流結果，最後一行為統計）"""
     manager = DeviceServiceManager(db)
-    result = manager.get_proxy_status()
-    # 如果結果是列表，直接返回；如果是字典，檢查是否有錯誤
-    if isinstance(result, list):
-        return result
-    elif isinstance(result, dict) and "error" in result:
-        raise HTTPException(status_code=404, detail=result["error"])
-    return result
+    devices, missing = _group_targets(manager, proxyid, controller_type, all_devices)
+
+    async def ndjson():
+        async for item in manager.run_probe_group(devices, missing, concurrency, max_age):
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.get("/ProxyStatus")
+async def get_all_proxy_status(
+    request: Request,
+    response: Response,
+    since: Optional[int] = Query(None, ge=0, description="只回傳此版本之後變更/移除的項目"),
+    wait: float = Query(0, ge=0, description="長輪詢：無變更時最多等待的秒數")
+):
+    """獲取所有代理服務狀態（只讀取狀態快取，不使用資料庫連線）
+
+    - 不帶 since：回傳完整列表，並附上 ETag；If-None-Match 相符（弱比較，可為逗號列表或 *）時回傳 304
+    - 帶 since：回傳 {version, reset, changed, removed} 增量結果
+    - 帶 wait：版本未變更時暫停請求直到有變更或逾時（since 或 If-None-Match 作為基準版本）
+    """
+    manager = DeviceServiceManager
+
+    if since is not None:
+        if wait > 0:
+            await manager.wait_for_proxy_status_change(since, wait)
+        changes = manager.get_proxy_status_changes(since)
+        response.headers["X-Status-Version"] = str(changes["version"])
+        return changes
+
+    etag = manager.get_proxy_status_etag()
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        if wait > 0 and await manager.wait_for_proxy_status_change(manager.get_proxy_status_version(), wait):
+            etag = manager.get_proxy_status_etag()
+        else:
+            return Response(status_code=304, headers={"ETag": etag, "X-Status-Version": str(manager.get_proxy_status_version())})
+
+    response.headers["ETag"] = etag
+    response.headers["X-Status-Version"] = str(manager.get_proxy_status_version())
+    return manager.get_all_proxy_status()
+
+@router.get("/ControllerStatus")
+async def get_controller_status(
+    controller_ip: Optional[str] = Query(None, description="篩選 Controller_ip"),
+    controller_type: Optional[str] = Query(None, description="篩選 Controller_type")
+):
+    """獲取控制器端點可達性（每個端點只探測一次，結果同時寫入其下設備的 controllerAlive）"""
+    return DeviceServiceManager.get_controller_status(controller_ip, controller_type)
 
 @router.get("/ProxyStatus/{proxyid}")
-async def get_proxy_status(proxyid: int, db: Session = Depends(get_db)):
+async def get_proxy_status(
+    proxyid: int,
+    response: Response,
+    since: Optional[int] = Query(None, ge=0, description="長輪詢的基準版本（取自 X-Status-Version）"),
+    wait: float = Query(0, ge=0, description="長輪詢：此設備狀態無變更時最多等待的秒數"),
+    db: Session = Depends(get_db)
+):
     """獲取特定代理服務狀態"""
     manager = DeviceServiceManager(db)
+    if since is not None and wait > 0:
+        await manager.wait_for_proxy_status_change(since, wait, proxyid=proxyid)
     result = manager.get_proxy_status(proxyid)
     if isinstance(result, dict) and "error" in result:
         raise HTTPException(status_code=404, detail=result["error"])
-    return result
\ No newline at end of file
+    response.headers["X-Status-Version"] = str(manager.get_proxy_status_version())
+    return result
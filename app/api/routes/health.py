@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from ...database import get_db
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from ...services.device_manager import DeviceServiceManager
+from ...services.health_monitor import component_health_monitor
 
 router = APIRouter()
 
 @router.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check():
     """服務健康狀態檢查"""
-    manager = DeviceServiceManager(db)
-    return manager.get_health_status()
\ No newline at end of file
+    return DeviceServiceManager.get_health_status()
+
+@router.get("/health/live")
+async def liveness():
+    """存活探針：能回應即代表行程與事件迴圈正常"""
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def readiness():
+    """就緒探針：回傳背景快取的元件檢查結果，未就緒時回應 503"""
+    result = component_health_monitor.readiness()
+    return JSONResponse(result, status_code=200 if result["status"] == "ready" else 503)
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from ...services.status_stream import status_broadcaster, format_sse
+
+router = APIRouter()
+
+@router.get("/ProxyStatus/stream")
+async def stream_proxy_status(
+    request: Request,
+    proxyid: Optional[List[int]] = Query(None, description="只推播指定的 proxyid（可重複）"),
+    controller_type: Optional[List[str]] = Query(None, description="只推播指定的 Controller_type（可重複）"),
+    since: Optional[int] = Query(None, ge=0, description="斷線重連時的最後版本號，改以增量作為初始事件")
+):
+    """以 Server-Sent Events 推播代理服務狀態變更（初始快照 + 變更事件 + 心跳）"""
+    if status_broadcaster.full:
+        raise HTTPException(status_code=503, detail="Too many status stream clients")
+
+    # 支援 EventSource 自動重連時帶入的 Last-Event-ID
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+
+    async def event_source():
+        # 在串流開始時才訂閱：客戶端在回應送出前斷線時產生器不會執行，也就不會留下訂閱與佇列
+        subscriber = status_broadcaster.subscribe(proxyid, controller_type)
+        if subscriber is None:
+            return  # 檢查上限後到串流開始之間名額被其他客戶端用完
+        try:
+            async for event in status_broadcaster.stream(subscriber, since):
+                yield format_sse(event)
+        finally:
+            status_broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ProxyStatus/ws")
+async def websocket_proxy_status(
+    websocket: WebSocket,
+    proxyid: Optional[List[int]] = Query(None),
+    controller_type: Optional[List[str]] = Query(None),
+    since: Optional[int] = Query(None, ge=0)
+):
+    """以 WebSocket 推播代理服務狀態變更（訊息格式與 SSE 的 data 相同）"""
+    subscriber = status_broadcaster.subscribe(proxyid, controller_type)
+    if subscriber is None:
+        await websocket.close(code=1013)  # Try again later
+        return
+
+    await websocket.accept()
+    try:
+        async for event in status_broadcaster.stream(subscriber, since):
+            await websocket.send_text(event[2])
+        await websocket.close(code=1008)  # 慢速客戶端被中斷
+    except WebSocketDisconnect:
+        pass
+    finally:
+        status_broadcaster.unsubscribe(subscriber)
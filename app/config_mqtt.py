@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import time
 import os
+from typing import Dict, Literal
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
@@ -15,15 +16,120 @@ class Settings(BaseSettings):
     # Controller API timeout in seconds
     CONTROLLER_API_TIMEOUT: float = 1.0
 
+    # 健康檢查探測逾時（秒）：連接埠檢查、/Health、/start
+    PROBE_PORT_TIMEOUT: float = 0.2
+    PROBE_HEALTH_TIMEOUT: float = 5.0
+    PROBE_START_TIMEOUT: float = 2.0
+    # 自適應逾時：依每台設備觀測到的 RTT（srtt + 倍數 × rttvar）推導上面三個逾時，
+    # 限制在上下限之間（秒）；樣本數不足時沿用上面的固定值
+    ADAPTIVE_TIMEOUTS_ENABLED: bool = True
+    ADAPTIVE_TIMEOUT_MIN: float = 0.05
+    ADAPTIVE_TIMEOUT_MAX: float = 5.0
+    ADAPTIVE_TIMEOUT_MULTIPLIER: float = 4.0
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES: int = 5
+    # 依步驟（connect、health、start）覆寫下限；/start 與指令的逾時另外不低於其固定值
+    ADAPTIVE_TIMEOUT_MIN_BY_KIND: Dict[str, float] = {"health": 0.25}
+    # 事件迴圈近期延遲超過此秒數時量到的 RTT 不計入估計（需啟用事件迴圈監控）
+    ADAPTIVE_TIMEOUT_MAX_LOOP_LAG: float = 0.05
+    # 探測模式："tcp_http" 先做 TCP 連接埠檢查再呼叫 /Health；"http" 只呼叫 /Health（重用 keep-alive 連線，
+    # 連線失敗視為連接埠無法存取）
+    PROBE_MODE: Literal["tcp_http", "http"] = "tcp_http"
+    # /Health 對沖：RTT 變異量 / 平滑 RTT 至少此比例的設備，第一個請求超過約 p95 仍未回應時再送一個
+    PROBE_HEDGE_ENABLED: bool = False
+    PROBE_HEDGE_MIN_VARIANCE: float = 0.5
+    # 狀態遲滯：連續幾次探測失敗才視為離線、連續幾次成功才視為上線（預設 1 即立即反映，設為 2 以上啟用）
+    STATUS_DOWN_AFTER: int = 1
+    STATUS_UP_AFTER: int = 1
+    # 抖動抑制（仿 BGP route flap dampening）：每次轉為離線的懲罰值、超過即抑制的門檻、
+    # 降到以下才解除的門檻、懲罰值半衰期（秒）、最長抑制時間（秒）
+    FLAP_PENALTY: float = 1000.0
+    FLAP_SUPPRESS_LIMIT: float = 2000.0
+    FLAP_REUSE_LIMIT: float = 750.0
+    FLAP_HALF_LIFE: float = 900.0
+    FLAP_MAX_SUPPRESS: float = 3600.0
+    # /Probe 立即探測：此秒數內的結果直接回傳（附上 age_seconds），不重新探測
+    PROBE_FRESHNESS_WINDOW: float = 5.0
+    # 控制器可達性監控：是否啟用、探測週期（與設備巡檢分開）、TCP 連線逾時（秒）、同時探測的端點數上限；
+    # 共用同一 (Controller_ip, Controller_port) 的設備每輪只探測一次
+    CONTROLLER_PROBE_ENABLED: bool = True
+    CONTROLLER_PROBE_INTERVAL: float = 15.0
+    CONTROLLER_PROBE_TIMEOUT: float = 1.0
+    CONTROLLER_PROBE_CONCURRENCY: int = 100
+
+    # 下位機指令（Start/Stop/Pause/Resume）：逾時（秒）、群組指令的並行上限
+    PROXY_COMMAND_TIMEOUT: float = 5.0
+    PROXY_COMMAND_CONCURRENCY: int = 50
+    # 指令佇列：全域同時送出的設備數上限、Idempotency-Key 保存秒數
+    COMMAND_QUEUE_WORKERS: int = 64
+    COMMAND_IDEMPOTENCY_TTL: float = 600.0
+    # 巡檢 /start 限流：全域與每個 Controller_type 的每秒啟動數與突發量（<= 0 表示不限），
+    # 個別類型的速率（JSON，例如 {"E82": 5}），以及 remark 含指定標籤時的優先序（JSON，例如 {"critical": 10}）
+    START_RATE_LIMIT: float = 50.0
+    START_BURST: int = 100
+    START_TYPE_RATE_LIMIT: float = 25.0
+    START_TYPE_BURST: int = 50
+    START_TYPE_RATE_LIMITS: Dict[str, float] = {}
+    START_PRIORITY_TAGS: Dict[str, int] = {}
+    # 到下位機的共用 HTTP 連線池：連線數上限、保留的 keep-alive 連線數、閒置多久關閉（秒）
+    PROXY_HTTP_MAX_CONNECTIONS: int = 200
+    PROXY_HTTP_MAX_KEEPALIVE: int = 100
+    PROXY_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+
+    # 元件健康檢查（/health/ready）：檢查週期、資料庫逾時、背景巡檢無進度多久視為停滯、事件迴圈延遲門檻（秒）
+    HEALTH_CHECK_INTERVAL: float = 5.0
+    HEALTH_DB_TIMEOUT: float = 2.0
+    HEALTH_WORKER_STALE_AFTER: float = 120.0
+    HEALTH_LOOP_LAG_THRESHOLD: float = 0.5
+
+    # 事件迴圈監控（/debug/loop）：心跳間隔、超過多久視為阻塞並擷取堆疊（秒）、保留的阻塞紀錄筆數
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL: float = 0.1
+    LOOP_STALL_THRESHOLD: float = 0.25
+    LOOP_MONITOR_MAX_OFFENDERS: int = 50
+
+    # 行程內追蹤（/debug/traces）：每次設備探測的取樣比例（0 表示停用）、保留的 span 數、匯出目錄
+    TRACE_SAMPLE_RATE: float = 0.1
+    TRACE_BUFFER_SIZE: int = 20000
+    TRACE_EXPORT_DIR: str = "logs"
+
+    # 管理端點（/admin/profile、/admin/tracemalloc/*）：預設關閉，分析秒數上限
+    ADMIN_ENDPOINTS_ENABLED: bool = False
+    PROFILE_MAX_SECONDS: float = 60.0
+
     # Web API 多工作者設定
     UVICORN_WORKERS: int = 1
 
     # 背景工作程序控制
     RUN_BACKGROUND_WORKER: bool = False
 
+    # 狀態推播（SSE / WebSocket）設定
+    STATUS_STREAM_BUFFER_SIZE: int = 1000        # 每個客戶端的事件緩衝上限，超過即視為慢速客戶端並中斷
+    STATUS_STREAM_HEARTBEAT_INTERVAL: float = 15.0  # 無事件時的心跳間隔（秒）
+    STATUS_STREAM_MAX_CLIENTS: int = 1000
+
+    # 狀態長輪詢的最長等待時間（秒）
+    STATUS_LONG_POLL_MAX_WAIT: float = 60.0
+
     LOG_LEVEL: str = "INFO"
     LOG_FILE: str = "logs/device_service.log"
     MQTT_LOG_FILE: str = "logs/mqtt.log"
+    # 日誌由背景執行緒批次寫入：佇列上限（滿了即丟棄並計數，0 表示不限）、每批筆數、檔案是否輸出 JSON Lines
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_BATCH_SIZE: int = 256
+    LOG_JSON: bool = False
+    # 日誌限速：同一 (logger, 訊息範本, proxyid) 每 LOG_RATE_LIMIT_INTERVAL 秒補充一筆、最多連續 LOG_RATE_LIMIT_BURST 筆；
+    # 只影響 LOG_RATE_LIMIT_MAX_LEVEL（含）以下的等級。LOG_SAMPLE_* 為 DEBUG/INFO 的保留比例
+    LOG_RATE_LIMIT_ENABLED: bool = True
+    LOG_RATE_LIMIT_INTERVAL: float = 60.0
+    LOG_RATE_LIMIT_BURST: int = 5
+    LOG_RATE_LIMIT_MAX_LEVEL: str = "INFO"
+    LOG_SAMPLE_DEBUG: float = 1.0
+    LOG_SAMPLE_INFO: float = 1.0
+    # 輪替檔案：背景 gzip 壓縮與保留策略（各日誌分別計算，0 表示不限）
+    LOG_COMPRESS: bool = True
+    LOG_BACKUP_COUNT: int = 20
+    LOG_RETENTION_MAX_MB: int = 1024
+    LOG_RETENTION_DAYS: float = 30
 
     # MQTT配置
     MQTT_BROKER_HOST: str = "127.0.0.1"
@@ -1,13 +1,37 @@
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config_mqtt import settings
+from .utils.metrics import metrics_registry
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+
+_QUERY_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+DB_QUERY_DURATION = metrics_registry.histogram(
+    "device_service_db_query_duration_seconds",
+    "Database statement execution time by statement type",
+    ["operation"]
+)
+
+# 開始時間存在該次執行的 context 上：語句失敗時不會執行 after_cursor_execute，
+# 存在連線上的話會殘留到之後的查詢
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start_time = time.perf_counter()
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = context._query_start_time
+    keyword = statement.split(None, 1)[0].upper() if statement.strip() else ""
+    operation = keyword if keyword in _QUERY_OPERATIONS else "OTHER"
+    DB_QUERY_DURATION.labels(operation).observe(time.perf_counter() - started)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -1,45 +1,55 @@
+# 啟動計時需最先匯入，才能涵蓋本模組其餘匯入的耗時
+from .utils.startup import startup_timer
+startup_timer.start("import")
+
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-import uvicorn
 import asyncio
 
-# 診斷日誌：嘗試載入設定
-import logging
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger(__name__)
-logger.debug("嘗試從 app.config 載入 settings...")
-
-logger.debug("Attempting to load settings from app.config...")
-
-try:
-    from .config_mqtt import settings
-    logger.debug("Successfully loaded settings object")
-except ImportError as e:
-    logger.error(f"Failed to load settings from app.config: {e}")
-    logger.debug("Attempting to load settings from app.config_mqtt...")
-    try:
-        from .config_mqtt import settings
-        logger.debug("Successfully loaded settings object from app.config_mqtt")
-    except ImportError as e2:
-        logger.error(f"Failed to load settings from app.config_mqtt: {e2}")
-        raise e2
-    
-from .database import engine, Base, get_db
+from .config_mqtt import settings
+from .database import engine, Base, get_db, SessionLocal
 from .models.device import Device
 from .services.background_worker import BackgroundWorker
 from .api.routes.health import router as health_router
 from .api.routes.devices import router as devices_router
+from .api.routes.stream import router as stream_router
+from .api.routes.availability import router as availability_router
+from .api.routes.metrics import router as metrics_router
+from .api.routes.debug import router as debug_router
+from .api.routes.admin import router as admin_router
+from .api.middleware import RequestMetricsMiddleware
 from .utils.logger import setup_logging, get_logger
+from .utils.log_filters import RateLimitFilter
 from .mqtt.client import mqtt_client
 from .mqtt.handler import mqtt_handler
+from .repositories.device_repository import DeviceRepository
+from .services.device_processor import device_processor
+from .services.health_monitor import component_health_monitor
+from .services.command_queue import command_queue
+from .services.controller_monitor import controller_monitor
+from .utils.loop_monitor import loop_lag_monitor
+from .utils.http_pool import http_client_pool
 
 # 設定日誌系統（包含自動輪替功能）
 logger, _ = setup_logging(
     log_file=settings.LOG_FILE,
     mqtt_log_file=settings.MQTT_LOG_FILE,
-    level=settings.LOG_LEVEL
+    level=settings.LOG_LEVEL,
+    queue_size=settings.LOG_QUEUE_SIZE,
+    batch_size=settings.LOG_BATCH_SIZE,
+    json_lines=settings.LOG_JSON,
+    log_filter=RateLimitFilter(
+        interval=settings.LOG_RATE_LIMIT_INTERVAL,
+        burst=settings.LOG_RATE_LIMIT_BURST,
+        max_level=settings.LOG_RATE_LIMIT_MAX_LEVEL,
+        sample_rates={"DEBUG": settings.LOG_SAMPLE_DEBUG, "INFO": settings.LOG_SAMPLE_INFO}
+    ) if settings.LOG_RATE_LIMIT_ENABLED else None,
+    compress=settings.LOG_COMPRESS,
+    backup_count=settings.LOG_BACKUP_COUNT,
+    max_total_bytes=settings.LOG_RETENTION_MAX_MB * 1024 * 1024,
+    max_age_days=settings.LOG_RETENTION_DAYS
 )
 
 # 全域背景工作程序實例
@@ -48,24 +58,13 @@ background_worker = None
 # 全域標記，防止重複啟動
 _app_started = False
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """應用程式生命週期管理"""
-    global background_worker, _app_started
-
-    # 防止重複啟動
-    if _app_started:
-        logger.warning("Application is already running, skipping duplicate startup.")
-        yield
-        return
-
-    _app_started = True
+# 背景進行中的 MQTT 連線工作
+_mqtt_startup_task = None
 
-    # 啟動階段
-    logger.info("Starting Device Service...")
-    logger.info(f"Configuration loaded: HOST={settings.DEVICE_SERVICE_HOST}, PORT={settings.DEVICE_SERVICE_PORT}")
-
-    # 啟動MQTT客戶端
+async def _start_mqtt():
+    """連線 MQTT Broker 並開始監聽；在背景執行，不阻擋啟動"""
+    startup_timer.start("mqtt_connect")
+    error = None
     try:
         logger.info(f"Starting MQTT client, connecting to {settings.MQTT_BROKER_HOST}:{settings.MQTT_BROKER_PORT}")
         mqtt_connected = await mqtt_client.connect()
@@ -76,31 +75,110 @@ async def lifespan(app: FastAPI):
             await mqtt_handler.start_listening()
             logger.info("MQTT message listener started")
         else:
+            error = ConnectionError("MQTT client connection failed")
             logger.error("MQTT client connection failed")
+    except asyncio.CancelledError as e:
+        error = e
+        raise
     except Exception as e:
+        error = e
         logger.error(f"Error occurred while starting MQTT client: {e}")
+    finally:
+        startup_timer.finish("mqtt_connect", error)
+
 
-    # 建立資料庫表格
+def _load_all_devices():
+    """在執行緒中讀取全部設備（供快取預載）"""
+    db = SessionLocal()
     try:
-        Base.metadata.create_all(bind=engine)
+        return DeviceRepository(db).get_all_devices(limit=None)
+    finally:
+        db.close()
+
+
+async def _prepare_database() -> bool:
+    """建立資料庫表格並預載設備快取，回傳快取是否已載入"""
+    # 建立資料庫表格（同步 I/O 移到執行緒，避免阻塞事件迴圈）
+    try:
+        with startup_timer.phase("db_schema"):
+            await asyncio.to_thread(Base.metadata.create_all, bind=engine)
         logger.info("Database tables created successfully")
     except Exception as e:
         logger.error(f"Failed to create database tables: {e}")
         raise
 
-    # 啟動背景工作程序
-    background_worker = BackgroundWorker(next(get_db()))
-    background_worker.start()
-    logger.info("Background worker started")
+    # 預載設備快取；失敗時交由背景工作程序第一輪再載入
+    try:
+        with startup_timer.phase("cache_warmup"):
+            devices = await asyncio.to_thread(_load_all_devices)
+            device_processor.load_devices_to_cache(devices)
+        logger.info(f"Device cache warmed up with {len(devices)} devices")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to warm up device cache: {e}")
+        return False
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """應用程式生命週期管理
+
+    MQTT 連線在背景進行；資料庫表格建立與設備快取預載同時執行，完成後即啟動背景工作程序。
+    各階段耗時見 GET /debug/startup。
+    """
+    global background_worker, _app_started, _mqtt_startup_task
+
+    # 防止重複啟動
+    if _app_started:
+        logger.warning("Application is already running, skipping duplicate startup.")
+        yield
+        return
+
+    _app_started = True
+
+    # 啟動階段
+    logger.info("Starting Device Service...")
+    logger.info(f"Configuration loaded: HOST={settings.DEVICE_SERVICE_HOST}, PORT={settings.DEVICE_SERVICE_PORT}")
+
+    with startup_timer.phase("lifespan"):
+        if settings.LOOP_MONITOR_ENABLED:
+            loop_lag_monitor.start()
+        _mqtt_startup_task = asyncio.create_task(_start_mqtt())
+        cache_loaded = await _prepare_database()
+
+        # 啟動背景工作程序
+        background_worker = BackgroundWorker(next(get_db()))
+        background_worker.devices_loaded = cache_loaded
+        background_worker.start()
+        logger.info("Background worker started")
+
+        # 控制器可達性監控（週期與設備巡檢分開）
+        if settings.CONTROLLER_PROBE_ENABLED:
+            controller_monitor.start()
+
+        component_health_monitor.register_worker(background_worker)
+        component_health_monitor.start()
+    startup_timer.ready()
 
     yield
 
     # 關閉階段
     logger.info("Shutting down Device Service...")
 
+    await component_health_monitor.stop()
+
     # 停止背景工作程序
     if background_worker:
         background_worker.stop()
+    await controller_monitor.stop()
+
+    # 尚未完成的 MQTT 連線直接取消
+    if _mqtt_startup_task and not _mqtt_startup_task.done():
+        _mqtt_startup_task.cancel()
+        try:
+            await _mqtt_startup_task
+        except asyncio.CancelledError:
+            pass
 
     # 關閉MQTT客戶端
     try:
@@ -109,6 +187,11 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Error occurred while shutting down MQTT client: {e}")
 
+    # 取消尚未送出的下位機指令，並關閉到下位機的 keep-alive 連線
+    await command_queue.stop()
+    await http_client_pool.aclose()
+
+    await loop_lag_monitor.stop()
     logger.info("Device Service shutdown complete")
 
 # 建立 FastAPI 應用程式
@@ -128,9 +211,17 @@ app.add_middleware(
     allow_headers=["*"],  # 允許所有標頭
 )
 
+# 添加請求延遲指標中間件
+app.add_middleware(RequestMetricsMiddleware)
+
 # 包含路由
 app.include_router(health_router, tags=["Health"])
+app.include_router(stream_router, tags=["Status Stream"])  # 需在 devices_router 之前，避免 /ProxyStatus/{proxyid} 先行匹配
 app.include_router(devices_router, tags=["Devices"])
+app.include_router(availability_router, tags=["Availability"])
+app.include_router(metrics_router, tags=["Metrics"])
+app.include_router(debug_router, tags=["Debug"])
+app.include_router(admin_router, tags=["Admin"], include_in_schema=settings.ADMIN_ENDPOINTS_ENABLED)
 
 @app.get("/")
 async def root():
@@ -146,11 +237,16 @@ async def mqtt_status():
         "client_id": settings.MQTT_CLIENT_ID
     }
 
+startup_timer.finish("import")
+
 if __name__ == "__main__":
+    # uvicorn 只在直接執行時需要，不計入 app.main 的匯入成本
+    import uvicorn
+
     uvicorn.run(
         "app.main:app",
         host=settings.DEVICE_SERVICE_HOST,
         port=settings.DEVICE_SERVICE_PORT,
         reload=True,
         log_level=settings.LOG_LEVEL.lower()
-    )
\ No newline at end of file
+    )
@@ -4,9 +4,25 @@ import json
 from typing import Dict, Any, Optional, Callable
 import paho.mqtt.client as mqtt
 from ..config_mqtt import settings
+from ..utils.metrics import metrics_registry
+from ..utils.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+MQTT_PUBLISH_TOTAL = metrics_registry.counter(
+    "device_service_mqtt_publish_total",
+    "MQTT publish attempts by result",
+    ["result"]
+)
+MQTT_PUBLISH_SUCCESS = MQTT_PUBLISH_TOTAL.labels("success")
+MQTT_PUBLISH_FAILED = MQTT_PUBLISH_TOTAL.labels("failed")
+MQTT_PUBLISH_NOT_CONNECTED = MQTT_PUBLISH_TOTAL.labels("not_connected")
+MQTT_PUBLISH_ERROR = MQTT_PUBLISH_TOTAL.labels("error")
+MQTT_DISCONNECTS = metrics_registry.counter(
+    "device_service_mqtt_disconnects_total",
+    "MQTT disconnections reported by the client"
+)
+
 class MQTTClient:
     """MQTT客戶端連接管理"""
 
@@ -16,6 +32,15 @@ class MQTTClient:
         self._connect_lock = asyncio.Lock()
         self._message_handlers: Dict[str, Callable] = {}
 
+        metrics_registry.gauge(
+            "device_service_mqtt_connected",
+            "1 when the MQTT client is connected to the broker"
+        ).set_function(lambda: 1 if self.is_connected else 0)
+        metrics_registry.gauge(
+            "device_service_mqtt_queue_depth",
+            "Outgoing MQTT messages queued in the client and not yet acknowledged"
+        ).set_function(self.queue_depth)
+
     def _on_connect(self, client, userdata, flags, rc):
         """連接回調"""
         if rc == 0:
@@ -29,11 +54,11 @@ class MQTTClient:
         """斷開連接回調"""
         logger.warning(f"[MQTT_CLIENT] MQTT client disconnected - Code: {rc}, Client ID: {client._client_id if hasattr(client, '_client_id') else 'unknown'}")
         self.is_connected = False
+        MQTT_DISCONNECTS.inc()
 
-        # 自動重連
+        # 自動重連由 paho 網路執行緒負責（此回呼在該執行緒中執行，不可使用 asyncio.create_task）
         if rc != 0:
-            logger.info(f"[MQTT_CLIENT] Auto-reconnect triggered - retrying in {settings.MQTT_RECONNECT_DELAY} seconds")
-            asyncio.create_task(self._reconnect())
+            logger.info(f"[MQTT_CLIENT] Auto-reconnect pending - paho network loop retries within {settings.MQTT_RECONNECT_DELAY} seconds")
 
     def _on_message(self, client, userdata, msg):
         """訊息接收回調"""
@@ -53,13 +78,6 @@ class MQTTClient:
         except Exception as e:
             logger.error(f"[MQTT_CLIENT] Error while handling MQTT message - Topic: {msg.topic}, Error: {e}")
 
-    async def _reconnect(self):
-        """自動重連"""
-        logger.info(f"[MQTT_CLIENT] Attempting to reconnect to MQTT Broker - Delay: {settings.MQTT_RECONNECT_DELAY} seconds")
-        await asyncio.sleep(settings.MQTT_RECONNECT_DELAY)
-        logger.info(f"[MQTT_CLIENT] Executing MQTT reconnect...")
-        await self.connect()
-
     async def connect(self) -> bool:
         """連接MQTT Broker"""
         async with self._connect_lock:
@@ -79,6 +97,9 @@ class MQTTClient:
                 self.client.on_disconnect = self._on_disconnect
                 self.client.on_message = self._on_message
 
+                # 斷線後由網路執行緒自動重連，重試間隔自 1 秒倍增至 MQTT_RECONNECT_DELAY
+                self.client.reconnect_delay_set(min_delay=1, max_delay=max(1, settings.MQTT_RECONNECT_DELAY))
+
                 # 如果有設定用戶名密碼
                 if settings.MQTT_USERNAME and settings.MQTT_PASSWORD:
                     self.client.username_pw_set(settings.MQTT_USERNAME, settings.MQTT_PASSWORD)
@@ -171,8 +192,16 @@ class MQTTClient:
             return False
 
     def publish(self, topic: str, payload: Dict[str, Any], qos: int = 0) -> bool:
+        """發佈訊息（在探測等追蹤中的流程內記錄為 mqtt_publish span）"""
+        with tracer.child_span("mqtt_publish", topic=topic) as span:
+            result = self._publish(topic, payload, qos)
+            span.set_attribute("published", result)
+            return result
+
+    def _publish(self, topic: str, payload: Dict[str, Any], qos: int = 0) -> bool:
         """發佈訊息"""
         if not self.client or not self.is_connected:
+            MQTT_PUBLISH_NOT_CONNECTED.inc()
             logger.error(f"[MQTT_CLIENT] MQTT client not connected, cannot publish - Topic: {topic}")
             return False
 
@@ -180,32 +209,36 @@ class MQTTClient:
             # 將payload轉換為JSON格式
             json_payload = json.dumps(payload, ensure_ascii=False)
 
-            # 記錄發佈詳情到一般日誌
-            logger.info(f"[MQTT_CLIENT] Publishing message - Topic: {topic}, QoS: {qos}, Payload: {json_payload}")
-
-            # 記錄詳細的 MQTT 發佈資訊到 MQTT 專用日誌
+            # 發佈內容只記錄一次，寫入 MQTT 專用日誌
             mqtt_logger = logging.getLogger('mqtt')
-            mqtt_logger.info(f"[MQTT_PUBLISH] Topic: {topic}, QoS: {qos}")
-            mqtt_logger.info(f"[MQTT_PUBLISH] Payload: {json_payload}")
+            mqtt_logger.info(f"[MQTT_PUBLISH] Topic: {topic}, QoS: {qos}, Payload: {json_payload}")
 
             # 發佈訊息
             result = self.client.publish(topic, json_payload, qos=qos)
 
             if result[0] == 0:
-                logger.info(f"[MQTT_CLIENT] Successfully published to topic {topic} - Result code: {result[0]}")
-                mqtt_logger.info(f"[MQTT_PUBLISH] Publish success - Topic: {topic}, Result code: {result[0]}")
+                MQTT_PUBLISH_SUCCESS.inc()
+                logger.debug(f"[MQTT_CLIENT] Published to topic {topic} - Result code: {result[0]}")
                 return True
             else:
+                MQTT_PUBLISH_FAILED.inc()
                 logger.error(f"[MQTT_CLIENT] Failed to publish - Topic: {topic}, Result code: {result[0]}")
                 mqtt_logger.error(f"[MQTT_PUBLISH] Publish failed - Topic: {topic}, Result code: {result[0]}")
                 return False
 
         except Exception as e:
+            MQTT_PUBLISH_ERROR.inc()
             logger.error(f"[MQTT_CLIENT] Error while publishing - Topic: {topic}, Error: {e}")
             mqtt_logger = logging.getLogger('mqtt')
             mqtt_logger.error(f"[MQTT_PUBLISH] Exception during publish - Topic: {topic}, Error: {e}")
             return False
 
+    def queue_depth(self) -> int:
+        """取得尚未送出或尚未確認的訊息數量"""
+        if not self.client:
+            return 0
+        return len(getattr(self.client, "_out_messages", ())) + len(getattr(self.client, "_out_packet", ()))
+
     def is_alive(self) -> bool:
         """檢查客戶端是否正常連接"""
         return self.is_connected and self.client.is_connected() if self.client else False
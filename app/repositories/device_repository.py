@@ -9,8 +9,22 @@ class DeviceRepository:
     def get_device(self, proxyid: int) -> Optional[Device]:
         return self.db.query(Device).filter(Device.proxyid == proxyid).first()
 
-    def get_all_devices(self, skip: int = 0, limit: int = 100) -> List[Device]:
-        return self.db.query(Device).offset(skip).limit(limit).all()
+    def get_all_devices(self, skip: int = 0, limit: Optional[int] = 100) -> List[Device]:
+        return self.db.query(Device).order_by(Device.proxyid).offset(skip).limit(limit).all()
+
+    def count_devices(self) -> int:
+        return self.db.query(Device).count()
+
+    def get_devices(self, proxyids: Optional[List[int]] = None, controller_types: Optional[List[str]] = None,
+                    enabled_only: bool = False) -> List[Device]:
+        query = self.db.query(Device)
+        if proxyids:
+            query = query.filter(Device.proxyid.in_(proxyids))
+        if controller_types:
+            query = query.filter(Device.Controller_type.in_(controller_types))
+        if enabled_only:
+            query = query.filter(Device.enable == 1)
+        return query.order_by(Device.proxyid).all()
 
     def create_device(self, device: DeviceCreate) -> Device:
         db_device = Device(**device.model_dump())
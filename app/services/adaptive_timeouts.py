@@ -0,0 +1,170 @@
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+
+from ..config_mqtt import settings
+from ..utils.loop_monitor import loop_lag_monitor
+from ..utils.metrics import metrics_registry
+
+PROBE_TIMEOUT_CHOSEN = metrics_registry.histogram(
+    "device_service_probe_timeout_seconds",
+    "Timeout applied to a proxy probe step (connect, health, start), adaptive or configured default",
+    ["kind"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10)
+)
+PROBE_STEP_TIMEOUTS = metrics_registry.counter(
+    "device_service_probe_step_timeouts_total",
+    "Proxy probe steps that hit their timeout, by kind",
+    ["kind"]
+)
+RTT_SAMPLES_DISCARDED = metrics_registry.counter(
+    "device_service_rtt_samples_discarded_total",
+    "RTT samples not fed to the adaptive timeout estimator because the event loop was lagging, by kind",
+    ["kind"]
+)
+
+# 逾時後的退避倍數上限（RFC 6298 的 RTO 加倍）
+MAX_BACKOFF = 8
+
+
+class RttEstimator:
+    """平滑 RTT 與變異量的 EWMA（Jacobson/Karels，RFC 6298）
+
+    srtt ← (1-α)·srtt + α·rtt，rttvar ← (1-β)·rttvar + β·|srtt - rtt|，
+    逾時為 srtt + k·rttvar；每次逾時退避加倍，下一次成功量測後恢復。
+    """
+
+    __slots__ = ("srtt", "rttvar", "samples", "backoff")
+
+    ALPHA = 0.125
+    BETA = 0.25
+
+    def __init__(self):
+        self.srtt = 0.0
+        self.rttvar = 0.0
+        self.samples = 0
+        self.backoff = 1
+
+    def observe(self, rtt: float):
+        if self.samples == 0:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.samples += 1
+        self.backoff = 1
+
+    def timed_out(self):
+        self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+
+    def timeout(self, multiplier: float) -> float:
+        return (self.srtt + multiplier * self.rttvar) * self.backoff
+
+
+class AdaptiveTimeouts:
+    """每台設備各探測步驟（connect、health、start）的 RTT 估計與逾時
+
+    樣本數不足 min_samples 時沿用設定的固定逾時；之後為 srtt + k·rttvar，
+    限制在 [該步驟的下限, max_timeout]（min_timeouts 依步驟覆寫 min_timeout）。connect 逾時來自連接埠檢查的
+    TCP 連線時間，HTTP 請求的讀取逾時來自各端點的回應時間，兩者分別套用。
+    事件迴圈延遲超過 max_loop_lag 時量到的 RTT 含有排程延遲，不計入估計。
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, min_timeout: Optional[float] = None,
+                 max_timeout: Optional[float] = None, multiplier: Optional[float] = None,
+                 min_samples: Optional[int] = None, min_timeouts: Optional[Dict[str, float]] = None,
+                 max_loop_lag: Optional[float] = None,
+                 loop_lag: Callable[[], float] = loop_lag_monitor.recent_max_lag):
+        self.enabled = settings.ADAPTIVE_TIMEOUTS_ENABLED if enabled is None else enabled
+        self.min_timeout = settings.ADAPTIVE_TIMEOUT_MIN if min_timeout is None else min_timeout
+        self.min_timeouts = dict(settings.ADAPTIVE_TIMEOUT_MIN_BY_KIND if min_timeouts is None else min_timeouts)
+        self.max_loop_lag = settings.ADAPTIVE_TIMEOUT_MAX_LOOP_LAG if max_loop_lag is None else max_loop_lag
+        self.loop_lag = loop_lag
+        self.max_timeout = settings.ADAPTIVE_TIMEOUT_MAX if max_timeout is None else max_timeout
+        self.multiplier = settings.ADAPTIVE_TIMEOUT_MULTIPLIER if multiplier is None else multiplier
+        self.min_samples = settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES if min_samples is None else min_samples
+        self._estimators: Dict[Tuple[int, str], RttEstimator] = {}
+        self._lock = threading.Lock()
+
+    def estimator(self, proxyid: int, kind: str) -> Optional[RttEstimator]:
+        return self._estimators.get((proxyid, kind))
+
+    def observe(self, proxyid: int, kind: str, rtt: float):
+        if self.loop_lag() > self.max_loop_lag:
+            RTT_SAMPLES_DISCARDED.labels(kind).inc()
+            return
+        with self._lock:
+            estimator = self._estimators.get((proxyid, kind))
+            if estimator is None:
+                estimator = self._estimators[(proxyid, kind)] = RttEstimator()
+            estimator.observe(rtt)
+
+    def timed_out(self, proxyid: int, kind: str):
+        PROBE_STEP_TIMEOUTS.labels(kind).inc()
+        with self._lock:
+            estimator = self._estimators.get((proxyid, kind))
+            if estimator is not None:
+                estimator.timed_out()
+
+    def floor(self, kind: str) -> float:
+        return self.min_timeouts.get(kind, self.min_timeout)
+
+    def _clamp(self, kind: str, estimator: RttEstimator, floor: Optional[float] = None) -> float:
+        lower = self.floor(kind) if floor is None else max(self.floor(kind), floor)
+        return min(max(self.max_timeout, lower), max(lower, estimator.timeout(self.multiplier)))
+
+    def timeout(self, proxyid: int, kind: str, default: float, at_least_default: bool = False) -> float:
+        """該步驟的逾時秒數；停用或樣本不足時為 default
+
+        at_least_default 用於 /start 與指令等有副作用的請求：逾時不低於 default，只會因慢速設備或退避而延長。
+        """
+        estimator = self._estimators.get((proxyid, kind))
+        if not self.enabled or estimator is None or estimator.samples < self.min_samples:
+            value = default
+        else:
+            value = self._clamp(kind, estimator, default if at_least_default else None)
+        PROBE_TIMEOUT_CHOSEN.labels(kind).observe(value)
+        return value
+
+    def http_timeout(self, proxyid: int, kind: str, default: float,
+                     connect_default: Optional[float] = None, at_least_default: bool = False) -> httpx.Timeout:
+        """HTTP 請求逾時：connect 與 read/write 分別由各自的估計推導（connect_default 預設同 default）"""
+        read = self.timeout(proxyid, kind, default, at_least_default)
+        connect = self.timeout(proxyid, "connect", default if connect_default is None else connect_default,
+                               at_least_default)
+        return httpx.Timeout(read, connect=connect)
+
+    def hedge_delay(self, proxyid: int, kind: str, min_variance_ratio: float) -> Optional[float]:
+        """RTT 變異大（rttvar / srtt >= min_variance_ratio）的設備回傳約 p95 的延遲，否則 None
+
+        rttvar 是平均絕對偏差（常態分佈下約 0.8σ），srtt + 2·rttvar 約為 p95。
+        """
+        estimator = self._estimators.get((proxyid, kind))
+        if estimator is None or estimator.samples < self.min_samples or estimator.srtt <= 0:
+            return None
+        if estimator.rttvar / estimator.srtt < min_variance_ratio:
+            return None
+        return estimator.srtt + 2 * estimator.rttvar
+
+    def forget(self, proxyid: int):
+        with self._lock:
+            for key in [key for key in self._estimators if key[0] == proxyid]:
+                del self._estimators[key]
+
+    def report(self, proxyid: Optional[int] = None) -> Dict:
+        with self._lock:
+            items = [(key, estimator) for key, estimator in self._estimators.items()
+                     if proxyid is None or key[0] == proxyid]
+        report: Dict[int, Dict] = {}
+        for (device_id, kind), estimator in sorted(items):
+            ready = self.enabled and estimator.samples >= self.min_samples
+            report.setdefault(device_id, {})[kind] = {
+                "srtt_ms": round(estimator.srtt * 1000, 3),
+                "rttvar_ms": round(estimator.rttvar * 1000, 3),
+                "samples": estimator.samples,
+                "backoff": estimator.backoff,
+                "timeout_s": round(self._clamp(kind, estimator), 4) if ready else None,
+            }
+        return report
@@ -0,0 +1,294 @@
+import time
+from typing import Callable, Dict, List, Optional
+
+# 統計視窗定義：名稱 -> (視窗長度秒數, 分桶數量)
+AVAILABILITY_WINDOWS = {
+    "1h": (3600, 60),        # 每桶 1 分鐘
+    "24h": (86400, 96),      # 每桶 15 分鐘
+    "7d": (604800, 168),     # 每桶 1 小時
+}
+
+
+class SlidingWindow:
+    """以時間分桶的滑動視窗，累計上線/離線秒數與故障/修復次數
+
+    每個桶只保存計數，總計值隨桶的加入與過期增量維護，
+    因此寫入與查詢的成本只和桶數有關，與歷史長度無關。
+    """
+
+    __slots__ = ("span", "bucket_count", "bucket_width", "_head",
+                 "_up", "_down", "_failures", "_repairs",
+                 "up_seconds", "down_seconds", "failures", "repairs")
+
+    def __init__(self, span: float, bucket_count: int):
+        self.span = float(span)
+        self.bucket_count = bucket_count
+        self.bucket_width = self.span / bucket_count
+        self._head: Optional[int] = None  # 最新桶的絕對索引
+        self._up = [0.0] * bucket_count
+        self._down = [0.0] * bucket_count
+        self._failures = [0] * bucket_count
+        self._repairs = [0] * bucket_count
+        self.up_seconds = 0.0
+        self.down_seconds = 0.0
+        self.failures = 0
+        self.repairs = 0
+
+    def _advance(self, now: float):
+        """將視窗推進到 now 所在的桶，並清除已過期的桶"""
+        index = int(now // self.bucket_width)
+        if self._head is None:
+            self._head = index
+            return
+        if index <= self._head:
+            return
+
+        steps = min(index - self._head, self.bucket_count)
+        for offset in range(1, steps + 1):
+            slot = (self._head + offset) % self.bucket_count
+            self.up_seconds -= self._up[slot]
+            self.down_seconds -= self._down[slot]
+            self.failures -= self._failures[slot]
+            self.repairs -= self._repairs[slot]
+            self._up[slot] = 0.0
+            self._down[slot] = 0.0
+            self._failures[slot] = 0
+            self._repairs[slot] = 0
+        self._head = index
+
+        # 避免浮點累積誤差造成負值
+        if self.up_seconds < 0:
+            self.up_seconds = 0.0
+        if self.down_seconds < 0:
+            self.down_seconds = 0.0
+
+    def add_duration(self, start: float, end: float, up: bool):
+        """將 [start, end) 區間的上線/離線時間分配到對應的桶"""
+        if end <= start:
+            return
+        self._advance(end)
+
+        # 只需處理仍在視窗內的部分
+        oldest = (self._head - self.bucket_count + 1) * self.bucket_width
+        lo = max(start, oldest)
+        index = int(lo // self.bucket_width)
+        while lo < end:
+            boundary = min((index + 1) * self.bucket_width, end)
+            seconds = boundary - lo
+            if seconds > 0:
+                slot = index % self.bucket_count
+                if up:
+                    self._up[slot] += seconds
+                    self.up_seconds += seconds
+                else:
+                    self._down[slot] += seconds
+                    self.down_seconds += seconds
+            lo = boundary
+            index += 1
+
+    def add_transition(self, now: float, failure: bool):
+        """記錄一次狀態轉換（上線->離線為故障，離線->上線為修復）"""
+        self._advance(now)
+        slot = self._head % self.bucket_count
+        if failure:
+            self._failures[slot] += 1
+            self.failures += 1
+        else:
+            self._repairs[slot] += 1
+            self.repairs += 1
+
+    def expire(self, now: float):
+        """查詢前推進視窗"""
+        self._advance(now)
+
+
+def _new_windows() -> Dict[str, SlidingWindow]:
+    return {name: SlidingWindow(span, buckets) for name, (span, buckets) in AVAILABILITY_WINDOWS.items()}
+
+
+def _window_report(window: SlidingWindow, ongoing_up: float, ongoing_down: float) -> Dict:
+    """將視窗累計值轉換為可用率、MTBF、MTTR"""
+    up_seconds = window.up_seconds + ongoing_up
+    down_seconds = window.down_seconds + ongoing_down
+    observed = up_seconds + down_seconds
+    return {
+        "availability": round(up_seconds / observed, 6) if observed > 0 else None,
+        "up_seconds": round(up_seconds, 3),
+        "down_seconds": round(down_seconds, 3),
+        "failures": window.failures,
+        "repairs": window.repairs,
+        "mtbf_seconds": round(up_seconds / window.failures, 3) if window.failures else None,
+        "mttr_seconds": round(down_seconds / window.repairs, 3) if window.repairs else None,
+    }
+
+
+class _DeviceSeries:
+    """單一設備的狀態與視窗"""
+
+    __slots__ = ("controller_type", "alive", "since", "windows")
+
+    def __init__(self, controller_type: str, alive: bool, now: float):
+        self.controller_type = controller_type
+        self.alive = alive
+        self.since = now
+        self.windows = _new_windows()
+
+
+class _GroupSeries:
+    """同一 Controller_type 所有設備的合計視窗
+
+    進行中的狀態時間以「目前上線/離線設備數」及其起始時間總和維護，
+    查詢時以 count * now - since_sum 計算，不需逐台掃描。
+    """
+
+    __slots__ = ("windows", "up_count", "down_count", "up_since_sum", "down_since_sum")
+
+    def __init__(self):
+        self.windows = _new_windows()
+        self.up_count = 0
+        self.down_count = 0
+        self.up_since_sum = 0.0
+        self.down_since_sum = 0.0
+
+    def enter(self, alive: bool, since: float):
+        if alive:
+            self.up_count += 1
+            self.up_since_sum += since
+        else:
+            self.down_count += 1
+            self.down_since_sum += since
+
+    def leave(self, alive: bool, since: float):
+        if alive:
+            self.up_count -= 1
+            self.up_since_sum -= since
+        else:
+            self.down_count -= 1
+            self.down_since_sum -= since
+
+    @property
+    def device_count(self) -> int:
+        return self.up_count + self.down_count
+
+
+class AvailabilityTracker:
+    """設備與 Controller_type 的串流式可用率 / MTBF / MTTR 統計
+
+    每次狀態更新只做常數量的計數器更新；查詢成本與歷史長度無關。
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._devices: Dict[int, _DeviceSeries] = {}
+        self._groups: Dict[str, _GroupSeries] = {}
+
+    def _group(self, controller_type: str) -> _GroupSeries:
+        group = self._groups.get(controller_type)
+        if group is None:
+            group = _GroupSeries()
+            self._groups[controller_type] = group
+        return group
+
+    def record(self, proxyid: int, controller_type: str, alive: bool, now: Optional[float] = None):
+        """記錄設備最新狀態，若與前次不同則計入故障或修復"""
+        if now is None:
+            now = self._clock()
+        controller_type = controller_type or "unknown"
+
+        series = self._devices.get(proxyid)
+        if series is None:
+            self._devices[proxyid] = _DeviceSeries(controller_type, alive, now)
+            self._group(controller_type).enter(alive, now)
+            return
+
+        group = self._group(series.controller_type)
+
+        # 將上次更新至今的時間計入前一個狀態
+        if now > series.since:
+            for name, window in series.windows.items():
+                window.add_duration(series.since, now, series.alive)
+                group.windows[name].add_duration(series.since, now, series.alive)
+
+        if alive != series.alive:
+            failure = series.alive and not alive
+            for name, window in series.windows.items():
+                window.add_transition(now, failure)
+                group.windows[name].add_transition(now, failure)
+
+        group.leave(series.alive, series.since)
+        if controller_type != series.controller_type:
+            # 設備配置變更了 Controller_type，移至新的群組
+            series.controller_type = controller_type
+            group = self._group(controller_type)
+        series.alive = alive
+        series.since = max(now, series.since)
+        group.enter(series.alive, series.since)
+
+    def forget(self, proxyid: int):
+        """移除設備（例如設備被刪除或停用）"""
+        series = self._devices.pop(proxyid, None)
+        if series is not None:
+            group = self._group(series.controller_type)
+            group.leave(series.alive, series.since)
+
+    def device_report(self, proxyid: int, now: Optional[float] = None) -> Optional[Dict]:
+        """取得單一設備各視窗的可用率統計"""
+        series = self._devices.get(proxyid)
+        if series is None:
+            return None
+        if now is None:
+            now = self._clock()
+
+        ongoing = max(now - series.since, 0.0)
+        windows = {}
+        for name, window in series.windows.items():
+            window.expire(now)
+            pending = min(ongoing, window.span)
+            if series.alive:
+                windows[name] = _window_report(window, pending, 0.0)
+            else:
+                windows[name] = _window_report(window, 0.0, pending)
+
+        return {
+            "proxyid": proxyid,
+            "controller_type": series.controller_type,
+            "current_state": "up" if series.alive else "down",
+            "state_duration_seconds": round(ongoing, 3),
+            "windows": windows,
+        }
+
+    def controller_type_report(self, controller_type: str, now: Optional[float] = None) -> Optional[Dict]:
+        """取得 Controller_type 合計的可用率統計"""
+        group = self._groups.get(controller_type)
+        if group is None or group.device_count == 0:
+            return None
+        if now is None:
+            now = self._clock()
+
+        ongoing_up = max(group.up_count * now - group.up_since_sum, 0.0)
+        ongoing_down = max(group.down_count * now - group.down_since_sum, 0.0)
+        windows = {}
+        for name, window in group.windows.items():
+            window.expire(now)
+            # 合計視窗以「設備-秒」為單位，上限為視窗長度乘以設備數
+            span = window.span * group.device_count
+            windows[name] = _window_report(window, min(ongoing_up, span), min(ongoing_down, span))
+
+        return {
+            "controller_type": controller_type,
+            "device_count": group.device_count,
+            "devices_up": group.up_count,
+            "devices_down": group.down_count,
+            "windows": windows,
+        }
+
+    def summary(self, now: Optional[float] = None) -> Dict[str, List[Dict]]:
+        """取得所有設備與 Controller_type 的統計"""
+        if now is None:
+            now = self._clock()
+        devices = [self.device_report(proxyid, now) for proxyid in list(self._devices)]
+        controller_types = [
+            report for report in (self.controller_type_report(name, now) for name in list(self._groups))
+            if report is not None
+        ]
+        return {"devices": devices, "controller_types": controller_types}
@@ -9,10 +9,27 @@ from ..models.device import Device
 from ..repositories.device_repository import DeviceRepository
 from ..config_mqtt import settings
 from .device_processor import device_processor
+from .probe_coordinator import probe_coordinator
 from ..mqtt.publisher import mqtt_publisher
+from ..utils.metrics import metrics_registry
+from ..utils.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+SWEEP_DURATION = metrics_registry.histogram(
+    "device_service_sweep_duration_seconds",
+    "Wall time of one background worker health-check sweep",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+SWEEP_DEVICES = metrics_registry.gauge(
+    "device_service_sweep_devices",
+    "Number of cached devices covered by the last sweep"
+)
+SWEEP_ERRORS = metrics_registry.counter(
+    "device_service_sweep_errors_total",
+    "Background worker sweeps that raised an error"
+)
+
 def is_port_open(ip: str, port: int, timeout: float = 2.0) -> bool:
     """檢查指定 IP 和連接埠是否可以連線"""
     try:
@@ -28,6 +45,10 @@ class BackgroundWorker:
         self.is_running = False
         self.task = None
         self.devices_loaded = False  # 新增標記，記錄設備資料是否已載入
+        # 存活判斷用（time.monotonic）：啟動時間、最後完成一輪的時間、最後處理完一台設備的時間
+        self.started_at = None
+        self.last_sweep_at = None
+        self.last_progress_at = None
 
     def start(self):
         """啟動背景工作程序"""
@@ -36,6 +57,7 @@ class BackgroundWorker:
             return
 
         self.is_running = True
+        self.started_at = time.monotonic()
         self.task = asyncio.create_task(self._run())
         logger.info("Background worker started")
 
@@ -67,24 +89,33 @@ class BackgroundWorker:
 
     async def _execute_tasks(self):
         """執行背景任務"""
-        try:
-            logger.info("[BG_WORKER] Starting background task execution cycle")
+        started = time.perf_counter()
+        with tracer.span("sweep", sampled=tracer.enabled) as span:
+            try:
+                logger.info("[BG_WORKER] Starting background task execution cycle")
 
-            # 1. 從資料庫載入設備資料到快取
-            logger.debug("[BG_WORKER] Loading devices to cache")
-            await self._load_devices_to_cache()
+                # 1. 從資料庫載入設備資料到快取
+                logger.debug("[BG_WORKER] Loading devices to cache")
+                await self._load_devices_to_cache()
 
-            # 2. 檢查所有代理服務的健康狀態
-            logger.debug("[BG_WORKER] Checking all proxy health status")
-            await self._check_all_proxy_health()
+                # 2. 檢查所有代理服務的健康狀態
+                logger.debug("[BG_WORKER] Checking all proxy health status")
+                await self._check_all_proxy_health()
 
-            # 3. 處理自動啟動服務（現在邏輯已在健康檢查內部處理）
-            logger.debug("[BG_WORKER] Auto-start logic is now handled within health checks")
+                # 3. 處理自動啟動服務（現在邏輯已在健康檢查內部處理）
+                logger.debug("[BG_WORKER] Auto-start logic is now handled within health checks")
 
-            logger.info("[BG_WORKER] Background task execution cycle completed")
+                logger.info("[BG_WORKER] Background task execution cycle completed")
 
-        except Exception as e:
-            logger.error(f"[BG_WORKER] Error executing background tasks: {e}", exc_info=True)
+            except Exception as e:
+                SWEEP_ERRORS.inc()
+                span.set_error(e)
+                logger.error(f"[BG_WORKER] Error executing background tasks: {e}", exc_info=True)
+            finally:
+                self.last_sweep_at = self.last_progress_at = time.monotonic()
+                SWEEP_DURATION.observe(time.perf_counter() - started)
+                SWEEP_DEVICES.set(len(device_processor.device_cache))
+                span.set_attribute("devices", len(device_processor.device_cache))
 
     async def _load_devices_to_cache(self):
         """載入設備資料到快取（僅在啟動時執行一次）"""
@@ -94,7 +125,7 @@ class BackgroundWorker:
 
         try:
             logger.info("[CACHE_LOAD] Loading devices to cache for the first time")
-            devices = self.device_repository.get_all_devices()
+            devices = self.device_repository.get_all_devices(limit=None)  # 巡檢需涵蓋全部設備，不可套用分頁預設上限
 
             # 【關鍵修復】載入設備時保留現有狀態快取
             device_processor.load_devices_to_cache(devices)
@@ -122,6 +153,7 @@ class BackgroundWorker:
             skipped_devices = []
 
             for current_device in devices:
+                self.last_progress_at = time.monotonic()
                 logger.info(f"[HEALTH_SYNC] ========== Processing device {current_device.proxyid} (enabled: {current_device.enable}) ==========")
 
                 # 【修復】檢查設備狀態快取
@@ -138,8 +170,8 @@ class BackgroundWorker:
                     processed_devices.append(current_device.proxyid)
 
                     try:
-                        # 同步調用健康檢查（需要將異步方法改為同步）
-                        result = await device_processor.check_proxy_health(current_device)
+                        # 同步調用健康檢查（與同一設備進行中的 /Probe 請求共用探測）
+                        result = await probe_coordinator.probe(current_device)
 
                         if not isinstance(result, dict):
                             logger.error(f"[HEALTH_SYNC] Invalid result type for proxy {current_device.proxyid}: {type(result)}")
@@ -173,7 +205,7 @@ class BackgroundWorker:
                                     status="running",
                                     message="OK",
                                     proxyServiceAlive="1",
-                                    proxyServiceStart="1",
+                                    proxyServiceStart=proxyServiceStart or "1",
                                     controller_type=device_for_status.Controller_type,
                                     proxy_ip=device_for_status.proxy_ip,
                                     proxy_port=str(device_for_status.proxy_port),
@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ..config_mqtt import settings
+from ..models.device import Device
+from ..utils.metrics import metrics_registry
+from .proxy_commands import proxy_command_service
+from .start_limiter import start_limiter as default_start_limiter
+
+logger = logging.getLogger(__name__)
+
+COMMANDS_COALESCED = metrics_registry.counter(
+    "device_service_commands_coalesced_total",
+    "Proxy commands that did not cause their own request to the proxy, by reason",
+    ["reason"]
+)
+COMMANDS_PENDING = metrics_registry.gauge(
+    "device_service_commands_pending",
+    "Proxies with a queued (not yet sent) command"
+)
+SWEEP_STARTS_SKIPPED = metrics_registry.counter(
+    "device_service_sweep_starts_skipped_total",
+    "Background sweep /start calls skipped because of an operator command or an already deferred start, by reason",
+    ["reason"]
+)
+
+# 操作員最後成功下達這些指令時，巡檢不再自動呼叫 /start
+HOLD_COMMANDS = ("stop", "pause")
+
+
+class IdempotencyKeyConflict(Exception):
+    """同一 idempotency key 被用於不同的設備或指令"""
+
+
+class _Job:
+    """一台設備的一個待送出（或送出中）的指令，以及等待其結果的 future"""
+
+    __slots__ = ("command", "device", "waiters", "operator")
+
+    def __init__(self, command: str, device: Device, operator: bool = True):
+        self.command = command
+        self.device = device
+        self.waiters: List[asyncio.Future] = []
+        self.operator = operator
+
+
+class ProxyCommandQueue:
+    """每台設備序列化的指令佇列，全域最多 worker_count 台同時送出
+
+    - 同一 proxyid 同時最多一個指令送出中，其餘等待；等待中的指令只保留最後一個
+      （Start、Start、Stop 只送出 Stop），被取代的呼叫端取得最終指令的結果
+    - 與送出中指令相同的新指令直接共用其結果
+    - 帶 idempotency key 的重複請求在保存期限內直接取得第一次的結果
+    - 巡檢的 /start 也經過此佇列：有操作員指令等待或送出中，或操作員最後下的是 Stop/Pause 時略過；
+      並受 start_limiter 限流，取不到權杖時延後送出
+    """
+
+    def __init__(self, service=proxy_command_service, workers: Optional[int] = None,
+                 idempotency_ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic,
+                 start_limiter=default_start_limiter):
+        self.service = service
+        self.start_limiter = start_limiter
+        self.worker_count = workers or settings.COMMAND_QUEUE_WORKERS
+        self.idempotency_ttl = idempotency_ttl if idempotency_ttl is not None else settings.COMMAND_IDEMPOTENCY_TTL
+        self._clock = clock
+        # 操作員最後一次成功的指令（決定巡檢是否自動啟動），重新啟動服務後清空
+        self.last_operator_command: Dict[int, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reset()
+
+    def _reset(self):
+        self._pending: Dict[int, _Job] = {}
+        self._in_flight: Dict[int, _Job] = {}
+        # key -> (到期時間, proxyid, 指令, 第一次請求的結果)
+        self._idempotency: "OrderedDict[str, Tuple[float, int, str, asyncio.Future]]" = OrderedDict()
+        self._slots = asyncio.Semaphore(self.worker_count)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _bind_loop(self):
+        """佇列狀態綁定建立它的事件迴圈；換了事件迴圈（例如測試）時重新開始"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._reset()
+
+    async def stop(self):
+        await self.start_limiter.stop()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def holds_service_stopped(self, proxyid: int) -> bool:
+        return self.last_operator_command.get(proxyid) in HOLD_COMMANDS
+
+    async def submit(self, device: Device, command: str, idempotency_key: Optional[str] = None) -> Dict:
+        """排入指令並等待結果；被合併時結果附上 superseded_by（實際送出的指令）
+
+        idempotency key 只對第一次使用時的 proxyid 與指令有效，用於其他設備或指令時
+        引發 IdempotencyKeyConflict，不重播第一次的結果。
+        """
+        self._bind_loop()
+        proxyid = int(device.proxyid)
+        future = None
+        if idempotency_key:
+            self._expire_idempotency_keys()
+            entry = self._idempotency.get(idempotency_key)
+            if entry is not None:
+                _, key_proxyid, key_command, future = entry
+                if (key_proxyid, key_command) != (proxyid, command):
+                    raise IdempotencyKeyConflict(
+                        f"Idempotency-Key already used for {key_command} on proxy {key_proxyid}")
+                COMMANDS_COALESCED.labels("idempotent").inc()
+        if future is None:
+            future = self._loop.create_future()
+            if idempotency_key:
+                self._idempotency[idempotency_key] = (self._clock() + self.idempotency_ttl, proxyid, command, future)
+            self._enqueue(device, command, future)
+
+        # shield：呼叫端被取消（例如客戶端斷線）不影響共用同一結果的其他呼叫端
+        result = dict(await asyncio.shield(future))
+        if result.get("command") != command:
+            result["superseded_by"] = result.get("command")
+            result["command"] = command
+        return result
+
+    def _enqueue(self, device: Device, command: str, future: asyncio.Future):
+        proxyid = int(device.proxyid)
+        pending = self._pending.get(proxyid)
+        if pending is not None:
+            COMMANDS_COALESCED.labels("superseded" if pending.command != command else "duplicate").inc()
+            pending.command = command
+            pending.device = device
+            pending.waiters.append(future)
+            return
+
+        in_flight = self._in_flight.get(proxyid)
+        if in_flight is not None and in_flight.command == command:
+            COMMANDS_COALESCED.labels("joined").inc()
+            in_flight.waiters.append(future)
+            return
+
+        job = _Job(command, device)
+        job.waiters.append(future)
+        self._pending[proxyid] = job
+        COMMANDS_PENDING.set(len(self._pending))
+        if in_flight is None:
+            self._schedule(proxyid)
+
+    def _expire_idempotency_keys(self):
+        now = self._clock()
+        while self._idempotency:
+            key, (expires_at, *_) = next(iter(self._idempotency.items()))
+            if expires_at > now:
+                break
+            del self._idempotency[key]
+
+    def _schedule(self, proxyid: int):
+        task = self._loop.create_task(self._drain(proxyid))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, proxyid: int):
+        """依序送出該設備等待中的指令；全域同時送出的數量以 worker_count 個名額限制"""
+        async with self._slots:
+            while True:
+                job = self._pending.pop(proxyid, None)
+                COMMANDS_PENDING.set(len(self._pending))
+                if job is None:
+                    return
+                await self._run(proxyid, job)
+
+    async def _run(self, proxyid: int, job: _Job) -> Dict:
+        self._in_flight[proxyid] = job
+        try:
+            result = await self.service.execute(job.device, job.command)
+        except asyncio.CancelledError:
+            for future in job.waiters:
+                future.cancel()
+            del self._in_flight[proxyid]
+            raise
+        except Exception as e:
+            logger.error(f"[COMMAND_QUEUE] {job.command} raised for proxy {proxyid}: {e}", exc_info=True)
+            result = {"proxyid": proxyid, "command": job.command, "status": "error", "message": str(e)}
+
+        del self._in_flight[proxyid]
+        if job.operator and result["status"] == "success":
+            self.last_operator_command[proxyid] = job.command
+        for future in job.waiters:
+            if not future.done():
+                future.set_result(result)
+        return result
+
+    async def run_sweep_start(self, device: Device) -> Optional[Dict]:
+        """巡檢流程中的 /start，直接在呼叫端執行（不佔用名額）；略過或因限流延後時回傳 None"""
+        self._bind_loop()
+        proxyid = int(device.proxyid)
+        if self._skip_sweep_start(proxyid):
+            return None
+        if self.start_limiter.is_deferred(proxyid):
+            SWEEP_STARTS_SKIPPED.labels("already_deferred").inc()
+            return None
+        if not self.start_limiter.try_acquire(device):
+            self.start_limiter.defer(device, self._deferred_sweep_start)
+            return None
+        return await self._sweep_start(device)
+
+    def _skip_sweep_start(self, proxyid: int) -> bool:
+        if proxyid in self._pending or proxyid in self._in_flight:
+            SWEEP_STARTS_SKIPPED.labels("command_queued").inc()
+            return True
+        if self.holds_service_stopped(proxyid):
+            SWEEP_STARTS_SKIPPED.labels("held_by_operator").inc()
+            return True
+        return False
+
+    async def _deferred_sweep_start(self, device: Device) -> Optional[Dict]:
+        """限流延後的 /start：等待期間可能已有操作員指令，送出前再檢查一次"""
+        self._bind_loop()
+        if self._skip_sweep_start(int(device.proxyid)):
+            return None
+        return await self._sweep_start(device)
+
+    async def _sweep_start(self, device: Device) -> Dict:
+        proxyid = int(device.proxyid)
+        try:
+            return await self._run(proxyid, _Job("start", device, operator=False))
+        finally:
+            # 執行期間排入的操作員指令
+            if proxyid in self._pending:
+                self._schedule(proxyid)
+
+    async def execute_many(self, devices, command: str, concurrency: Optional[int] = None,
+                           idempotency_key: Optional[str] = None):
+        """群組指令：每台設備經過佇列（key 為 "<idempotency_key>:<proxyid>"），依完成順序產生結果"""
+        async def submit(device: Device, _command: str) -> Dict:
+            key = f"{idempotency_key}:{int(device.proxyid)}" if idempotency_key else None
+            try:
+                return await self.submit(device, _command, key)
+            except IdempotencyKeyConflict as e:
+                return {"proxyid": int(device.proxyid), "command": _command, "status": "error", "message": str(e)}
+
+        async for result in self.service.execute_many(devices, command, concurrency, runner=submit):
+            yield result
+
+    def report(self) -> Dict:
+        return {
+            "workers": self.worker_count,
+            "pending": {proxyid: job.command for proxyid, job in self._pending.items()},
+            "in_flight": {proxyid: job.command for proxyid, job in self._in_flight.items()},
+            "held_by_operator": {proxyid: command for proxyid, command in self.last_operator_command.items()
+                                 if command in HOLD_COMMANDS},
+            "idempotency_keys": len(self._idempotency),
+            "start_limiter": self.start_limiter.report(),
+        }
+
+
+# 全域指令佇列實例
+command_queue = ProxyCommandQueue()
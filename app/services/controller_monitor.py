@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..config_mqtt import settings
+from ..models.device import Device
+from ..utils.metrics import metrics_registry
+from ..utils.network import is_port_open_async
+from .device_processor import controller_endpoint, device_processor
+
+logger = logging.getLogger(__name__)
+
+CONTROLLER_PROBES = metrics_registry.counter(
+    "device_service_controller_probes_total",
+    "TCP reachability probes of controller endpoints (one per endpoint per cycle), by result",
+    ["result"]
+)
+CONTROLLER_PROBE_LATENCY = metrics_registry.histogram(
+    "device_service_controller_probe_duration_seconds",
+    "Duration of a controller endpoint TCP probe",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+CONTROLLERS_DOWN = metrics_registry.gauge(
+    "device_service_controllers_down",
+    "Controller endpoints whose last reachability probe failed"
+)
+
+Endpoint = Tuple[str, int]
+
+
+class ControllerMonitor:
+    """控制器端點的可達性監控，週期與設備巡檢分開
+
+    多台下位機常共用同一個控制器端點，因此每輪依 (Controller_ip, Controller_port)
+    分組，每個端點只做一次 TCP 連線檢查（並行上限 concurrency），結果以
+    controllerAlive 寫入該端點下所有設備的狀態快取，並保留端點層級的狀態供 /ControllerStatus 查詢。
+    """
+
+    def __init__(self, processor=device_processor, interval: Optional[float] = None,
+                 timeout: Optional[float] = None, concurrency: Optional[int] = None,
+                 connect: Callable[[str, int, float], Awaitable[bool]] = is_port_open_async):
+        self.processor = processor
+        self.interval = settings.CONTROLLER_PROBE_INTERVAL if interval is None else interval
+        self.timeout = settings.CONTROLLER_PROBE_TIMEOUT if timeout is None else timeout
+        self.concurrency = max(1, settings.CONTROLLER_PROBE_CONCURRENCY if concurrency is None else concurrency)
+        self.connect = connect
+        self.task: Optional[asyncio.Task] = None
+        self.controllers: Dict[Endpoint, Dict] = {}
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.error(f"[CONTROLLER_MONITOR] Controller probe cycle failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def endpoints(self) -> Dict[Endpoint, List[Device]]:
+        """啟用中的快取設備依控制器端點分組"""
+        groups: Dict[Endpoint, List[Device]] = {}
+        for device in self.processor.get_all_cached_devices():
+            endpoint = controller_endpoint(device)
+            if device.enable == 1 and endpoint is not None:
+                groups.setdefault(endpoint, []).append(device)
+        return groups
+
+    async def probe_all(self) -> Dict[Endpoint, Dict]:
+        """探測每個控制器端點一次並更新狀態快取，回傳端點狀態"""
+        groups = self.endpoints()
+        for endpoint in [endpoint for endpoint in self.controllers if endpoint not in groups]:
+            del self.controllers[endpoint]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def probe(endpoint: Endpoint, devices: List[Device]):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    alive = await self.connect(endpoint[0], endpoint[1], self.timeout)
+                except Exception as e:
+                    logger.warning(f"[CONTROLLER_MONITOR] Probe of {endpoint[0]}:{endpoint[1]} failed: {e}")
+                    alive = False
+                elapsed = time.perf_counter() - started
+            self._record(endpoint, devices, alive, elapsed)
+
+        await asyncio.gather(*(probe(endpoint, devices) for endpoint, devices in groups.items()))
+        return self.controllers
+
+    def _record(self, endpoint: Endpoint, devices: List[Device], alive: bool, elapsed: float):
+        CONTROLLER_PROBES.labels("up" if alive else "down").inc()
+        CONTROLLER_PROBE_LATENCY.observe(elapsed)
+        now = datetime.now().isoformat()
+        previous = self.controllers.get(endpoint)
+        if previous is None or previous["alive"] != alive:
+            if previous is not None:
+                logger.info(f"[CONTROLLER_MONITOR] Controller {endpoint[0]}:{endpoint[1]} "
+                            f"{'reachable' if alive else 'unreachable'} ({len(devices)} proxies)")
+            last_change = now
+        else:
+            last_change = previous["last_change"]
+        proxyids = sorted(int(device.proxyid) for device in devices)
+        self.controllers[endpoint] = {
+            "alive": alive,
+            "checked_at": now,
+            "last_change": last_change,
+            "latency_ms": round(elapsed * 1000, 3) if alive else None,
+            "controller_types": sorted({str(device.Controller_type or "unknown") for device in devices}),
+            "proxyids": proxyids,
+        }
+        self.processor.update_controller_status(endpoint, proxyids, alive)
+
+    def down_count(self) -> int:
+        return sum(1 for status in self.controllers.values() if not status["alive"])
+
+    def report(self, controller_ip: Optional[str] = None, controller_type: Optional[str] = None) -> List[Dict]:
+        """端點狀態列表，可依 Controller_ip / Controller_type 篩選"""
+        return [
+            {"controller_ip": ip, "controller_port": port, "controllerAlive": "1" if status["alive"] else "0", **status}
+            for (ip, port), status in sorted(self.controllers.items())
+            if (controller_ip is None or ip == controller_ip)
+            and (controller_type is None or controller_type in status["controller_types"])
+        ]
+
+
+# 全域控制器監控實例
+controller_monitor = ControllerMonitor()
+CONTROLLERS_DOWN.set_function(controller_monitor.down_count)
@@ -1,8 +1,14 @@
+import asyncio
 import logging
-from typing import Optional
+import time
+from typing import AsyncIterator, List, Optional, Tuple
 from sqlalchemy.orm import Session
+from ..config_mqtt import settings
 from ..models.device import Device, DeviceCreate, DeviceUpdate
 from ..repositories.device_repository import DeviceRepository
+from .command_queue import command_queue
+from .controller_monitor import controller_monitor
+from .probe_coordinator import probe_coordinator
 
 logger = logging.getLogger(__name__)
 
@@ -11,7 +17,8 @@ class DeviceServiceManager:
         self.db = db
         self.device_repository = DeviceRepository(db)
 
-    def get_health_status(self) -> dict:
+    @staticmethod
+    def get_health_status() -> dict:
         """獲取服務健康狀態"""
         return {
             "message": "Device Service is running",
@@ -20,7 +27,12 @@ class DeviceServiceManager:
 
     def get_all_devices(self) -> list[Device]:
         """獲取所有設備服務配置"""
-        return self.device_repository.get_all_devices()
+        return self.device_repository.get_all_devices(limit=None)
+
+    def get_device_page(self, page: int, size: int) -> Tuple[List[Device], int]:
+        """在資料庫分頁：回傳該頁設備與設備總數"""
+        devices = self.device_repository.get_all_devices(skip=(page - 1) * size, limit=size)
+        return devices, self.device_repository.count_devices()
 
     def get_device(self, proxyid: int) -> Device | None:
         """獲取特定設備服務配置"""
@@ -37,6 +49,7 @@ class DeviceServiceManager:
         """更新設備服務配置"""
         logger.info(f"Updating device with proxyid: {proxyid}")
         device = self.device_repository.update_device(proxyid, device_update)
+        probe_coordinator.forget(proxyid)
         if device:
             logger.info(f"Device updated successfully: {proxyid}")
         else:
@@ -47,77 +60,155 @@ class DeviceServiceManager:
         """刪除設備服務配置"""
         logger.info(f"Deleting device with proxyid: {proxyid}")
         device = self.device_repository.delete_device(proxyid)
+        probe_coordinator.forget(proxyid)
         if device:
             logger.info(f"Device deleted successfully: {proxyid}")
         else:
             logger.warning(f"Device not found for deletion: {proxyid}")
         return device
 
-    def start_proxy(self, proxyid: int) -> dict:
+    async def start_proxy(self, proxyid: int, idempotency_key: Optional[str] = None) -> dict:
         """啟動代理服務"""
-        logger.info(f"Starting proxy service: {proxyid}")
-        device = self.get_device(proxyid)
-        if not device:
-            return {"error": f"Device with proxyid {proxyid} not found"}
+        return await self._run_proxy_command(proxyid, "start", idempotency_key)
 
-        # TODO: 呼叫下位機的 start API
-        # result = call_proxy_api(device.proxy_ip, device.proxy_port, "start")
-
-
-        return {"message": f"Proxy service {proxyid} start initiated"}
-
-    def stop_proxy(self, proxyid: int) -> dict:
+    async def stop_proxy(self, proxyid: int, idempotency_key: Optional[str] = None) -> dict:
         """停止代理服務"""
-        logger.info(f"Stopping proxy service: {proxyid}")
-        device = self.get_device(proxyid)
-        if not device:
-            return {"error": f"Device with proxyid {proxyid} not found"}
-
-        # TODO: 呼叫下位機的 stop API
-        # result = call_proxy_api(device.proxy_ip, device.proxy_port, "stop")
+        return await self._run_proxy_command(proxyid, "stop", idempotency_key)
 
+    async def pause_proxy(self, proxyid: int, idempotency_key: Optional[str] = None) -> dict:
+        """暫停代理服務"""
+        return await self._run_proxy_command(proxyid, "pause", idempotency_key)
 
-        return {"message": f"Proxy service {proxyid} stop initiated"}
+    async def resume_proxy(self, proxyid: int, idempotency_key: Optional[str] = None) -> dict:
+        """恢復代理服務"""
+        return await self._run_proxy_command(proxyid, "resume", idempotency_key)
 
-    def pause_proxy(self, proxyid: int) -> dict:
-        """暫停代理服務"""
-        logger.info(f"Pausing proxy service: {proxyid}")
+    async def _run_proxy_command(self, proxyid: int, command: str, idempotency_key: Optional[str] = None) -> dict:
+        """經由指令佇列呼叫下位機的指令 API；設備不存在時回傳 {"error": ...}"""
+        logger.info(f"Sending {command} to proxy service: {proxyid}")
         device = self.get_device(proxyid)
         if not device:
             return {"error": f"Device with proxyid {proxyid} not found"}
 
-        # TODO: 呼叫下位機的 pause API
-        # result = call_proxy_api(device.proxy_ip, device.proxy_port, "pause")
-
-
-        return {"message": f"Proxy service {proxyid} pause initiated"}
-
-    def resume_proxy(self, proxyid: int) -> dict:
-        """恢復代理服務"""
-        logger.info(f"Resuming proxy service: {proxyid}")
+        result = await command_queue.submit(device, command, idempotency_key)
+        if result["status"] == "success":
+            response = {
+                "proxyid": proxyid,
+                "command": command,
+                "status": "success",
+                "message": f"Proxy service {proxyid} {command} initiated",
+                "result": result["message"]
+            }
+            if "superseded_by" in result:
+                response["superseded_by"] = result["superseded_by"]
+            return response
+        return result
+
+    def get_command_targets(self, proxyids: Optional[List[int]] = None,
+                            controller_types: Optional[List[str]] = None) -> Tuple[List[Device], List[int]]:
+        """群組指令的目標設備與找不到的 proxyid
+
+        指定 proxyid 時不論是否啟用都會送出；否則為指定 Controller_type（皆未指定時為全部）中已啟用的設備。
+        是否允許以全部設備為目標由呼叫端（路由的 all=true）決定。
+        """
+        if proxyids:
+            devices = self.device_repository.get_devices(proxyids=proxyids)
+            found = {int(device.proxyid) for device in devices}
+            return devices, [proxyid for proxyid in dict.fromkeys(proxyids) if proxyid not in found]
+        return self.device_repository.get_devices(controller_types=controller_types, enabled_only=True), []
+
+    @staticmethod
+    async def run_proxy_command_group(command: str, devices: List[Device], missing: List[int],
+                                      concurrency: Optional[int] = None,
+                                      idempotency_key: Optional[str] = None) -> AsyncIterator[dict]:
+        """並行送出群組指令，依完成順序逐筆產生結果，最後產生 {"summary": ...}"""
+        started = time.perf_counter()
+        counts = {"success": 0, "error": 0, "not_found": 0}
+        for proxyid in missing:
+            counts["not_found"] += 1
+            yield {"proxyid": proxyid, "command": command, "status": "not_found",
+                   "message": f"Device with proxyid {proxyid} not found"}
+        async for result in command_queue.execute_many(devices, command, concurrency, idempotency_key):
+            counts[result["status"]] += 1
+            yield result
+        yield {"summary": {
+            "command": command,
+            "total": len(devices) + len(missing),
+            **counts,
+            "elapsed_s": round(time.perf_counter() - started, 3)
+        }}
+
+    async def probe_proxy(self, proxyid: int, max_age: Optional[float] = None) -> dict:
+        """立即探測設備（與進行中的探測共用結果；max_age 秒內的結果直接回傳，預設 PROBE_FRESHNESS_WINDOW）
+
+        設備不存在時回傳 {"error": ...}
+        """
         device = self.get_device(proxyid)
         if not device:
             return {"error": f"Device with proxyid {proxyid} not found"}
-
-        # TODO: 呼叫下位機的 resume API
-        # result = call_proxy_api(device.proxy_ip, device.proxy_port, "resume")
-
-
-        return {"message": f"Proxy service {proxyid} resume initiated"}
+        return await probe_coordinator.probe(device, probe_coordinator.freshness if max_age is None else max_age,
+                                             start=False)
+
+    @staticmethod
+    async def run_probe_group(devices: List[Device], missing: List[int], concurrency: Optional[int] = None,
+                              max_age: Optional[float] = None) -> AsyncIterator[dict]:
+        """並行探測多台設備（只探測，不呼叫 /start），依完成順序逐筆產生結果，最後產生 {"summary": ...}"""
+        started = time.perf_counter()
+        max_age = probe_coordinator.freshness if max_age is None else max_age
+        counts = {"healthy": 0, "unhealthy": 0, "not_found": 0}
+        sources = {"probe": 0, "joined": 0, "cache": 0}
+        for proxyid in missing:
+            counts["not_found"] += 1
+            yield {"proxyid": proxyid, "status": "not_found", "message": f"Device with proxyid {proxyid} not found"}
+
+        # 固定數量的工作協程從共用迭代器取設備；呼叫端停止迭代（串流客戶端斷線）時取消其餘探測
+        pending = iter(devices)
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            for device in pending:
+                try:
+                    result = await probe_coordinator.probe(device, max_age, start=False)
+                except Exception as e:
+                    logger.error(f"Probe of proxy {device.proxyid} raised: {e}", exc_info=True)
+                    result = {"proxyid": int(device.proxyid), "status": "error", "message": str(e), "healthy": False}
+                await results.put(result)
+            await results.put(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency or settings.PROXY_COMMAND_CONCURRENCY)]
+        try:
+            remaining = len(workers)
+            while remaining:
+                result = await results.get()
+                if result is None:
+                    remaining -= 1
+                    continue
+                counts["healthy" if result.get("healthy") else "unhealthy"] += 1
+                if result.get("source") in sources:
+                    sources[result["source"]] += 1
+                yield result
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        yield {"summary": {
+            "total": len(devices) + len(missing),
+            **counts,
+            "sources": sources,
+            "elapsed_s": round(time.perf_counter() - started, 3)
+        }}
 
     def get_proxy_status(self, proxyid: Optional[int] = None) -> dict | list:
         """獲取代理服務狀態（從 device_status_cache 讀取）"""
         from .device_processor import device_processor
 
-        logger.info(f"Getting proxy status for proxyid: {proxyid}")
+        logger.debug(f"Getting proxy status for proxyid: {proxyid}")
 
         if proxyid:
             # 從 device_status_cache 獲取設備狀態
             device_status = device_processor.get_device_status_from_cache(proxyid)
-            logger.info(f"Device status from cache for proxyid {proxyid}: {device_status}")
-
             if device_status:
-                logger.info(f"Returning cached status for proxyid {proxyid}: {device_status}")
+                logger.debug(f"Returning cached status for proxyid {proxyid}: {device_status}")
                 return device_status
             else:
                 # 如果快取中沒有資料，從資料庫獲取設備基本資訊
@@ -135,24 +226,51 @@ class DeviceServiceManager:
                     "controller_type": device.Controller_type,
                     "proxy_ip": device.proxy_ip,
                     "proxy_port": str(device.proxy_port),
-                    "remark": device.remark
+                    "remark": device.remark,
+                    "controllerAlive": device_processor.controller_alive(device)
                 }
                 logger.info(f"Returning default status for proxyid {proxyid}: {default_status}")
                 return default_status
         else:
-            # 獲取所有代理服務狀態，從 device_status_cache 讀取
-            all_device_status = device_processor.get_all_device_status_from_cache()
-            logger.info(f"All device status from cache: {all_device_status}")
-
-            if not all_device_status:
-                # 如果快取為空，返回空列表
-                logger.info("No device status in cache, returning empty list")
-                return []
-
-            # 將快取資料轉換為列表格式返回
-            status_list = []
-            for proxyid, status in all_device_status.items():
-                status_list.append(status)
-
-            logger.info(f"Returning status list with {len(status_list)} items")
-            return status_list
\ No newline at end of file
+            return self.get_all_proxy_status()
+
+    @staticmethod
+    def get_all_proxy_status() -> list:
+        """獲取所有代理服務狀態，直接從 device_status_cache 讀取（不複製、不逐筆記錄內容，不需資料庫）"""
+        from .device_processor import device_processor
+        status_list = list(device_processor.device_status_cache.values())
+        logger.debug(f"Returning status list with {len(status_list)} items (version {device_processor.device_status_cache.version})")
+        return status_list
+
+    @staticmethod
+    def get_controller_status(controller_ip: Optional[str] = None, controller_type: Optional[str] = None) -> list:
+        """獲取控制器端點狀態（每個 Controller_ip:Controller_port 一筆，附上其下的 proxyid）"""
+        return controller_monitor.report(controller_ip, controller_type)
+
+    @staticmethod
+    def get_proxy_status_version() -> int:
+        """取得目前狀態快取版本"""
+        from .device_processor import device_processor
+        return device_processor.device_status_cache.version
+
+    @staticmethod
+    def get_proxy_status_etag() -> str:
+        """取得目前狀態快取的 ETag"""
+        from .device_processor import device_processor
+        return device_processor.device_status_cache.etag
+
+    @staticmethod
+    async def wait_for_proxy_status_change(since: int, timeout: float, proxyid: Optional[int] = None) -> bool:
+        """長輪詢：等待狀態版本超過 since（可限定 proxyid），逾時回傳 False"""
+        from .device_processor import device_processor
+        from ..config_mqtt import settings
+        timeout = min(timeout, settings.STATUS_LONG_POLL_MAX_WAIT)
+        return await device_processor.device_status_cache.wait_for_change(since, timeout, key=proxyid)
+
+    @staticmethod
+    def get_proxy_status_changes(since: int) -> dict:
+        """獲取指定版本之後變更/移除的代理服務狀態"""
+        from .device_processor import device_processor
+        changes = device_processor.get_device_status_changes(since)
+        logger.debug(f"Status changes since {since}: {len(changes['changed'])} changed, {len(changes['removed'])} removed, reset={changes['reset']}")
+        return changes
@@ -1,17 +1,75 @@
 import logging
 import httpx
 import asyncio
-from typing import Dict, List, Optional
+import time
+from typing import Dict, List, Optional, Tuple
 from ..models.device import Device
-from ..utils.network import is_port_open
+from ..utils.network import is_port_open_async
+from .adaptive_timeouts import AdaptiveTimeouts
+from .availability import AvailabilityTracker
+from .flap_damping import FlapDamper
+from .status_store import VersionedStatusStore
+from ..utils.metrics import metrics_registry
+from ..utils.http_pool import http_client_pool
+from ..utils.tracing import tracer
+from ..config_mqtt import settings
 
 logger = logging.getLogger(__name__)
 
+PROBE_LATENCY = metrics_registry.histogram(
+    "device_service_probe_duration_seconds",
+    "Duration of a proxy health probe (port check, /Health and /start) by outcome",
+    ["outcome"]
+)
+PROBES_IN_FLIGHT = metrics_registry.gauge(
+    "device_service_probes_in_flight",
+    "Number of proxy health probes currently running"
+)
+
+PROBE_TCP_CONNECTS = metrics_registry.counter(
+    "device_service_probe_tcp_connects_total",
+    "TCP handshakes made by proxy probes: port checks and new HTTP connections (keep-alive reuse makes none)",
+    ["source"]
+)
+PROBE_HEDGES = metrics_registry.counter(
+    "device_service_probe_hedges_total",
+    "Hedged /Health requests sent, and how many of them answered first",
+    ["result"]
+)
+
+# check_proxy_health result -> probe outcome label
+_PROBE_OUTCOMES = {
+    ("disable", "Device disabled"): "disabled",
+    ("unreachable", "proxy Port not accessible"): "unreachable",
+    ("remove", "Request_NG"): "http_error",
+    ("remove", "NG_Timeout"): "timeout",
+    ("remove", "NG"): "error",
+}
+
+
+def controller_endpoint(device: Device) -> Optional[Tuple[str, int]]:
+    """Controller endpoint (Controller_ip, Controller_port) of a device, None when not configured"""
+    if not device.Controller_ip or not device.Controller_port:
+        return None
+    return str(device.Controller_ip), int(device.Controller_port)
+
+
 class DeviceServiceProcessor:
     def __init__(self):
         self.device_cache: Dict[int, Device] = {}
-        self.device_status_cache: Dict[int, Dict] = {}  # Added device status cache
+        self.device_status_cache = VersionedStatusStore()  # Device status cache with change versions
         self.proxy_status_cache: Dict[int, str] = {}
+        self.availability_tracker = AvailabilityTracker()  # Rolling uptime/MTBF/MTTR per device and controller type
+        self.timeouts = AdaptiveTimeouts()  # Per-device probe timeouts derived from observed RTT
+        self.flap_damper = FlapDamper()  # Hysteresis and flap damping between probe results and published state
+        self.controller_status: Dict[Tuple[str, int], str] = {}  # Controller endpoint -> controllerAlive ("1"/"0")
+        metrics_registry.gauge(
+            "device_service_flap_suppressed_devices",
+            "Devices held down by flap damping until their penalty decays"
+        ).set_function(lambda: self.flap_damper.suppressed_count())
+        # Network seams: the simulator swaps these for modeled proxies (None = real httpx transport)
+        self.http_transport: Optional[httpx.AsyncBaseTransport] = None
+        self.port_probe = is_port_open_async  # Non-blocking, so grouped commands and probes overlap their port checks
         from ..config import SHOULD_LOG_CHANGES
         self.should_log_changes = SHOULD_LOG_CHANGES  # Added attribute to control logging changes
 
@@ -27,7 +85,7 @@ class DeviceServiceProcessor:
             
             # Only enabled devices create status cache
             if device.enable == 1:
-                self.device_status_cache[device.proxyid] = {
+                self.device_status_cache.set(device.proxyid, {
                     'message': 'OK',
                     'proxyid': device.proxyid,
                     'proxyServiceAlive': '0',
@@ -35,8 +93,17 @@ class DeviceServiceProcessor:
                     'controller_type': str(device.Controller_type or "unknown"),
                     'proxy_ip': str(device.proxy_ip or "unknown"),
                     'proxy_port': str(device.proxy_port or "0"),
-                    'remark': str(device.remark or "unknown")
-                }
+                    'remark': str(device.remark or "unknown"),
+                    'controllerAlive': self.controller_alive(device)
+                })
+
+        # Drop status entries of devices that were deleted or disabled (recorded as removals)
+        enabled_ids = {device.proxyid for device in devices if device.enable == 1}
+        for proxyid in [proxyid for proxyid in self.device_status_cache if proxyid not in enabled_ids]:
+            self.device_status_cache.remove(proxyid)
+            self.availability_tracker.forget(proxyid)
+            self.timeouts.forget(proxyid)
+            self.flap_damper.forget(proxyid)
         
         logger.info(f"[CACHE_LOAD] Cache load completed: {len(devices)} devices loaded")
         logger.info(f"[CACHE_LOAD] Device status cache now contains {len(self.device_status_cache)} entries")
@@ -49,7 +116,35 @@ class DeviceServiceProcessor:
         """Get all cached device data"""
         return list(self.device_cache.values())
 
-    async def check_proxy_health(self, device: Device) -> Dict:
+    async def check_proxy_health(self, device: Device, start: bool = True) -> Dict:
+        """Check proxy service health status (records probe latency and in-flight metrics)
+
+        start=False probes without calling /start on a healthy device (used by /Probe).
+        """
+        PROBES_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        outcome = "error"
+        with tracer.span("probe", proxyid=int(device.proxyid), sampled=tracer.sample(),
+                         proxy_ip=str(device.proxy_ip), proxy_port=int(device.proxy_port)) as span:
+            try:
+                result = await self._check_proxy_health(device, start)
+                if result.get("status") != "disable":
+                    # Feed availability aggregators from the (damped) probe result only, O(1) per probe
+                    self.availability_tracker.record(int(device.proxyid), str(device.Controller_type or "unknown"),
+                                                     result.get("proxyServiceAlive") == "1")
+                if result.get("suppressed"):
+                    outcome = "suppressed"
+                elif result.get("healthy"):
+                    outcome = "healthy"
+                else:
+                    outcome = _PROBE_OUTCOMES.get((result.get("status"), result.get("message")), "error")
+                return result
+            finally:
+                span.set_attribute("outcome", outcome)
+                PROBES_IN_FLIGHT.dec()
+                PROBE_LATENCY.labels(outcome).observe(time.perf_counter() - started)
+
+    async def _check_proxy_health(self, device: Device, start: bool = True) -> Dict:
         """Check proxy service health status"""
         logger.info(f"[HEALTH_CHECK] Starting health check for proxy {device.proxyid} (IP: {device.proxy_ip}:{device.proxy_port})")
 
@@ -66,29 +161,11 @@ class DeviceServiceProcessor:
                 "healthy": False
             }
 
-        # Check if port is accessible
+        # Check if port is accessible (HTTP-only mode folds this into the /Health request)
+        http_only = settings.PROBE_MODE == "http"
         logger.debug(f"[HEALTH_CHECK] Checking port accessibility for proxy {int(device.proxyid)}")
-        if not is_port_open(str(device.proxy_ip), int(device.proxy_port), timeout=0.2):
-            logger.error(f"[HEALTH_CHECK] Port {int(device.proxy_port)} on {str(device.proxy_ip)} is not accessible for proxy {int(device.proxyid)}")
-            logger.debug(f"[HEALTH_CHECK] Port check failed. Possible reasons: port in use, firewall blocking, or service not running.")
-
-            # Update device status cache to port not accessible status
-            self.update_device_status_cache(
-                proxyid=int(device.proxyid),
-                message="Proxy Port not accessible",
-                proxyServiceAlive="0", 
-                proxyServiceStart="0" 
-            )
-
-            return {
-                "proxyid": int(device.proxyid),
-                "status": "unreachable",
-                "message": "proxy Port not accessible",
-                "proxyServiceAlive": "0",
-                "proxyServiceStart": "0",
-                "needs_start": False,
-                "healthy": False
-            }
+        if not http_only and not await self._probe_port(device):
+            return self._port_not_accessible(device)
 
         try:
             url = f"http://{str(device.proxy_ip)}:{int(device.proxy_port)}/Health"
@@ -96,101 +173,134 @@ class DeviceServiceProcessor:
 
             health_params = {}  # Health check parameters, can add if needed
 
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, params=health_params, timeout=5.0)
-                if response.status_code == 200:
-                    data = response.json()
-                    logger.info(f"[HEALTH_CHECK] Health check response for proxy {int(device.proxyid)}: {data}")
-
+            # Without a TCP pre-check the connect timeout keeps the port check's budget
+            timeout = self.timeouts.http_timeout(int(device.proxyid), "health", settings.PROBE_HEALTH_TIMEOUT,
+                                                 connect_default=settings.PROBE_PORT_TIMEOUT if http_only else None)
+            with tracer.child_span("http.health", url=url, timeout=timeout.read) as span:
+                started = time.perf_counter()
+                try:
+                    response = await self._request_health(device, url, health_params, timeout)
+                except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                    if not http_only:
+                        raise
+                    # HTTP-only mode: a failed connect is the port check failing
+                    span.set_attribute("connect_error", type(e).__name__)
+                    if isinstance(e, httpx.ConnectTimeout):
+                        self.timeouts.timed_out(int(device.proxyid), "connect")
+                    return self._port_not_accessible(device)
+                self.timeouts.observe(int(device.proxyid), "health", time.perf_counter() - started)
+                span.set_attribute("http.status_code", response.status_code)
+            if response.status_code == 200:
+                data = response.json()
+                logger.info(f"[HEALTH_CHECK] Health check response for proxy {int(device.proxyid)}: {data}")
+                held = self._hold_damped_state(device, up=True)
+                if held:
+                    return held
+
+                if start:
                     # Network communication is OK, call Start API
                     logger.info(f"[HEALTH_CHECK] Network communication OK for device {int(device.proxyid)}, calling start API")
+                    # Goes through the command queue so it never races an operator Start/Stop
+                    from .command_queue import command_queue
                     try:
-                        start_result = await self.start_proxy_service(device)
+                        start_result = await command_queue.run_sweep_start(device)
                         logger.info(f"[HEALTH_CHECK] Start API result for device {int(device.proxyid)}: {start_result}")
                     except Exception as e:
                         logger.error(f"[HEALTH_CHECK] Error calling start API for device {int(device.proxyid)}: {e}")
-
-                    # Update device status cache to success status
-                    self.update_device_status_cache(
-                        int(device.proxyid),
-                        data.get("message", "OK"),
-                        "1",  # proxyServiceAlive = 1 (network communication OK)
-                        "1"   # proxyServiceStart = 1 (Start API called)
-                    )
-
-                    # Publish MQTT message - network communication OK
-                    from ..mqtt.publisher import mqtt_publisher
-                    mqtt_payload = {
-                        "message": data.get("message", "OK"),
-                        "proxyServiceAlive": "1",
-                        "proxyServiceStart": "1",
-                        "controller_type": str(device.Controller_type or "unknown"),
-                        "proxy_ip": str(device.proxy_ip or "unknown"),
-                        "proxy_port": str(device.proxy_port or "0"),
-                        "remark": str(device.remark or "unknown")
-                    }
-                    # Use the actual proxyid of the device
-                    actual_proxyid = int(device.proxyid)
-                    mqtt_publisher.publish_proxy_status_update(
-                        proxyid=actual_proxyid,
-                        status="healthy",
-                        **mqtt_payload
-                    )
-                    logger.info(f"[HEALTH_CHECK] Published MQTT message for device {int(device.proxyid)}: network OK")
-
-                    # Return health check result
-                    return {
-                        "proxyid": int(device.proxyid),
-                        "status": "healthy",
-                        "message": data.get("message", "OK"),
-                        "proxyServiceAlive": "1",
-                        "proxyServiceStart": "1",
-                        "needs_start": False,
-                        "healthy": True
-                    }
+                    # An operator Stop/Pause holds the service stopped until the next Start/Resume
+                    service_start = "0" if command_queue.holds_service_stopped(int(device.proxyid)) else "1"
                 else:
-                    logger.warning(f"Health check failed for proxy {int(device.proxyid)}: HTTP {response.status_code}")
-                    # Create remove message and update cache if health API fails
-                    error_message = f"HTTP {response.status_code}"
-
-                    # Update device status cache to failed status
-                    self.update_device_status_cache(
-                        int(device.proxyid),
-                        error_message,
-                        "0",  # proxyServiceAlive
-                        "0"   # proxyServiceStart
-                    )
-
-                    # Publish MQTT message - network communication failed
-                    from ..mqtt.publisher import mqtt_publisher
-                    mqtt_payload = {
-                        "message": "Request_NG",
-                        "proxyServiceAlive": "0",
-                        "proxyServiceStart": "0",
-                        "controller_type": str(device.Controller_type or "unknown"),
-                        "proxy_ip": str(device.proxy_ip or "unknown"),
-                        "proxy_port": str(device.proxy_port or "0"),
-                        "remark": str(device.remark or "unknown")
-                    }
-                    mqtt_publisher.publish_proxy_status_update(
-                        proxyid=int(device.proxyid),
-                        status="remove",
-                        **mqtt_payload
-                    )
-                    logger.info(f"[HEALTH_CHECK] Published MQTT message for device {int(device.proxyid)}: network failed")
-
-                    error_payload = {
-                        "proxyid": int(device.proxyid),
-                        "status": "remove",
-                        "message":  "Request_NG",
-                        "proxyServiceAlive":  "0",
-                        "proxyServiceStart":  "0",
-                        "needs_start": False,
-                        "healthy": False
-                    }
-                    return error_payload
-        except httpx.TimeoutException:
+                    # Probe-only (/Probe): no /start side effect, proxyServiceStart stays as the sweep left it
+                    service_start = (self.get_device_status_from_cache(int(device.proxyid)) or {}).get('proxyServiceStart', "0")
+
+                # Update device status cache to success status
+                self.update_device_status_cache(
+                    int(device.proxyid),
+                    data.get("message", "OK"),
+                    "1",  # proxyServiceAlive = 1 (network communication OK)
+                    service_start  # proxyServiceStart = 1 (Start API called), 0 while held stopped
+                )
+
+                # Publish MQTT message - network communication OK
+                from ..mqtt.publisher import mqtt_publisher
+                mqtt_payload = {
+                    "message": data.get("message", "OK"),
+                    "proxyServiceAlive": "1",
+                    "proxyServiceStart": service_start,
+                    "controller_type": str(device.Controller_type or "unknown"),
+                    "proxy_ip": str(device.proxy_ip or "unknown"),
+                    "proxy_port": str(device.proxy_port or "0"),
+                    "remark": str(device.remark or "unknown")
+                }
+                # Use the actual proxyid of the device
+                actual_proxyid = int(device.proxyid)
+                mqtt_publisher.publish_proxy_status_update(
+                    proxyid=actual_proxyid,
+                    status="healthy",
+                    **mqtt_payload
+                )
+                logger.info(f"[HEALTH_CHECK] Published MQTT message for device {int(device.proxyid)}: network OK")
+
+                # Return health check result
+                return {
+                    "proxyid": int(device.proxyid),
+                    "status": "healthy",
+                    "message": data.get("message", "OK"),
+                    "proxyServiceAlive": "1",
+                    "proxyServiceStart": service_start,
+                    "needs_start": False,
+                    "healthy": True
+                }
+            else:
+                logger.warning(f"Health check failed for proxy {int(device.proxyid)}: HTTP {response.status_code}")
+                held = self._hold_damped_state(device, up=False)
+                if held:
+                    return held
+                # Create remove message and update cache if health API fails
+                error_message = f"HTTP {response.status_code}"
+
+                # Update device status cache to failed status
+                self.update_device_status_cache(
+                    int(device.proxyid),
+                    error_message,
+                    "0",  # proxyServiceAlive
+                    "0"   # proxyServiceStart
+                )
+
+                # Publish MQTT message - network communication failed
+                from ..mqtt.publisher import mqtt_publisher
+                mqtt_payload = {
+                    "message": "Request_NG",
+                    "proxyServiceAlive": "0",
+                    "proxyServiceStart": "0",
+                    "controller_type": str(device.Controller_type or "unknown"),
+                    "proxy_ip": str(device.proxy_ip or "unknown"),
+                    "proxy_port": str(device.proxy_port or "0"),
+                    "remark": str(device.remark or "unknown")
+                }
+                mqtt_publisher.publish_proxy_status_update(
+                    proxyid=int(device.proxyid),
+                    status="remove",
+                    **mqtt_payload
+                )
+                logger.info(f"[HEALTH_CHECK] Published MQTT message for device {int(device.proxyid)}: network failed")
+
+                error_payload = {
+                    "proxyid": int(device.proxyid),
+                    "status": "remove",
+                    "message":  "Request_NG",
+                    "proxyServiceAlive":  "0",
+                    "proxyServiceStart":  "0",
+                    "needs_start": False,
+                    "healthy": False
+                }
+                return error_payload
+        except httpx.TimeoutException as e:
             logger.warning(f"Health check timeout for proxy {int(device.proxyid)}")
+            self.timeouts.timed_out(int(device.proxyid), "connect" if isinstance(e, httpx.ConnectTimeout) else "health")
+            held = self._hold_damped_state(device, up=False)
+            if held:
+                return held
             # Create remove message and publish MQTT, and update cache on timeout
             timeout_message = "NG_Timeout"
 
@@ -232,6 +342,9 @@ class DeviceServiceProcessor:
             return timeout_payload
         except Exception as e:
             logger.error(f"Error checking health for proxy {int(device.proxyid)}: {e}")
+            held = self._hold_damped_state(device, up=False)
+            if held:
+                return held
             # Create remove message and publish MQTT, and update cache on exception
             exception_message = f"Error: {str(e)}"
 
@@ -272,25 +385,149 @@ class DeviceServiceProcessor:
             }
             return exception_payload
 
+    def _hold_damped_state(self, device: Device, up: bool) -> Optional[Dict]:
+        """Feed a probe result to the flap damper
+
+        Returns None when the result is the accepted state (the caller updates the cache and
+        publishes as usual); otherwise a result describing the unchanged state, without touching
+        the status cache, MQTT or /start.
+        """
+        proxyid = int(device.proxyid)
+        if self.flap_damper.observe(proxyid, up) == up:
+            return None
+        logger.info(f"[HEALTH_CHECK] Proxy {proxyid} probe was {'up' if up else 'down'}; "
+                    f"keeping state {'down' if up else 'up'} (hysteresis/flap damping)")
+        cached = self.get_device_status_from_cache(proxyid) or {}
+        return {
+            "proxyid": proxyid,
+            "status": "remove" if up else "healthy",
+            "message": cached.get("message", "NG" if up else "OK"),
+            "proxyServiceAlive": "0" if up else "1",
+            "proxyServiceStart": cached.get("proxyServiceStart", "0"),
+            "needs_start": False,
+            "healthy": not up,
+            "suppressed": True
+        }
+
+    def _port_not_accessible(self, device: Device) -> Dict:
+        """Port check failed: mark the device unreachable"""
+        logger.error(f"[HEALTH_CHECK] Port {int(device.proxy_port)} on {str(device.proxy_ip)} is not accessible for proxy {int(device.proxyid)}")
+        logger.debug(f"[HEALTH_CHECK] Port check failed. Possible reasons: port in use, firewall blocking, or service not running.")
+        held = self._hold_damped_state(device, up=False)
+        if held:
+            return held
+
+        # Update device status cache to port not accessible status
+        self.update_device_status_cache(
+            proxyid=int(device.proxyid),
+            message="Proxy Port not accessible",
+            proxyServiceAlive="0", 
+            proxyServiceStart="0" 
+        )
+
+        return {
+            "proxyid": int(device.proxyid),
+            "status": "unreachable",
+            "message": "proxy Port not accessible",
+            "proxyServiceAlive": "0",
+            "proxyServiceStart": "0",
+            "needs_start": False,
+            "healthy": False
+        }
+
+    def _connect_trace(self, proxyid: int) -> Dict:
+        """httpx trace extension: count new TCP connections and feed their duration to the connect estimate"""
+        started = []
+
+        async def trace(event_name: str, info: Dict):
+            if event_name == "connection.connect_tcp.started":
+                PROBE_TCP_CONNECTS.labels("http").inc()
+                started.append(time.perf_counter())
+            elif event_name == "connection.connect_tcp.complete" and started:
+                self.timeouts.observe(proxyid, "connect", time.perf_counter() - started.pop())
+
+        return {"trace": trace}
+
+    async def _request_health(self, device: Device, url: str, params: Dict, timeout: httpx.Timeout) -> httpx.Response:
+        """GET /Health on a pooled keep-alive connection, hedged for devices with a jittery history
+
+        With hedging enabled, a second request is sent once the first has been outstanding
+        longer than the device's ~p95 RTT; the first successful response wins.
+        """
+        proxyid = int(device.proxyid)
+        client = http_client_pool.get(self.http_transport)
+
+        def send():
+            return client.get(url, params=params, timeout=timeout, extensions=self._connect_trace(proxyid))
+
+        delay = None
+        if settings.PROBE_HEDGE_ENABLED:
+            delay = self.timeouts.hedge_delay(proxyid, "health", settings.PROBE_HEDGE_MIN_VARIANCE)
+        if delay is None or delay >= timeout.read:
+            return await send()
+
+        first = asyncio.ensure_future(send())
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        PROBE_HEDGES.labels("sent").inc()
+        second = asyncio.ensure_future(send())
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            PROBE_HEDGES.labels("won").inc()
+                        return task.result()
+            return first.result()  # both failed: raise the original request's error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _probe_port(self, device: Device) -> bool:
+        """TCP connect check of the proxy port (traced as tcp_connect)"""
+        proxyid = int(device.proxyid)
+        timeout = self.timeouts.timeout(proxyid, "connect", settings.PROBE_PORT_TIMEOUT)
+        PROBE_TCP_CONNECTS.labels("port_check").inc()
+        with tracer.child_span("tcp_connect", timeout=timeout) as span:
+            started = time.perf_counter()
+            port_open = await self.port_probe(str(device.proxy_ip), int(device.proxy_port), timeout=timeout)
+            elapsed = time.perf_counter() - started
+            span.set_attribute("port_open", port_open)
+        if port_open:
+            self.timeouts.observe(proxyid, "connect", elapsed)
+        elif elapsed >= timeout:
+            # Refused connections fail fast; only a full wait counts as a timeout
+            self.timeouts.timed_out(proxyid, "connect")
+        return port_open
+
     async def start_proxy_service(self, device: Device) -> Dict:
-        """Call the lower machine to start the service"""
-        # Check if port is accessible
-        if not is_port_open(str(device.proxy_ip), int(device.proxy_port), timeout=0.2):
-            logger.error(f"Port {device.proxy_port} on {device.proxy_ip} is not accessible for proxy {device.proxyid}")
+        """Call the lower machine to start the service (traced as start)"""
+        with tracer.span("start", proxyid=int(device.proxyid)) as span:
+            result = await self._start_proxy_service(device)
+            span.set_attribute("status", result.get("status"))
+            return result
 
-            # Update device status cache to port not accessible status
-            self.update_device_status_cache(
-                device.proxyid,
-                "proxy Port not accessible",
-                "0",  # proxyServiceAlive
-                "0"   # proxyServiceStart
-            )
+    def _start_port_not_accessible(self, device: Device) -> Dict:
+        logger.error(f"Port {device.proxy_port} on {device.proxy_ip} is not accessible for proxy {device.proxyid}")
 
-            return {
-                "proxyid": int(device.proxyid),
-                "status": "error",
-                "message": "Proxy Port not accessible"
-            }
+        # proxyServiceAlive stays as the damped health check left it
+        self.mark_start_failed(int(device.proxyid), "proxy Port not accessible")
+
+        return {
+            "proxyid": int(device.proxyid),
+            "status": "error",
+            "message": "Proxy Port not accessible"
+        }
+
+    async def _start_proxy_service(self, device: Device) -> Dict:
+        """Call the lower machine to start the service"""
+        # Check if port is accessible (HTTP-only mode folds this into the /start request)
+        http_only = settings.PROBE_MODE == "http"
+        if not http_only and not await self._probe_port(device):
+            return self._start_port_not_accessible(device)
 
         try:
             url = f"http://{str(device.proxy_ip)}:{int(device.proxy_port)}/start"
@@ -305,58 +542,60 @@ class DeviceServiceProcessor:
             }
             logger.info(f"Sending start data for proxy {int(device.proxyid)}: {start_data}")
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=start_data, timeout=2.0)
-                if response.status_code == 200:
-                    data = response.json()
-                    logger.info(f"[START_PROXY] Successfully started proxy service {int(device.proxyid)}: {data}")
-
-                    # Update cache status
-                    self.proxy_status_cache[int(device.proxyid)] = "starting"
-
-                    # [Key Fix] Update device status cache, set proxyServiceStart to "1"
-                    self.update_device_status_cache(
-                        int(device.proxyid),
-                        data.get("message", "Proxy service start initiated"),
-                        "1",  # proxyServiceAlive = 1
-                        "1"   # proxyServiceStart = 1 (changed from 0 to 1, this is the key fix)
-                    )
-                    logger.info(f"[START_PROXY] Updated device status cache for proxy {int(device.proxyid)}: proxyServiceStart changed to '1'")
-
-                    return {
-                        "proxyid": int(device.proxyid),
-                        "status": "success",
-                        "message": data.get("message", "Proxy service start initiated"),
-                        "result": data
-                    }
-                else:
-                    # Update cache status
-                    self.proxy_status_cache[int(device.proxyid)] = "wait starting"
-
-                    # Update device status cache to failed status
-                    self.update_device_status_cache(
-                        int(device.proxyid),
-                        f"HTTP {response.status_code}",
-                        "0",  # proxyServiceAlive
-                        "0"   # proxyServiceStart
-                    )
-
-                    return {
-                        "proxyid": int(device.proxyid),
-                        "status": "error",
-                        "message": f"HTTP {response.status_code}",
-                        "result": response.text
-                    }
+            client = http_client_pool.get(self.http_transport)  # keep-alive connections shared with proxy commands
+            timeout = self.timeouts.http_timeout(int(device.proxyid), "start", settings.PROBE_START_TIMEOUT,
+                                                 connect_default=settings.PROBE_PORT_TIMEOUT if http_only else None,
+                                                 at_least_default=True)
+            with tracer.child_span("http.start", url=url, timeout=timeout.read) as span:
+                started = time.perf_counter()
+                response = await client.post(url, json=start_data, timeout=timeout,
+                                             extensions=self._connect_trace(int(device.proxyid)))
+                self.timeouts.observe(int(device.proxyid), "start", time.perf_counter() - started)
+                span.set_attribute("http.status_code", response.status_code)
+            if response.status_code == 200:
+                data = response.json()
+                logger.info(f"[START_PROXY] Successfully started proxy service {int(device.proxyid)}: {data}")
+
+                # Update cache status
+                self.proxy_status_cache[int(device.proxyid)] = "starting"
+
+                # [Key Fix] Update device status cache, set proxyServiceStart to "1"
+                self.update_device_status_cache(
+                    int(device.proxyid),
+                    data.get("message", "Proxy service start initiated"),
+                    "1",  # proxyServiceAlive = 1
+                    "1"   # proxyServiceStart = 1 (changed from 0 to 1, this is the key fix)
+                )
+                logger.info(f"[START_PROXY] Updated device status cache for proxy {int(device.proxyid)}: proxyServiceStart changed to '1'")
+
+                return {
+                    "proxyid": int(device.proxyid),
+                    "status": "success",
+                    "message": data.get("message", "Proxy service start initiated"),
+                    "result": data
+                }
+            else:
+                # Update cache status
+                self.proxy_status_cache[int(device.proxyid)] = "wait starting"
+
+                # Update device status cache to failed status (alive is owned by the health check)
+                self.mark_start_failed(int(device.proxyid), f"HTTP {response.status_code}")
+
+                return {
+                    "proxyid": int(device.proxyid),
+                    "status": "error",
+                    "message": f"HTTP {response.status_code}",
+                    "result": response.text
+                }
         except Exception as e:
             logger.error(f"Error starting proxy service {int(device.proxyid)}: {e}")
+            if isinstance(e, httpx.TimeoutException):
+                self.timeouts.timed_out(int(device.proxyid), "connect" if isinstance(e, httpx.ConnectTimeout) else "start")
+            if http_only and isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)):
+                return self._start_port_not_accessible(device)
 
-            # Update device status cache to exception status
-            self.update_device_status_cache(
-                int(device.proxyid),
-                f"Error: {str(e)}",
-                "0",  # proxyServiceAlive
-                "0"   # proxyServiceStart
-            )
+            # Update device status cache to exception status (alive is owned by the health check)
+            self.mark_start_failed(int(device.proxyid), f"Error: {str(e)}")
 
             return {
                 "proxyid": int(device.proxyid),
@@ -378,16 +617,26 @@ class DeviceServiceProcessor:
         return self.proxy_status_cache.copy()
 
     def update_device_status_cache(self, proxyid: int, message: str, proxyServiceAlive: str, proxyServiceStart: str):
+        """Update device status cache (traced as cache_update)"""
+        with tracer.child_span("cache_update"):
+            self._update_device_status_cache(proxyid, message, proxyServiceAlive, proxyServiceStart)
+
+    def mark_start_failed(self, proxyid: int, message: str):
+        """Record a failed /start or proxy command: clear proxyServiceStart and keep the damped proxyServiceAlive"""
+        status = self.device_status_cache.get(proxyid) or {}
+        self.update_device_status_cache(proxyid, message, status.get('proxyServiceAlive', "0"), "0")
+
+    def _update_device_status_cache(self, proxyid: int, message: str, proxyServiceAlive: str, proxyServiceStart: str):
         """Update device status cache"""
         if proxyid in self.device_status_cache:
             # Log original values
-            original_status = self.device_status_cache[proxyid].copy()
+            original_status = self.device_status_cache.get(proxyid).copy()
             original_message = original_status.get('message', 'None')
             original_alive = original_status.get('proxyServiceAlive', 'None')
             original_start = original_status.get('proxyServiceStart', 'None')
 
-            # Update device status cache
-            self.device_status_cache[proxyid].update({
+            # Update device status cache (version only bumps on an actual change)
+            self.device_status_cache.update(proxyid, {
                 'message': message,
                 'proxyServiceAlive': proxyServiceAlive,
                 'proxyServiceStart': proxyServiceStart
@@ -423,13 +672,32 @@ class DeviceServiceProcessor:
         else:
             logger.warning(f"Proxyid {proxyid} not found in device_status_cache")
 
+    def controller_alive(self, device: Device) -> str:
+        """controllerAlive of a device: "unknown" when no controller endpoint is configured, "0" until first probed"""
+        endpoint = controller_endpoint(device)
+        if endpoint is None:
+            return "unknown"
+        return self.controller_status.get(endpoint, "0")
+
+    def update_controller_status(self, endpoint: Tuple[str, int], proxyids: List[int], alive: bool):
+        """Record a controller endpoint probe result as controllerAlive on every proxy behind it"""
+        value = "1" if alive else "0"
+        self.controller_status[endpoint] = value
+        for proxyid in proxyids:
+            if proxyid in self.device_status_cache:
+                self.device_status_cache.update(proxyid, {'controllerAlive': value})
+
     def get_device_status_from_cache(self, proxyid: int) -> Optional[Dict]:
         """Get device status from cache"""
         return self.device_status_cache.get(proxyid)
 
     def get_all_device_status_from_cache(self) -> Dict[int, Dict]:
         """Get all device status cache"""
-        return self.device_status_cache.copy()
+        return self.device_status_cache.snapshot()
+
+    def get_device_status_changes(self, since: int) -> Dict:
+        """Get device status entries changed or removed after the given version"""
+        return self.device_status_cache.changes_since(since)
 
 # Global processor instance
 device_processor = DeviceServiceProcessor()
@@ -0,0 +1,118 @@
+import math
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from ..config_mqtt import settings
+from ..utils.metrics import metrics_registry
+
+STATUS_TRANSITIONS_SUPPRESSED = metrics_registry.counter(
+    "device_service_status_transitions_suppressed_total",
+    "Probe results that did not change the published device state, by reason (hysteresis or flap damping)",
+    ["reason"]
+)
+STATUS_TRANSITIONS = metrics_registry.counter(
+    "device_service_status_transitions_total",
+    "Accepted device state changes after hysteresis and flap damping, by new state",
+    ["state"]
+)
+
+
+class _DeviceState:
+    __slots__ = ("up", "streak", "penalty", "updated", "suppressed")
+
+    def __init__(self, up: bool, now: float):
+        self.up = up
+        self.streak = 0          # 與目前狀態相反的連續觀測次數
+        self.penalty = 0.0
+        self.updated = now
+        self.suppressed = False  # 抑制中：維持離線直到懲罰值衰減到 reuse_limit 以下
+
+
+class FlapDamper:
+    """設備上線/離線狀態的遲滯與抖動抑制（仿 BGP route flap dampening）
+
+    - 遲滯：連續 down_after 次探測失敗才視為離線，連續 up_after 次成功才視為上線
+    - 抖動抑制：每次轉為離線累加 penalty，懲罰值以 half_life 為半衰期指數衰減；
+      超過 suppress_limit 時設備被抑制，維持離線直到懲罰值降到 reuse_limit 以下
+      （懲罰值上限使抑制時間不超過約 max_suppress 秒）
+    只有經過這兩層的狀態會寫入狀態快取與 MQTT；未被採用的轉換以指標計數。
+    """
+
+    def __init__(self, down_after: Optional[int] = None, up_after: Optional[int] = None,
+                 penalty: Optional[float] = None, suppress_limit: Optional[float] = None,
+                 reuse_limit: Optional[float] = None, half_life: Optional[float] = None,
+                 max_suppress: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.down_after = max(1, settings.STATUS_DOWN_AFTER if down_after is None else down_after)
+        self.up_after = max(1, settings.STATUS_UP_AFTER if up_after is None else up_after)
+        self.penalty = settings.FLAP_PENALTY if penalty is None else penalty
+        self.suppress_limit = settings.FLAP_SUPPRESS_LIMIT if suppress_limit is None else suppress_limit
+        self.reuse_limit = settings.FLAP_REUSE_LIMIT if reuse_limit is None else reuse_limit
+        self.half_life = settings.FLAP_HALF_LIFE if half_life is None else half_life
+        max_suppress = settings.FLAP_MAX_SUPPRESS if max_suppress is None else max_suppress
+        self.max_penalty = self.reuse_limit * 2 ** (max_suppress / self.half_life) if self.half_life > 0 else math.inf
+        self._clock = clock
+        self._states: Dict[int, _DeviceState] = {}
+        self._lock = threading.Lock()
+
+    def _decay(self, state: _DeviceState, now: float):
+        if state.penalty and self.half_life > 0 and now > state.updated:
+            state.penalty *= 0.5 ** ((now - state.updated) / self.half_life)
+        state.updated = now
+
+    def observe(self, proxyid: int, up: bool) -> bool:
+        """記錄一次探測結果，回傳採用的狀態（True 為上線）；第一次觀測直接採用"""
+        now = self._clock()
+        with self._lock:
+            state = self._states.get(proxyid)
+            if state is None:
+                self._states[proxyid] = _DeviceState(up, now)
+                return up
+            self._decay(state, now)
+
+            if up == state.up:
+                state.streak = 0
+                return state.up
+
+            state.streak += 1
+            if state.streak < (self.up_after if up else self.down_after):
+                STATUS_TRANSITIONS_SUPPRESSED.labels("hysteresis").inc()
+                return state.up
+
+            if up:
+                if state.suppressed and state.penalty > self.reuse_limit:
+                    STATUS_TRANSITIONS_SUPPRESSED.labels("damped").inc()
+                    return state.up
+                state.suppressed = False
+            else:
+                state.penalty = min(self.max_penalty, state.penalty + self.penalty)
+                if state.penalty >= self.suppress_limit:
+                    state.suppressed = True
+            state.up = up
+            state.streak = 0
+            STATUS_TRANSITIONS.labels("up" if up else "down").inc()
+            return up
+
+    def forget(self, proxyid: int):
+        with self._lock:
+            self._states.pop(proxyid, None)
+
+    def suppressed_count(self) -> int:
+        with self._lock:
+            return sum(1 for state in self._states.values() if state.suppressed)
+
+    def report(self, proxyid: Optional[int] = None) -> Dict:
+        now = self._clock()
+        with self._lock:
+            report = {}
+            for device_id, state in sorted(self._states.items()):
+                if proxyid is not None and device_id != proxyid:
+                    continue
+                self._decay(state, now)
+                report[device_id] = {
+                    "state": "up" if state.up else "down",
+                    "pending_observations": state.streak,
+                    "penalty": round(state.penalty, 1),
+                    "suppressed": state.suppressed,
+                }
+            return report
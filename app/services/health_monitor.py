@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+from ..config_mqtt import settings
+from ..database import engine
+from ..mqtt.client import mqtt_client
+from ..utils.loop_monitor import loop_lag_monitor
+from ..utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+COMPONENT_UP = metrics_registry.gauge(
+    "device_service_component_up",
+    "Result of the last cached component check (1 = healthy)",
+    ["component"]
+)
+
+STATUS_UP = "up"
+STATUS_DOWN = "down"
+STATUS_STALE = "stale"
+STATUS_DEGRADED = "degraded"
+STATUS_DISABLED = "disabled"
+STATUS_UNKNOWN = "unknown"
+
+# 這些元件異常時 /health/ready 回傳 503；MQTT 與事件迴圈延遲只回報，不影響就緒
+CRITICAL_COMPONENTS = ("database", "background_worker")
+
+
+def _ping_database():
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+class ComponentHealthMonitor:
+    """依固定週期在背景檢查各元件並快取結果，探針端點只讀取快取
+
+    檢查項目：
+    - mqtt：MQTT 客戶端是否連線
+    - database：SELECT 1（在執行緒中執行，有逾時）
+    - background_worker：距上次巡檢進度的時間（逐台更新，長巡檢期間不會誤判）
+    - event_loop：loop_lag_monitor 最近的最大延遲（未啟用時為監控週期睡眠的實際延遲）
+    """
+
+    def __init__(self):
+        self.worker = None
+        self.task: Optional[asyncio.Task] = None
+        self.components: Dict[str, Dict] = {
+            name: {"status": STATUS_UNKNOWN}
+            for name in ("mqtt", "database", "background_worker", "event_loop")
+        }
+        self.checked_at: Optional[float] = None
+        self._loop_lag = 0.0
+
+    def register_worker(self, worker):
+        """登記背景工作程序；未登記時該元件回報 disabled"""
+        self.worker = worker
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await self.check_once()
+            except Exception as e:
+                logger.error(f"[HEALTH_MONITOR] Component check failed: {e}", exc_info=True)
+            expected = loop.time() + settings.HEALTH_CHECK_INTERVAL
+            await asyncio.sleep(settings.HEALTH_CHECK_INTERVAL)
+            self._loop_lag = max(0.0, loop.time() - expected)
+
+    async def check_once(self):
+        """執行一次所有檢查並更新快取"""
+        results = {
+            "mqtt": self._check_mqtt(),
+            "database": await self._check_database(),
+            "background_worker": self._check_worker(),
+            "event_loop": self._check_event_loop(),
+        }
+        self.components = results
+        self.checked_at = time.time()
+        for name, result in results.items():
+            if result["status"] != STATUS_DISABLED:
+                COMPONENT_UP.labels(name).set(1 if result["status"] == STATUS_UP else 0)
+
+    def _check_mqtt(self) -> Dict:
+        return {"status": STATUS_UP if mqtt_client.is_alive() else STATUS_DOWN}
+
+    async def _check_database(self) -> Dict:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.to_thread(_ping_database), settings.HEALTH_DB_TIMEOUT)
+        except asyncio.TimeoutError:
+            return {"status": STATUS_DOWN, "error": f"timed out after {settings.HEALTH_DB_TIMEOUT}s"}
+        except Exception as e:
+            return {"status": STATUS_DOWN, "error": str(e)}
+        return {"status": STATUS_UP, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    def _check_worker(self) -> Dict:
+        worker = self.worker
+        if worker is None:
+            return {"status": STATUS_DISABLED}
+        if not worker.is_running or worker.task is None or worker.task.done():
+            return {"status": STATUS_DOWN, "error": "worker task is not running"}
+
+        now = time.monotonic()
+        last_progress = worker.last_progress_at or worker.started_at or now
+        result = {
+            "last_sweep_age_s": round(now - worker.last_sweep_at, 1) if worker.last_sweep_at else None,
+            "last_progress_age_s": round(now - last_progress, 1),
+        }
+        result["status"] = STATUS_STALE if now - last_progress > settings.HEALTH_WORKER_STALE_AFTER else STATUS_UP
+        return result
+
+    def _check_event_loop(self) -> Dict:
+        # 事件迴圈監控運作中時採用其最近的最大延遲，取樣較密
+        lag = loop_lag_monitor.recent_max_lag() if loop_lag_monitor.running else self._loop_lag
+        status = STATUS_DEGRADED if lag > settings.HEALTH_LOOP_LAG_THRESHOLD else STATUS_UP
+        return {"status": status, "lag_ms": round(lag * 1000, 1)}
+
+    def readiness(self) -> Dict:
+        """就緒判斷：尚未完成第一次檢查或任一關鍵元件異常即未就緒"""
+        if self.checked_at is None:
+            ready = False
+        else:
+            ready = all(self.components[name]["status"] in (STATUS_UP, STATUS_DISABLED)
+                        for name in CRITICAL_COMPONENTS)
+        return {
+            "status": "ready" if ready else "not_ready",
+            "checked_age_s": round(time.time() - self.checked_at, 1) if self.checked_at else None,
+            "components": self.components,
+        }
+
+
+# 全域元件健康監控實例
+component_health_monitor = ComponentHealthMonitor()
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from ..config_mqtt import settings
+from ..models.device import Device
+from ..utils.metrics import metrics_registry
+from .device_processor import device_processor
+
+logger = logging.getLogger(__name__)
+
+PROBES_COALESCED = metrics_registry.counter(
+    "device_service_probes_coalesced_total",
+    "Probe requests answered without their own probe of the proxy, by source (cache or joined in-flight probe)",
+    ["source"]
+)
+
+
+class ProbeCoordinator:
+    """設備探測的 single-flight：同一 proxyid 同時只有一個探測進行中
+
+    巡檢與 /Probe 請求共用進行中的探測結果；/Probe 請求在 freshness 期限內
+    直接回傳最近一次的結果並附上 age_seconds，避免重新整理按鈕放大對下位機的負載。
+    /Probe 只探測（start=False，不呼叫 /start），可加入進行中的巡檢探測；巡檢遇到進行中的
+    只探測請求時另外探測，避免漏掉 /start。
+    """
+
+    def __init__(self, processor=device_processor, freshness: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.processor = processor
+        self.freshness = settings.PROBE_FRESHNESS_WINDOW if freshness is None else freshness
+        self._clock = clock
+        # proxyid -> (完成時間, 結果)，跨事件迴圈保留
+        self._results: Dict[int, Tuple[float, Dict]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._in_flight: Dict[int, Tuple[asyncio.Task, bool]] = {}
+
+    def _bind_loop(self):
+        """進行中的探測綁定建立它的事件迴圈；換了事件迴圈（例如測試）時重新開始"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._in_flight = {}
+
+    async def probe(self, device: Device, max_age: Optional[float] = None, start: bool = True) -> Dict:
+        """探測設備；max_age 秒內的結果直接回傳（None 表示不使用快取，例如巡檢）
+
+        start=False 時設備健康也不呼叫 /start（/Probe 使用）。
+
+        回傳 check_proxy_health 的結果，另附 source（probe/joined/cache）、checked_at 與 age_seconds。
+        """
+        self._bind_loop()
+        proxyid = int(device.proxyid)
+        if max_age is not None:
+            cached = self._results.get(proxyid)
+            if cached is not None and self._clock() - cached[0] <= max_age:
+                PROBES_COALESCED.labels("cache").inc()
+                return self._response(cached, "cache")
+
+        in_flight = self._in_flight.get(proxyid)
+        if in_flight is not None and (in_flight[1] or not start):
+            task, source = in_flight[0], "joined"
+            PROBES_COALESCED.labels("joined").inc()
+        else:
+            source = "probe"
+            task = self._loop.create_task(self._run(proxyid, device, start))
+            self._in_flight[proxyid] = (task, start)
+        # shield：呼叫端被取消（例如客戶端斷線）不會中斷共用的探測
+        return self._response(await asyncio.shield(task), source)
+
+    async def _run(self, proxyid: int, device: Device, start: bool) -> Tuple[float, Dict]:
+        try:
+            result = await self.processor.check_proxy_health(device, start)
+            entry = (self._clock(), dict(result, checked_at=datetime.now().isoformat()))
+            self._results[proxyid] = entry
+            return entry
+        finally:
+            in_flight = self._in_flight.get(proxyid)
+            if in_flight is not None and in_flight[0] is asyncio.current_task():
+                del self._in_flight[proxyid]
+
+    def _response(self, entry: Tuple[float, Dict], source: str) -> Dict:
+        finished_at, result = entry
+        return dict(result, source=source, age_seconds=round(self._clock() - finished_at, 3))
+
+    def forget(self, proxyid: int):
+        """設備刪除或設定變更時丟棄快取的結果"""
+        self._results.pop(proxyid, None)
+
+
+# 全域探測協調實例
+probe_coordinator = ProbeCoordinator()
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional
+
+import httpx
+
+from ..config_mqtt import settings
+from ..models.device import Device
+from ..utils.http_pool import http_client_pool
+from ..utils.metrics import metrics_registry
+from ..utils.tracing import tracer
+from .device_processor import device_processor
+
+logger = logging.getLogger(__name__)
+
+PROXY_COMMAND_LATENCY = metrics_registry.histogram(
+    "device_service_proxy_command_duration_seconds",
+    "Duration of a Start/Stop/Pause/Resume command sent to a proxy, by command and result",
+    ["command", "status"]
+)
+
+COMMANDS = ("start", "stop", "pause", "resume")
+
+# 指令成功後立即寫入快取的狀態：(proxy_status_cache, proxyServiceStart)
+_COMMAND_STATES = {
+    "stop": ("stopped", "0"),
+    "pause": ("paused", "0"),
+    "resume": ("running", "1"),
+}
+
+
+def _device_payload(device: Device) -> Dict:
+    return {
+        "proxyid": str(int(device.proxyid)),
+        "Controller_type": str(device.Controller_type),
+        "proxy_ip": str(device.proxy_ip),
+        "proxy_port": str(int(device.proxy_port)),
+        "remark": str(device.remark) if device.remark else None
+    }
+
+
+class ProxyCommandService:
+    """對下位機送出 Start/Stop/Pause/Resume 指令（共用連線池），並立即更新狀態快取"""
+
+    def __init__(self, processor=device_processor):
+        self.processor = processor
+
+    async def execute(self, device: Device, command: str) -> Dict:
+        """送出單一指令，回傳 {proxyid, command, status: success|error, message}"""
+        if command not in COMMANDS:
+            raise ValueError(f"Unknown proxy command: {command}")
+        started = time.perf_counter()
+        with tracer.span(f"command.{command}", proxyid=int(device.proxyid)) as span:
+            if command == "start":
+                # 啟動沿用巡檢的 /start 流程（連接埠檢查與快取更新）
+                result = await self.processor.start_proxy_service(device)
+                result = {
+                    "proxyid": int(device.proxyid),
+                    "command": command,
+                    "status": "success" if result.get("status") == "success" else "error",
+                    "message": result.get("message")
+                }
+            else:
+                result = await self._send(device, command)
+            span.set_attribute("status", result["status"])
+        PROXY_COMMAND_LATENCY.labels(command, result["status"]).observe(time.perf_counter() - started)
+        return result
+
+    async def _send(self, device: Device, command: str) -> Dict:
+        proxyid = int(device.proxyid)
+        url = f"http://{str(device.proxy_ip)}:{int(device.proxy_port)}/{command}"
+        client = http_client_pool.get(self.processor.http_transport)
+        # 讀取逾時固定；連線逾時沿用該設備巡檢觀測到的 TCP 連線時間，但不低於固定值（只會因慢速設備延長）
+        connect_timeout = self.processor.timeouts.timeout(proxyid, "connect", settings.PROXY_COMMAND_TIMEOUT,
+                                                          at_least_default=True)
+        timeout = httpx.Timeout(settings.PROXY_COMMAND_TIMEOUT, connect=connect_timeout)
+        try:
+            response = await client.post(url, json=_device_payload(device), timeout=timeout)
+        except httpx.TimeoutException:
+            logger.warning(f"[PROXY_COMMAND] {command} timed out for proxy {proxyid}")
+            self.processor.update_proxy_status_cache(proxyid, f"{command} timeout")
+            return {"proxyid": proxyid, "command": command, "status": "error", "message": "NG_Timeout"}
+        except httpx.HTTPError as e:
+            # 連不上下位機：只清除 proxyServiceStart，存活狀態仍由巡檢（含抖動抑制）決定
+            logger.error(f"[PROXY_COMMAND] {command} failed for proxy {proxyid}: {e}")
+            self.processor.update_proxy_status_cache(proxyid, f"{command} failed")
+            self.processor.mark_start_failed(proxyid, f"Error: {e}")
+            return {"proxyid": proxyid, "command": command, "status": "error", "message": str(e)}
+
+        if response.status_code != 200:
+            logger.warning(f"[PROXY_COMMAND] {command} rejected by proxy {proxyid}: HTTP {response.status_code}")
+            self.processor.update_proxy_status_cache(proxyid, f"{command} failed")
+            return {"proxyid": proxyid, "command": command, "status": "error",
+                    "message": f"HTTP {response.status_code}"}
+
+        try:
+            message = response.json().get("message", f"Proxy service {command} initiated")
+        except ValueError:
+            message = f"Proxy service {command} initiated"
+        proxy_state, service_start = _COMMAND_STATES[command]
+        self.processor.update_proxy_status_cache(proxyid, proxy_state)
+        self.processor.update_device_status_cache(proxyid, message, "1", service_start)
+        logger.info(f"[PROXY_COMMAND] {command} succeeded for proxy {proxyid}: {message}")
+        return {"proxyid": proxyid, "command": command, "status": "success", "message": message}
+
+    async def execute_many(self, devices: Iterable[Device], command: str, concurrency: Optional[int] = None,
+                           runner: Optional[Callable[[Device, str], Awaitable[Dict]]] = None) -> AsyncIterator[Dict]:
+        """以最多 concurrency 個並行送出指令，依完成順序逐筆產生結果
+
+        以固定數量的工作協程從共用迭代器取設備，設備數再多也只佔用 concurrency 個 task；
+        呼叫端停止迭代（例如串流客戶端斷線）時會取消尚未完成的指令。
+        runner 可替換單台的送出方式（例如經過指令佇列），預設直接呼叫 execute。
+        """
+        concurrency = concurrency or settings.PROXY_COMMAND_CONCURRENCY
+        runner = runner or self.execute
+        pending = iter(devices)
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            for device in pending:
+                try:
+                    result = await runner(device, command)
+                except Exception as e:
+                    logger.error(f"[PROXY_COMMAND] {command} raised for proxy {device.proxyid}: {e}", exc_info=True)
+                    result = {"proxyid": int(device.proxyid), "command": command, "status": "error", "message": str(e)}
+                await results.put(result)
+            await results.put(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            remaining = len(workers)
+            while remaining:
+                result = await results.get()
+                if result is None:
+                    remaining -= 1
+                else:
+                    yield result
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+
+# 全域代理指令實例
+proxy_command_service = ProxyCommandService()
@@ -0,0 +1,199 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from ..config_mqtt import settings
+from ..models.device import Device
+from ..utils.metrics import metrics_registry
+from ..utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+START_QUEUE_DEPTH = metrics_registry.gauge(
+    "device_service_start_queue_depth",
+    "Sweep /start calls deferred by the start rate limiter and not yet sent"
+)
+START_QUEUE_WAIT = metrics_registry.histogram(
+    "device_service_start_queue_wait_seconds",
+    "Time a deferred sweep /start waited for a rate limiter token",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+STARTS_DEFERRED = metrics_registry.counter(
+    "device_service_starts_deferred_total",
+    "Sweep /start calls deferred by the start rate limiter, by controller type",
+    ["controller_type"]
+)
+
+
+def _bucket(rate: float, burst: float, clock: Callable[[], float]) -> Optional[TokenBucket]:
+    """rate <= 0 表示不限流"""
+    if rate <= 0:
+        return None
+    return TokenBucket(rate, max(burst, 1), clock=clock)
+
+
+class StartRateLimiter:
+    """巡檢 /start 的限流：全域與各 Controller_type 各一個權杖桶
+
+    網路恢復後所有設備在同一次巡檢中變回健康，若同時呼叫 /start 會壓垮控制器。
+    取不到權杖的啟動不丟棄，而是依優先序（remark 含 START_PRIORITY_TAGS 的標籤時較高，
+    同優先序先到先送）放入佇列，由背景分派在權杖補充後送出；
+    某類型的權杖用完時，其他類型的啟動不受阻擋。
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None,
+                 type_rate: Optional[float] = None, type_burst: Optional[float] = None,
+                 type_rates: Optional[Dict[str, float]] = None, priorities: Optional[Dict[str, int]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        rate = settings.START_RATE_LIMIT if rate is None else rate
+        burst = settings.START_BURST if burst is None else burst
+        self.type_rate = settings.START_TYPE_RATE_LIMIT if type_rate is None else type_rate
+        self.type_burst = settings.START_TYPE_BURST if type_burst is None else type_burst
+        self.type_rates = settings.START_TYPE_RATE_LIMITS if type_rates is None else type_rates
+        self.priorities = settings.START_PRIORITY_TAGS if priorities is None else priorities
+        self._clock = clock
+        self.global_bucket = _bucket(rate, burst, clock)
+        self._type_buckets: Dict[str, Optional[TokenBucket]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reset()
+
+    def _reset(self):
+        # 堆積項目：(-優先序, 序號, 排入時間, proxyid)
+        self._heap: List[Tuple[int, int, float, int]] = []
+        self._deferred: Dict[int, Tuple[Device, Callable[[Device], Awaitable[Any]]]] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+        START_QUEUE_DEPTH.set(0)
+
+    def _bind_loop(self):
+        """延後佇列綁定建立它的事件迴圈；換了事件迴圈（例如測試）時重新開始"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._reset()
+
+    async def stop(self):
+        tasks = list(self._tasks)
+        if self._dispatcher is not None:
+            tasks.append(self._dispatcher)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def priority(self, device: Device) -> int:
+        remark = str(device.remark or "")
+        return max((priority for tag, priority in self.priorities.items() if tag in remark), default=0)
+
+    def _type_bucket(self, device: Device) -> Optional[TokenBucket]:
+        controller_type = str(device.Controller_type or "unknown")
+        if controller_type not in self._type_buckets:
+            rate = self.type_rates.get(controller_type, self.type_rate)
+            self._type_buckets[controller_type] = _bucket(rate, self.type_burst, self._clock)
+        return self._type_buckets[controller_type]
+
+    def _wait_time(self, device: Device) -> float:
+        buckets = (self.global_bucket, self._type_bucket(device))
+        return max((bucket.wait_time() for bucket in buckets if bucket is not None), default=0.0)
+
+    def _take(self, device: Device):
+        for bucket in (self.global_bucket, self._type_bucket(device)):
+            if bucket is not None:
+                bucket.try_acquire()
+
+    def is_deferred(self, proxyid: int) -> bool:
+        return proxyid in self._deferred
+
+    def try_acquire(self, device: Device) -> bool:
+        """佇列為空且兩個權杖桶都有權杖時扣除並放行；否則應呼叫 defer 排隊"""
+        self._bind_loop()
+        if self._heap or self._wait_time(device) > 0:
+            return False
+        self._take(device)
+        return True
+
+    def defer(self, device: Device, start: Callable[[Device], Awaitable[Any]]):
+        """排入延後佇列，取得權杖時以 start(device) 送出；已在佇列中的設備只更新資料"""
+        self._bind_loop()
+        proxyid = int(device.proxyid)
+        if proxyid in self._deferred:
+            self._deferred[proxyid] = (device, start)
+            return
+        self._deferred[proxyid] = (device, start)
+        heapq.heappush(self._heap, (-self.priority(device), next(self._seq), self._clock(), proxyid))
+        STARTS_DEFERRED.labels(str(device.Controller_type or "unknown")).inc()
+        START_QUEUE_DEPTH.set(len(self._heap))
+        self._wakeup.set()
+        if self._dispatcher is None:
+            self._dispatcher = self._loop.create_task(self._dispatch())
+
+    def _pop_ready(self) -> Tuple[Optional[Tuple[int, int, float, int]], float]:
+        """取出優先序最高且其類型有權杖的項目；皆無權杖時回傳 (None, 需等待秒數)"""
+        if self.global_bucket is not None:
+            wait = self.global_bucket.wait_time()
+            if wait > 0:
+                return None, wait
+        skipped = []
+        found = None
+        wait = float("inf")
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            bucket = self._type_bucket(self._deferred[entry[3]][0])
+            entry_wait = bucket.wait_time() if bucket is not None else 0.0
+            if entry_wait <= 0:
+                found = entry
+                break
+            skipped.append(entry)
+            wait = min(wait, entry_wait)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return found, wait
+
+    async def _dispatch(self):
+        try:
+            while self._heap:
+                entry, wait = self._pop_ready()
+                if entry is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), None if wait == float("inf") else wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                _, _, enqueued_at, proxyid = entry
+                device, start = self._deferred.pop(proxyid)
+                self._take(device)
+                START_QUEUE_DEPTH.set(len(self._heap))
+                START_QUEUE_WAIT.observe(self._clock() - enqueued_at)
+                task = self._loop.create_task(self._run(device, start))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            self._dispatcher = None
+
+    async def _run(self, device: Device, start: Callable[[Device], Awaitable[Any]]):
+        try:
+            await start(device)
+        except Exception as e:
+            logger.error(f"[START_LIMITER] Deferred start failed for proxy {device.proxyid}: {e}", exc_info=True)
+
+    def report(self) -> Dict:
+        now = self._clock()
+        return {
+            "queued": [
+                {"proxyid": proxyid, "priority": -negative_priority, "waiting_seconds": round(now - enqueued_at, 3)}
+                for negative_priority, _, enqueued_at, proxyid in sorted(self._heap)
+            ],
+            "global_tokens": None if self.global_bucket is None else round(self.global_bucket.tokens, 2),
+            "controller_type_tokens": {controller_type: round(bucket.tokens, 2)
+                                       for controller_type, bucket in self._type_buckets.items()
+                                       if bucket is not None},
+        }
+
+
+# 全域巡檢啟動限流實例
+start_limiter = StartRateLimiter()
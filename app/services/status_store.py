@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedStatusStore:
+    """帶版本號的設備狀態儲存
+
+    - 每次內容實際變更時，全域版本號遞增，並記錄該筆資料的變更版本
+    - 變更紀錄依版本排序，查詢某版本之後的變更只需走訪變更過的項目
+    - 刪除的項目保留墓碑（tombstone），讓增量查詢能回報移除；
+      墓碑數量有上限，過舊的版本會要求客戶端重新取得完整資料
+    - 變更監聽器會在每次實際變更後被同步呼叫 listener(key, entry, version, removed)
+    - wait_for_change() 讓長輪詢請求在版本變更前暫停，變更時統一喚醒
+
+    版本號以啟動時的微秒時間戳為起點，因此服務重啟後版本號仍大於重啟前，
+    客戶端持有的舊版本號會被視為需要完整同步，而不會得到錯誤的增量。
+    """
+
+    def __init__(self, max_tombstones: int = 10000):
+        self.version: int = int(time.time() * 1_000_000)
+        self._entries: Dict[int, Dict] = {}
+        self._entry_versions: Dict[int, int] = {}
+        self._change_log: "OrderedDict[int, int]" = OrderedDict()  # key -> 最後變更版本（依版本排序）
+        self._tombstones: Deque[int] = deque()
+        self._max_tombstones = max_tombstones
+        self._floor_version = self.version  # 早於此版本的變更可能已被修剪
+        self._listeners: List[Callable[[int, Dict, int, bool], None]] = []
+        # 長輪詢等待者共用，每個事件迴圈一個 Event，變更時觸發並移除
+        self._change_events: Dict[asyncio.AbstractEventLoop, asyncio.Event] = {}
+
+    # ------------------------------------------------------------------
+    # 讀取
+    # ------------------------------------------------------------------
+    def __contains__(self, key: int) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._entries)
+
+    def get(self, key: int) -> Optional[Dict]:
+        return self._entries.get(key)
+
+    def keys(self):
+        return self._entries.keys()
+
+    def values(self):
+        return self._entries.values()
+
+    def items(self):
+        return self._entries.items()
+
+    def entry_version(self, key: int) -> int:
+        """取得單筆資料的最後變更版本（不存在時為 0）"""
+        return self._entry_versions.get(key, 0)
+
+    def snapshot(self) -> Dict[int, Dict]:
+        """取得所有資料的複本"""
+        return {key: dict(entry) for key, entry in self._entries.items()}
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.version}"'
+
+    # ------------------------------------------------------------------
+    # 變更監聽
+    # ------------------------------------------------------------------
+    def add_listener(self, listener: Callable[[int, Dict, int, bool], None]):
+        """註冊變更監聽器"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[int, Dict, int, bool], None]):
+        """取消註冊變更監聽器"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, key: int, entry: Dict, removed: bool = False):
+        if self._change_events:
+            self._wake_waiters()
+        for listener in self._listeners:
+            try:
+                listener(key, entry, self.version, removed)
+            except Exception as e:
+                logger.error(f"[STATUS_STORE] Change listener failed for key {key}: {e}")
+
+    def _wake_waiters(self):
+        events, self._change_events = self._change_events, {}
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        for loop, event in events.items():
+            if loop is current:
+                event.set()
+            elif not loop.is_closed():
+                loop.call_soon_threadsafe(event.set)
+
+    # ------------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------------
+    def _bump(self, key: int) -> int:
+        self.version += 1
+        self._change_log[key] = self.version
+        self._change_log.move_to_end(key)
+        return self.version
+
+    def set(self, key: int, entry: Dict) -> bool:
+        """寫入整筆資料，內容未變更時不遞增版本"""
+        current = self._entries.get(key)
+        if current == entry:
+            return False
+        self._entries[key] = dict(entry)
+        self._entry_versions[key] = self._bump(key)
+        self._notify(key, self._entries[key])
+        return True
+
+    def update(self, key: int, fields: Dict) -> bool:
+        """更新部分欄位，只有值實際改變時才遞增版本"""
+        entry = self._entries.get(key)
+        if entry is None:
+            raise KeyError(key)
+        changed = {name: value for name, value in fields.items() if entry.get(name) != value}
+        if not changed:
+            return False
+        entry.update(changed)
+        self._entry_versions[key] = self._bump(key)
+        self._notify(key, entry)
+        return True
+
+    def remove(self, key: int) -> bool:
+        """移除資料並保留墓碑"""
+        if key not in self._entries:
+            return False
+        entry = self._entries.pop(key)
+        del self._entry_versions[key]
+        self._bump(key)
+        self._tombstones.append(key)
+        self._prune_tombstones()
+        self._notify(key, entry, removed=True)
+        return True
+
+    def _prune_tombstones(self):
+        while len(self._tombstones) > self._max_tombstones:
+            key = self._tombstones.popleft()
+            if key in self._entries:
+                continue  # 已重新加入，變更紀錄屬於現存資料
+            version = self._change_log.pop(key, None)
+            if version is not None:
+                self._floor_version = max(self._floor_version, version)
+
+    # ------------------------------------------------------------------
+    # 增量查詢
+    # ------------------------------------------------------------------
+    def changes_since(self, since: int) -> Dict:
+        """取得指定版本之後的變更與移除
+
+        若 since 早於可追溯範圍或晚於目前版本（例如服務重啟），
+        回傳 reset=True 並附上完整資料。
+        """
+        if since < self._floor_version or since > self.version:
+            return {
+                "version": self.version,
+                "reset": True,
+                "changed": list(self._entries.values()),
+                "removed": [],
+            }
+
+        changed: List[Dict] = []
+        removed: List[int] = []
+        for key, version in reversed(self._change_log.items()):
+            if version <= since:
+                break
+            entry = self._entries.get(key)
+            if entry is None:
+                removed.append(key)
+            else:
+                changed.append(entry)
+
+        return {
+            "version": self.version,
+            "reset": False,
+            "changed": changed,
+            "removed": removed,
+        }
+
+    # ------------------------------------------------------------------
+    # 長輪詢
+    # ------------------------------------------------------------------
+    def changed_after(self, since: int, key: Optional[int] = None) -> bool:
+        """判斷指定版本之後是否有變更（指定 key 時只看該筆資料，包含移除）
+
+        該筆資料的紀錄已被修剪（例如墓碑超過上限）且 since 早於可追溯範圍時，
+        視為已變更，由客戶端重新取得完整資料。
+        """
+        if key is None:
+            return self.version > since
+        version = self._change_log.get(key)
+        if version is None:
+            return since < self._floor_version
+        return version > since
+
+    async def wait_for_change(self, since: int, timeout: float, key: Optional[int] = None) -> bool:
+        """等待版本超過 since，逾時回傳 False
+
+        同一事件迴圈的等待者共用一個 asyncio.Event，變更時一次喚醒並換上新的 Event，
+        等待者不佔用任何輪詢資源。
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not self.changed_after(since, key):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            event = self._change_events.get(loop)
+            if event is None:
+                event = self._change_events[loop] = asyncio.Event()
+            try:
+                await asyncio.wait_for(event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return self.changed_after(since, key)
+        return True
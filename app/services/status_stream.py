@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Dict, Iterable, Optional, Set, Tuple
+from ..config_mqtt import settings
+from .device_processor import device_processor
+from .status_store import VersionedStatusStore
+
+logger = logging.getLogger(__name__)
+
+# 事件格式：(事件類型, 版本號, 已序列化的 JSON 字串)
+StreamEvent = Tuple[str, int, str]
+
+
+class StatusSubscriber:
+    """單一推播客戶端（有界緩衝與篩選條件）"""
+
+    def __init__(self, proxyids: Optional[Set[int]], controller_types: Optional[Set[str]], buffer_size: int):
+        self.proxyids = proxyids
+        self.controller_types = controller_types
+        self.queue: "asyncio.Queue[StreamEvent]" = asyncio.Queue(maxsize=buffer_size)
+        self.evicted = False
+
+    def matches(self, proxyid: int, entry: Dict) -> bool:
+        if self.proxyids is not None and proxyid not in self.proxyids:
+            return False
+        if self.controller_types is not None and entry.get("controller_type") not in self.controller_types:
+            return False
+        return True
+
+
+class StatusBroadcaster:
+    """將狀態快取的變更推播給所有訂閱的客戶端
+
+    變更直接由 VersionedStatusStore 的監聽器觸發；每個事件只序列化一次並由所有客戶端共用。
+    客戶端緩衝已滿時視為慢速客戶端並中斷連線，避免拖累其他客戶端與伺服器記憶體。
+    """
+
+    def __init__(self, store: VersionedStatusStore):
+        self.store = store
+        self._subscribers: Set[StatusSubscriber] = set()
+        self.evicted_total = 0
+        store.add_listener(self._on_change)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def full(self) -> bool:
+        """已達客戶端上限"""
+        return len(self._subscribers) >= settings.STATUS_STREAM_MAX_CLIENTS
+
+    def subscribe(self, proxyids: Optional[Iterable[int]] = None,
+                  controller_types: Optional[Iterable[str]] = None) -> Optional[StatusSubscriber]:
+        """建立訂閱；超過客戶端上限時回傳 None"""
+        if self.full:
+            logger.warning(f"[STATUS_STREAM] Subscriber limit reached ({settings.STATUS_STREAM_MAX_CLIENTS}), rejecting client")
+            return None
+        subscriber = StatusSubscriber(
+            set(proxyids) if proxyids else None,
+            set(controller_types) if controller_types else None,
+            settings.STATUS_STREAM_BUFFER_SIZE
+        )
+        self._subscribers.add(subscriber)
+        logger.info(f"[STATUS_STREAM] Client subscribed - Active clients: {len(self._subscribers)}")
+        return subscriber
+
+    def unsubscribe(self, subscriber: StatusSubscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.discard(subscriber)
+            logger.info(f"[STATUS_STREAM] Client unsubscribed - Active clients: {len(self._subscribers)}")
+
+    def _evict(self, subscriber: StatusSubscriber, version: int):
+        """中斷慢速客戶端：清空緩衝並放入中斷事件"""
+        self._subscribers.discard(subscriber)
+        subscriber.evicted = True
+        self.evicted_total += 1
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        payload = json.dumps({"type": "evicted", "version": version, "reason": "slow consumer"})
+        subscriber.queue.put_nowait(("evicted", version, payload))
+        logger.warning(f"[STATUS_STREAM] Evicted slow client (buffer full) - Active clients: {len(self._subscribers)}")
+
+    def _on_change(self, proxyid: int, entry: Dict, version: int, removed: bool):
+        """狀態快取變更監聽器"""
+        if not self._subscribers:
+            return
+
+        event: Optional[StreamEvent] = None
+        for subscriber in list(self._subscribers):
+            if not subscriber.matches(proxyid, entry):
+                continue
+            if event is None:
+                if removed:
+                    payload = {"type": "remove", "version": version, "proxyid": proxyid}
+                else:
+                    payload = {"type": "change", "version": version, "proxyid": proxyid, "status": entry}
+                event = (payload["type"], version, json.dumps(payload, ensure_ascii=False, default=str))
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._evict(subscriber, version)
+
+    def _initial_event(self, subscriber: StatusSubscriber, since: Optional[int]) -> StreamEvent:
+        """建立初始事件：完整快照，或自 since 版本起的增量（斷線重連時）"""
+        if since is not None:
+            changes = self.store.changes_since(since)
+            payload = {
+                "type": "delta",
+                "version": changes["version"],
+                "reset": changes["reset"],
+                "changed": [entry for entry in changes["changed"] if subscriber.matches(entry.get("proxyid"), entry)],
+                "removed": [proxyid for proxyid in changes["removed"]
+                            if subscriber.proxyids is None or proxyid in subscriber.proxyids],
+            }
+        else:
+            payload = {
+                "type": "snapshot",
+                "version": self.store.version,
+                "statuses": [entry for proxyid, entry in self.store.items() if subscriber.matches(proxyid, entry)],
+            }
+        return payload["type"], payload["version"], json.dumps(payload, ensure_ascii=False, default=str)
+
+    async def stream(self, subscriber: StatusSubscriber, since: Optional[int] = None) -> AsyncIterator[StreamEvent]:
+        """依序產生初始事件、變更事件與心跳事件，直到客戶端被中斷"""
+        try:
+            yield self._initial_event(subscriber, since)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(),
+                                                   timeout=settings.STATUS_STREAM_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    version = self.store.version
+                    yield "heartbeat", version, json.dumps({"type": "heartbeat", "version": version})
+                    continue
+                yield event
+                if event[0] == "evicted":
+                    return
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def format_sse(event: StreamEvent) -> str:
+    """轉換為 Server-Sent Events 格式"""
+    event_type, version, payload = event
+    return f"id: {version}\nevent: {event_type}\ndata: {payload}\n\n"
+
+
+# 全域狀態推播實例
+status_broadcaster = StatusBroadcaster(device_processor.device_status_cache)
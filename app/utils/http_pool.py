@@ -0,0 +1,52 @@
+import asyncio
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from ..config_mqtt import settings
+
+
+class HttpClientPool:
+    """共用的 httpx.AsyncClient，保留到下位機的 keep-alive 連線
+
+    httpx 的連線綁定建立它的事件迴圈，因此依（事件迴圈, transport）各建一個 client；
+    transport 為 None 時使用真實網路（模擬器與測試會替換 transport）。
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[int, int], Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+
+    def get(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        key = (id(loop), id(transport))
+        entry = self._clients.get(key)
+        if entry is not None and entry[0] is loop and not entry[1].is_closed:
+            return entry[1]
+        self._discard_closed_loops()
+        client = httpx.AsyncClient(
+            transport=transport,
+            limits=httpx.Limits(
+                max_connections=settings.PROXY_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.PROXY_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.PROXY_HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+        self._clients[key] = (loop, client)
+        return client
+
+    def _discard_closed_loops(self):
+        for key, (loop, _) in list(self._clients.items()):
+            if loop.is_closed():
+                del self._clients[key]
+
+    async def aclose(self):
+        """關閉目前事件迴圈的所有 client"""
+        loop = asyncio.get_running_loop()
+        for key, (owner, client) in list(self._clients.items()):
+            if owner is loop:
+                del self._clients[key]
+                await client.aclose()
+
+
+# 全域 HTTP 連線池實例
+http_client_pool = HttpClientPool()
@@ -0,0 +1,315 @@
+"""
+輪替日誌的壓縮、保留與搜尋
+
+- 輪替後的檔案在背景執行緒以 gzip 壓縮。壓縮檔由多個 gzip member 組成，每段約 1MB 原始內容，
+  並在旁邊寫一個索引檔（.index.json），記錄整個檔案與每個 member 的第一筆紀錄時間。
+  壓縮檔仍是標準 gzip，可直接用 zcat 讀取。
+- 保留策略：依檔案數、總大小與保存天數刪除最舊的輪替檔。
+- 搜尋時依索引略過時間範圍外的檔案，並從涵蓋起始時間的 member 開始解壓縮，超過結束時間即停止。
+
+用法：
+    python -m app.utils.log_archive logs --prefix device_service --since "2026-10-19 07:00" \\
+        --until "2026-10-19 08:00" --grep "proxy 12"
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = ".gz"
+INDEX_SUFFIX = ".index.json"
+MEMBER_BYTES = 1024 * 1024
+
+# 一筆紀錄的開頭：一般格式 "2026-10-19 07:12:33,123 - ..." 或 JSON Lines '{"time": "2026-10-19T07:12:33.123", ...'
+_RECORD_TIME = re.compile(rb'^(?:\{"time": ")?(\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d[.,]\d{3})')
+# doRollover 產生的檔名結尾（_YYYYMMDD_HHMMSS，可能再加序號）
+_ROTATED_STEM = re.compile(r"_\d{8}_\d{6}(?:_\d+)?$")
+
+
+def line_time(line: bytes) -> Optional[float]:
+    """紀錄開頭的時間（epoch 秒）；非紀錄開頭（例如 traceback 的續行）回傳 None"""
+    match = _RECORD_TIME.match(line)
+    if match is None:
+        return None
+    return datetime.fromisoformat(match.group(1).decode().replace(",", ".")).timestamp()
+
+
+class RetentionPolicy:
+    """輪替檔保留策略（0 表示不限）
+
+    Args:
+        max_files: 最多保留的輪替檔數
+        max_total_bytes: 輪替檔總大小上限
+        max_age_days: 保存天數
+    """
+
+    def __init__(self, max_files: int = 0, max_total_bytes: int = 0, max_age_days: float = 0):
+        self.max_files = max_files
+        self.max_total_bytes = max_total_bytes
+        self.max_age_days = max_age_days
+
+
+def compress_file(path: str) -> str:
+    """以多 member gzip 壓縮檔案並寫入索引，完成後刪除原檔，回傳壓縮檔路徑"""
+    archive = path + ARCHIVE_SUFFIX
+    temporary = archive + ".tmp"
+    members = []
+    first = last = None
+    lines = raw_bytes = 0
+
+    with open(path, "rb") as source, open(temporary, "wb") as target:
+        chunk: List[bytes] = []
+        chunk_bytes = 0
+        chunk_first = None
+
+        def flush_chunk():
+            members.append({"offset": target.tell(), "first": chunk_first})
+            target.write(gzip.compress(b"".join(chunk), compresslevel=6, mtime=0))
+
+        for line in source:
+            timestamp = line_time(line) if line[:1] in b"{0123456789" else None
+            # member 只在紀錄開頭切分，確保每個 member 的第一行都帶有時間
+            if timestamp is not None and chunk_bytes >= MEMBER_BYTES:
+                flush_chunk()
+                chunk, chunk_bytes, chunk_first = [], 0, None
+            if timestamp is not None:
+                first = timestamp if first is None else first
+                last = timestamp
+                chunk_first = timestamp if chunk_first is None else chunk_first
+            chunk.append(line)
+            chunk_bytes += len(line)
+            lines += 1
+            raw_bytes += len(line)
+        if chunk:
+            flush_chunk()
+
+    source_stat = os.stat(path)
+    os.replace(temporary, archive)
+    os.utime(archive, (source_stat.st_atime, source_stat.st_mtime))
+    index = {
+        "file": os.path.basename(archive),
+        "first": first,
+        "last": last,
+        "lines": lines,
+        "bytes": raw_bytes,
+        "compressed_bytes": os.path.getsize(archive),
+        "members": members,
+    }
+    with open(archive + INDEX_SUFFIX, "w", encoding="utf-8") as index_file:
+        json.dump(index, index_file)
+    os.remove(path)
+    return archive
+
+
+def _log_files(prefix: str, extension: str) -> List[str]:
+    """列出 prefix*extension 與其壓縮檔"""
+    directory = os.path.dirname(prefix) or "."
+    base = os.path.basename(prefix)
+    paths = []
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return paths
+    for entry in entries:
+        name = entry.name
+        stem = name[:-len(ARCHIVE_SUFFIX)] if name.endswith(ARCHIVE_SUFFIX) else name
+        if name.startswith(base) and stem.endswith(extension) and entry.is_file():
+            paths.append(os.path.join(directory, name))
+    return paths
+
+
+def _is_rotated(path: str, extension: str) -> bool:
+    if path.endswith(ARCHIVE_SUFFIX):
+        return True
+    return bool(_ROTATED_STEM.search(os.path.basename(path)[:-len(extension)]))
+
+
+def _remove(path: str):
+    for target in (path, path + INDEX_SUFFIX):
+        try:
+            os.remove(target)
+        except FileNotFoundError:
+            pass
+
+
+def apply_retention(prefix: str, extension: str, policy: RetentionPolicy, active: Optional[str] = None,
+                    now: Optional[float] = None) -> List[str]:
+    """依保留策略刪除最舊的檔案，回傳被刪除的路徑
+
+    檔數與總大小只計算輪替檔（壓縮檔與 doRollover 改名的檔案）；各次啟動時開啟的
+    檔案可能仍被其他行程寫入，只依保存天數刪除。目前寫入中的檔案（active）一律保留。
+    """
+    now = time.time() if now is None else now
+    max_age = policy.max_age_days * 86400 if policy.max_age_days else 0
+    files = []
+    for path in _log_files(prefix, extension):
+        if active and os.path.abspath(path) == os.path.abspath(active):
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    files.sort(reverse=True)
+
+    removed = []
+    kept_count = kept_bytes = 0
+    for mtime, size, path in files:
+        expired = bool(max_age) and now - mtime > max_age
+        if _is_rotated(path, extension):
+            over_count = bool(policy.max_files) and kept_count >= policy.max_files
+            over_size = bool(policy.max_total_bytes) and kept_bytes + size > policy.max_total_bytes
+            if not (expired or over_count or over_size):
+                kept_count += 1
+                kept_bytes += size
+                continue
+        elif not expired:
+            continue
+        _remove(path)
+        removed.append(path)
+    return removed
+
+
+class LogArchiver:
+    """在單一背景執行緒中壓縮輪替檔並套用保留策略"""
+
+    def __init__(self):
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, path: Optional[str], prefix: str, extension: str, policy: RetentionPolicy,
+               compress: bool = True, active: Optional[str] = None):
+        """排入一個工作：壓縮 path（None 表示只套用保留策略），再依 policy 清理"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-archiver", daemon=True)
+                self._thread.start()
+        self._queue.put((path, prefix, extension, policy, compress, active))
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待已排入的工作完成，回傳是否全部完成"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _run(self):
+        while True:
+            path, prefix, extension, policy, compress, active = self._queue.get()
+            try:
+                if compress and path and os.path.exists(path):
+                    compress_file(path)
+                apply_retention(prefix, extension, policy, active=active)
+            except Exception as e:
+                # 日誌系統本身出錯時不能再依賴日誌檔，改寫到 stderr
+                print(f"[LOG_ARCHIVE] Failed to archive {path}: {e}", file=sys.stderr)
+            finally:
+                self._queue.task_done()
+
+
+def _load_index(path: str) -> Optional[dict]:
+    try:
+        with open(path + INDEX_SUFFIX, encoding="utf-8") as index_file:
+            return json.load(index_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _open_from(path: str, since: Optional[float]):
+    """開啟檔案；有索引時直接從涵蓋 since 的 member 開始解壓縮"""
+    if not path.endswith(ARCHIVE_SUFFIX):
+        return open(path, "rb")
+    raw = open(path, "rb")
+    index = _load_index(path)
+    if index and since is not None:
+        offset = 0
+        for member in index.get("members", []):
+            if member["first"] is not None and member["first"] > since:
+                break
+            offset = member["offset"]
+        raw.seek(offset)
+    return gzip.GzipFile(fileobj=raw, mode="rb")
+
+
+def search_file(path: str, since: Optional[float] = None, until: Optional[float] = None,
+                pattern: Optional[re.Pattern] = None) -> Iterator[bytes]:
+    """逐行串流輸出時間範圍內且符合 pattern 的紀錄（續行隨所屬紀錄判斷時間）"""
+    with _open_from(path, since) as stream:
+        in_window = since is None
+        for line in stream:
+            timestamp = line_time(line) if line[:1] in b"{0123456789" else None
+            if timestamp is not None:
+                if until is not None and timestamp > until:
+                    return
+                in_window = since is None or timestamp >= since
+            if in_window and (pattern is None or pattern.search(line)):
+                yield line
+
+
+def _time_range(path: str):
+    """檔案的 (第一筆, 最後一筆) 時間；沒有索引時回傳 (None, None)"""
+    index = _load_index(path) if path.endswith(ARCHIVE_SUFFIX) else None
+    if index:
+        return index.get("first"), index.get("last")
+    return None, None
+
+
+def search(directory: str, prefix: str = "", extension: str = ".log", since: Optional[float] = None,
+           until: Optional[float] = None, pattern: Optional[re.Pattern] = None) -> Iterator[bytes]:
+    """依時間順序搜尋目錄中符合 prefix 的日誌（壓縮檔與未壓縮檔）"""
+    candidates = []
+    for path in _log_files(os.path.join(directory, prefix), extension):
+        first, last = _time_range(path)
+        if first is not None and ((until is not None and first > until) or (since is not None and last < since)):
+            continue
+        candidates.append((first if first is not None else os.path.getmtime(path), path))
+    for _, path in sorted(candidates):
+        yield from search_file(path, since, until, pattern)
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Search rotated (gzip) and active log files by time window")
+    parser.add_argument("directory", help="Log directory, e.g. logs")
+    parser.add_argument("--prefix", default="", help="Log file name prefix, e.g. device_service or mqtt")
+    parser.add_argument("--extension", default=".log")
+    parser.add_argument("--since", help="Start time (ISO format, local time)")
+    parser.add_argument("--until", help="End time (ISO format, local time)")
+    parser.add_argument("--grep", help="Only print lines matching this regular expression")
+    args = parser.parse_args(argv)
+
+    pattern = re.compile(args.grep.encode()) if args.grep else None
+    output = sys.stdout.buffer
+    try:
+        for line in search(args.directory, args.prefix, args.extension,
+                           _parse_time(args.since), _parse_time(args.until), pattern):
+            output.write(line)
+        output.flush()
+    except BrokenPipeError:
+        # 輸出接到 head 等提早結束的程式
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    return 0
+
+
+# 全域日誌封存實例
+log_archiver = LogArchiver()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import logging
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from .metrics import metrics_registry
+from .rate_limit import TokenBucket
+
+LOG_RECORDS_SUPPRESSED = metrics_registry.counter(
+    "device_service_log_records_suppressed_total",
+    "Log records dropped by the rate-limit/sampling filter",
+    ["reason", "level"]
+)
+
+# 取出訊息中的設備編號（"proxy 12"、"proxyid=12"、"device 12"、JSON 的 "proxyid": 12、
+# MQTT 主題 .../ProxyService/status/12 等寫法）
+_PROXYID_PATTERN = re.compile(
+    r"(?:(?:proxy(?:id)?|device)\"?\s*[=:]?\s*\"?|ProxyService/\w+/)(\d+)", re.IGNORECASE
+)
+# 將訊息中的數字一律視為變動值，讓同一行 f-string 的各次輸出歸為同一範本
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+class _KeyState:
+    __slots__ = ("bucket", "suppressed")
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.suppressed = 0
+
+
+class RateLimitFilter(logging.Filter):
+    """依 (logger, 等級, 訊息範本, proxyid) 限制日誌速率，並可對 DEBUG/INFO 抽樣
+
+    - 每個 key 有一個權杖桶：每 interval 秒補充 1 筆，最多累積 burst 筆
+    - 被抑制的筆數會附加在該 key 下一筆放行的訊息後面（"[suppressed N similar messages]"）
+    - 等級高於 max_level 的紀錄一律放行
+    - 追蹤的 key 數上限為 max_keys，最久未使用的 key 會被移除（其權杖桶重新計算）
+
+    Args:
+        interval: 每個 key 每隔幾秒補充一筆額度（0 表示不限速，只抽樣）
+        burst: 每個 key 可連續輸出的筆數
+        max_level: 受限速與抽樣影響的最高等級（預設只限 DEBUG/INFO，WARNING 以上一律保留）
+        sample_rates: 各等級保留比例，例如 {"DEBUG": 0.1}
+        max_keys: 追蹤的 key 數上限
+        clock: 時間來源
+    """
+
+    def __init__(self, interval: float = 60.0, burst: int = 5, max_level: str = "INFO",
+                 sample_rates: Optional[Dict[str, float]] = None, max_keys: int = 20000,
+                 clock: Callable[[], float] = time.monotonic, seed: Optional[int] = None):
+        super().__init__()
+        self.interval = interval
+        self.burst = max(1, burst)
+        self.max_level = logging.getLevelName(max_level.upper()) if isinstance(max_level, str) else max_level
+        self.sample_rates = {
+            logging.getLevelName(level.upper()): rate for level, rate in (sample_rates or {}).items() if rate < 1.0
+        }
+        self.max_keys = max_keys
+        self._clock = clock
+        self._random = random.Random(seed)
+        self._keys: "OrderedDict[Tuple, _KeyState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(record: logging.LogRecord) -> Tuple:
+        """紀錄的限速 key：(logger, 等級, 範本, proxyid)；proxyid 優先取 extra={"proxyid": ...}"""
+        message = record.msg if isinstance(record.msg, str) else str(record.msg)
+        proxyid = getattr(record, "proxyid", None)
+        if proxyid is None:
+            source = record.getMessage() if record.args else message
+            match = _PROXYID_PATTERN.search(source)
+            proxyid = match.group(1) if match else None
+        template = message if record.args else _NUMBER_PATTERN.sub("#", message)
+        return record.name, record.levelno, template, proxyid
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level:
+            return True
+
+        sample_rate = self.sample_rates.get(record.levelno)
+        if sample_rate is not None and self._random.random() >= sample_rate:
+            LOG_RECORDS_SUPPRESSED.labels("sampled", record.levelname).inc()
+            return False
+
+        if self.interval <= 0:
+            return True
+
+        key = self.key_for(record)
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None:
+                state = _KeyState(TokenBucket(1.0 / self.interval, self.burst, clock=self._clock))
+                self._keys[key] = state
+                if len(self._keys) > self.max_keys:
+                    self._keys.popitem(last=False)
+            else:
+                self._keys.move_to_end(key)
+
+            if not state.bucket.try_acquire():
+                state.suppressed += 1
+                LOG_RECORDS_SUPPRESSED.labels("rate_limited", record.levelname).inc()
+                return False
+            suppressed, state.suppressed = state.suppressed, 0
+
+        if suppressed:
+            record.msg = f"{record.msg} [suppressed {suppressed} similar messages]"
+        return True
+
+    def tracked_keys(self) -> int:
+        return len(self._keys)
@@ -1,20 +1,155 @@
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
 import time
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional, Tuple
+
+from .log_archive import ARCHIVE_SUFFIX, RetentionPolicy, log_archiver
+from .metrics import metrics_registry
+
+LOG_RECORDS_DROPPED = metrics_registry.counter(
+    "device_service_log_records_dropped_total",
+    "Log records dropped because the logging queue was full",
+    ["level"]
+)
+LOG_QUEUE_DEPTH = metrics_registry.gauge(
+    "device_service_log_queue_depth",
+    "Log records waiting for the background logging thread",
+    ["queue"]
+)
+
+# 目前運作中的 (logger, 佇列 handler, 背景執行緒)，shutdown_logging 會停止並清空
+_pipelines: List[Tuple[logging.Logger, "DroppingQueueHandler", "BatchingQueueListener"]] = []
+_atexit_registered = False
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每筆紀錄輸出一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """佇列已滿時丟棄紀錄並計數，呼叫端不會因日誌 I/O 而阻塞"""
+
+    def __init__(self, log_queue, name: str = "main"):
+        super().__init__(log_queue)
+        LOG_QUEUE_DEPTH.labels(name).set_function(log_queue.qsize)
+
+    def prepare(self, record):
+        """只合併 msg 與 args（參數可能在呼叫端之後被修改），保留 exc_info 與 stack_info
+
+        格式化交由背景執行緒的 handler 進行，JSON 格式仍可輸出結構化的 exception 欄位，
+        呼叫端也不必負擔格式化與 traceback 的成本。
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels(record.levelname).inc()
+
+
+class BatchingQueueListener(QueueListener):
+    """背景執行緒一次取出最多 batch_size 筆紀錄，每個 handler 整批寫入後只 flush 一次"""
+
+    def __init__(self, log_queue, *handlers, batch_size: int = 256):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = max(1, batch_size)
+
+    def _monitor(self):
+        stopping = False
+        while not stopping:
+            batch = [self.dequeue(True)]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+            if any(record is self._sentinel for record in batch):
+                stopping = True
+            records = [self.prepare(record) for record in batch if record is not self._sentinel]
+            if records:
+                self.handle_batch(records)
+
+    def enqueue_sentinel(self):
+        # 佇列已滿時也必須送達，否則 stop() 會永遠等待
+        self.queue.put(self._sentinel)
+
+    def handle_batch(self, records):
+        for handler in self.handlers:
+            accepted = [record for record in records
+                        if record.levelno >= handler.level and handler.filter(record)]
+            if not accepted:
+                continue
+            if hasattr(handler, "emit_batch"):
+                handler.emit_batch(accepted)
+            else:
+                for record in accepted:
+                    handler.handle(record)
+
+
+def _format_batch(handler: logging.StreamHandler, records) -> Optional[str]:
+    try:
+        return "".join(handler.format(record) + handler.terminator for record in records)
+    except Exception:
+        for record in records:
+            handler.handleError(record)
+        return None
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """支援整批寫入的主控台 handler"""
+
+    def emit_batch(self, records):
+        text = _format_batch(self, records)
+        if text is None:
+            return
+        self.acquire()
+        try:
+            self.stream.write(text)
+            self.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
 
 class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
-    """自定義的日誌輪替處理器，結合大小和時間輪替"""
+    """自定義的日誌輪替處理器，結合大小和時間輪替
 
-    def __init__(self, filename, maxBytes=20*1024*1024, backupCount=5, encoding=None, delay=False):
+    輪替後的檔案交給背景執行緒（log_archiver）壓縮，並依檔數、總大小與保存天數清理舊檔。
+    """
+
+    def __init__(self, filename, maxBytes=20*1024*1024, backupCount=5, encoding=None, delay=False,
+                 compress=True, max_total_bytes=0, max_age_days=0):
         """
         Args:
             filename: 日誌檔案名稱（不包含日期時間戳）
             maxBytes: 最大檔案大小（預設 20MB）
-            backupCount: 保留的備份檔案數量
+            backupCount: 保留的備份檔案數量（0 表示不限）
             encoding: 檔案編碼
             delay: 是否延遲創建檔案
+            compress: 輪替後是否以 gzip 壓縮
+            max_total_bytes: 備份檔案總大小上限（0 表示不限）
+            max_age_days: 備份檔案保存天數（0 表示不限）
         """
         # 生成帶有日期時間戳的檔案名稱
         timestamp = datetime.now().strftime("%Y%m%d_%H")
@@ -24,31 +159,116 @@ class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
         super().__init__(timestamped_filename, maxBytes=maxBytes, backupCount=backupCount,
                         encoding=encoding, delay=delay)
 
+        self.compress = compress
+        self.archive_prefix = f"{name}_"
+        self.archive_extension = ext
+        self.retention = RetentionPolicy(backupCount, max_total_bytes, max_age_days)
+        # 啟動時先清理上次執行留下的舊檔
+        log_archiver.submit(None, self.archive_prefix, ext, self.retention, active=self.baseFilename)
+
     def doRollover(self):
         """執行檔案輪替"""
         if self.stream:
             self.stream.close()
             self.stream = None
 
-        # 生成新的檔案名稱（包含時間戳）
+        # 生成新的檔案名稱（包含時間戳，同一秒內重複輪替時加上序號）
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         name, ext = os.path.splitext(self.baseFilename)
         new_filename = f"{name}_{timestamp}{ext}"
+        sequence = 0
+        while os.path.exists(new_filename) or os.path.exists(new_filename + ARCHIVE_SUFFIX):
+            sequence += 1
+            new_filename = f"{name}_{timestamp}_{sequence}{ext}"
 
         if os.path.exists(self.baseFilename):
-            # 將舊檔案移動到新名稱
-            if not os.path.abspath(self.baseFilename) == os.path.abspath(new_filename):
-                os.rename(self.baseFilename, new_filename)
+            # 將舊檔案移動到新名稱，壓縮與清理在背景執行緒進行
+            os.rename(self.baseFilename, new_filename)
+            log_archiver.submit(new_filename, self.archive_prefix, self.archive_extension, self.retention,
+                                compress=self.compress, active=self.baseFilename)
 
         # 創建新的日誌檔案
         if not self.delay:
             self.stream = self._open()
 
-def setup_logging(log_file="logs/device_service.log", mqtt_log_file="logs/mqtt.log", level="INFO"):
-    """設定應用程式日誌系統"""
+    def emit_batch(self, records):
+        """整批寫入：輪替檢查與 flush 每批只做一次（單批可能略超過 maxBytes）"""
+        text = _format_batch(self, records)
+        if text is None:
+            return
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self.stream.tell() > 0 and self.stream.tell() + len(text) >= self.maxBytes:
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(text)
+            self.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+
+def _start_listener(target_logger: logging.Logger, handlers, name: str, queue_size: int, batch_size: int,
+                    log_filter: Optional[logging.Filter] = None):
+    """以佇列 handler 取代 target_logger 的 handlers，實際寫入交給背景執行緒"""
+    log_queue = queue.Queue(maxsize=max(0, queue_size))
+    listener = BatchingQueueListener(log_queue, *handlers, batch_size=batch_size)
+    queue_handler = DroppingQueueHandler(log_queue, name)
+    if log_filter is not None:
+        # 在呼叫端過濾，被抑制的紀錄不會進入佇列
+        queue_handler.addFilter(log_filter)
+    target_logger.addHandler(queue_handler)
+    listener.start()
+    _pipelines.append((target_logger, queue_handler, listener))
+
 
-    # 確保 logs 目錄存在
-    os.makedirs("logs", exist_ok=True)
+def shutdown_logging(reattach: bool = True):
+    """停止背景日誌執行緒並寫完佇列中剩餘的紀錄
+
+    Args:
+        reattach: 之後的紀錄改由原 handlers 同步寫入；False 則直接關閉 handlers
+    """
+    while _pipelines:
+        target_logger, queue_handler, listener = _pipelines.pop()
+        target_logger.removeHandler(queue_handler)
+        listener.stop()
+        for handler in listener.handlers:
+            if reattach:
+                target_logger.addHandler(handler)
+            else:
+                handler.close()
+    # 讓進行中的壓縮有機會完成，避免留下未壓縮的輪替檔
+    log_archiver.wait(timeout=5.0)
+
+def setup_logging(log_file="logs/device_service.log", mqtt_log_file="logs/mqtt.log", level="INFO",
+                  queue_size: int = 10000, batch_size: int = 256, json_lines: bool = False,
+                  log_filter: Optional[logging.Filter] = None, compress: bool = True, backup_count: int = 5,
+                  max_total_bytes: int = 0, max_age_days: float = 0):
+    """設定應用程式日誌系統
+
+    Logger 只把紀錄放入有界佇列，格式化與檔案/主控台寫入都在背景執行緒批次進行；
+    佇列已滿時丟棄紀錄並計入 device_service_log_records_dropped_total。
+
+    Args:
+        queue_size: 佇列上限（0 表示不限）
+        batch_size: 背景執行緒每批最多寫入的紀錄數
+        json_lines: 檔案日誌改為每行一筆 JSON
+        log_filter: 套用於主日誌的過濾器（例如 RateLimitFilter）；MQTT 稽核日誌不套用，每筆發佈都保留
+        compress: 輪替後的檔案是否壓縮
+        backup_count, max_total_bytes, max_age_days: 各日誌的備份保留策略（0 表示不限）
+    """
+    global _atexit_registered
+
+    # 重新設定時先停止舊的背景執行緒並關閉其 handlers
+    shutdown_logging(reattach=False)
+
+    # 確保日誌目錄存在
+    for path in (log_file, mqtt_log_file):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
 
     # 轉換日誌等級
     log_level = getattr(logging, level.upper(), logging.INFO)
@@ -63,22 +283,26 @@ def setup_logging(log_file="logs/device_service.log", mqtt_log_file="logs/mqtt.l
 
     # 創建格式器
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    file_formatter = JsonLinesFormatter() if json_lines else formatter
 
     # 設定主日誌檔案（帶輪替功能）
     main_handler = SizeAndTimeRotatingFileHandler(
         log_file,
         maxBytes=20*1024*1024,  # 20MB
-        backupCount=5
+        backupCount=backup_count,
+        compress=compress,
+        max_total_bytes=max_total_bytes,
+        max_age_days=max_age_days
     )
-    main_handler.setFormatter(formatter)
+    main_handler.setFormatter(file_formatter)
     main_handler.setLevel(log_level)
-    logger.addHandler(main_handler)
 
     # 設定控制台輸出
-    console_handler = logging.StreamHandler()
+    console_handler = BatchStreamHandler()
     console_handler.setFormatter(formatter)
     console_handler.setLevel(log_level)
-    logger.addHandler(console_handler)
+
+    _start_listener(logger, [main_handler, console_handler], "main", queue_size, batch_size, log_filter)
 
     # 設定 MQTT 專用 logger
     mqtt_logger = logging.getLogger('mqtt')
@@ -92,15 +316,23 @@ def setup_logging(log_file="logs/device_service.log", mqtt_log_file="logs/mqtt.l
     mqtt_file_handler = SizeAndTimeRotatingFileHandler(
         mqtt_log_file,
         maxBytes=20*1024*1024,  # 20MB
-        backupCount=5
+        backupCount=backup_count,
+        compress=compress,
+        max_total_bytes=max_total_bytes,
+        max_age_days=max_age_days
     )
-    mqtt_file_handler.setFormatter(formatter)
+    mqtt_file_handler.setFormatter(file_formatter)
     mqtt_file_handler.setLevel(log_level)
-    mqtt_logger.addHandler(mqtt_file_handler)
+
+    _start_listener(mqtt_logger, [mqtt_file_handler], "mqtt", queue_size, batch_size)
 
     # 避免 MQTT 日誌重複輸出到根 logger
     mqtt_logger.propagate = False
 
+    if not _atexit_registered:
+        atexit.register(shutdown_logging)
+        _atexit_registered = True
+
     return logger, mqtt_logger
 
 def get_logger(name: str = None):
@@ -124,4 +356,5 @@ def test_logging():
 
 if __name__ == "__main__":
     setup_logging()
-    test_logging()
\ No newline at end of file
+    test_logging()
+    shutdown_logging()
\ No newline at end of file
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from ..config_mqtt import settings
+from .metrics import metrics_registry
+
+LOOP_LAG = metrics_registry.histogram(
+    "device_service_event_loop_lag_seconds",
+    "Delay between when the loop monitor's heartbeat was due and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+LOOP_STALLS = metrics_registry.counter(
+    "device_service_event_loop_stalls_total",
+    "Times the event loop was blocked longer than the stall threshold"
+)
+
+# 找出阻塞位置時優先採用本套件（app/）內最深的堆疊框
+_APP_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+
+def _culprit(frames: List[traceback.FrameSummary]) -> Optional[traceback.FrameSummary]:
+    """堆疊中最深的 app 程式碼框；沒有時取最深的框"""
+    for frame in reversed(frames):
+        path = os.path.abspath(frame.filename)
+        if path.startswith(_APP_DIRECTORY) and path != _THIS_FILE:
+            return frame
+    return frames[-1] if frames else None
+
+
+class LoopLagMonitor:
+    """事件迴圈延遲監控與阻塞偵測
+
+    - 心跳協程每 interval 秒醒來一次，以「應醒來時間」與「實際醒來時間」的差作為延遲，記錄到直方圖
+    - 看門狗執行緒發現心跳超過 interval + threshold 秒未更新時，擷取事件迴圈執行緒當下的堆疊，
+      迴圈恢復後補上實際阻塞時間，保存最近 max_offenders 筆
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25, max_offenders: int = 50):
+        self.interval = interval
+        self.threshold = threshold
+        self.offenders: Deque[Dict] = deque(maxlen=max_offenders)
+        self.recent_lags: Deque[float] = deque(maxlen=max(1, int(5.0 / interval)))  # 約最近 5 秒
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._open_stall: Optional[Dict] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop_event.clear()
+        self.task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop_event.set()
+        self.recent_lags.clear()  # 停止後不再回報近期延遲
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._last_beat = time.monotonic()
+            LOOP_LAG.observe(lag)
+            self.recent_lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            with self._lock:
+                stall, self._open_stall = self._open_stall, None
+            if stall is not None:
+                stall["blocked_ms"] = round((lag + self.interval) * 1000, 1)
+
+    def _watchdog(self):
+        """在獨立執行緒中檢查心跳；同一次阻塞只擷取一次堆疊"""
+        while not self._stop_event.wait(min(self.interval, self.threshold) / 2):
+            overdue = time.monotonic() - self._last_beat - self.interval
+            if overdue <= self.threshold:
+                continue
+            with self._lock:
+                if self._open_stall is not None:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                frames = traceback.extract_stack(frame)
+                culprit = _culprit(frames)
+                stall = {
+                    "detected_at": datetime.now().isoformat(timespec="milliseconds"),
+                    "blocked_ms": None,  # 迴圈恢復後補上
+                    "location": f"{culprit.filename}:{culprit.lineno} in {culprit.name}" if culprit else None,
+                    "stack": traceback.format_list(frames[-20:]),
+                }
+                self._open_stall = stall
+                self.offenders.append(stall)
+                self.stalls += 1
+            LOOP_STALLS.inc()
+
+    def recent_max_lag(self) -> float:
+        """最近約 5 秒內的最大延遲（秒）"""
+        return max(self.recent_lags, default=0.0)
+
+    def report(self) -> Dict:
+        offenders = list(self.offenders)
+        return {
+            "running": self.running,
+            "interval_s": self.interval,
+            "stall_threshold_s": self.threshold,
+            "recent_max_lag_ms": round(self.recent_max_lag() * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls": self.stalls,
+            "locations": dict(Counter(offender["location"] for offender in offenders).most_common()),
+            "offenders": list(reversed(offenders)),
+        }
+
+
+# 全域事件迴圈監控實例
+loop_lag_monitor = LoopLagMonitor(
+    interval=settings.LOOP_MONITOR_INTERVAL,
+    threshold=settings.LOOP_STALL_THRESHOLD,
+    max_offenders=settings.LOOP_MONITOR_MAX_OFFENDERS
+)
@@ -1,3 +1,4 @@
+import asyncio
 import socket
 import logging
 
@@ -9,4 +10,17 @@ def is_port_open(ip: str, port: int, timeout: float = 0.5) -> bool:
         with socket.create_connection((ip, port), timeout=timeout):
             return True
     except (socket.timeout, ConnectionRefusedError, OSError):
-        return False
\ No newline at end of file
+        return False
+
+async def is_port_open_async(ip: str, port: int, timeout: float = 0.5) -> bool:
+    """is_port_open 的非阻塞版本，可在事件迴圈中大量並行"""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except (asyncio.TimeoutError, OSError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
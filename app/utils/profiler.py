@@ -0,0 +1,182 @@
+"""
+線上服務的即時效能分析
+
+- 取樣分析：在獨立執行緒中定期讀取 sys._current_frames()，涵蓋所有執行緒（事件迴圈、paho 的
+  網路迴圈執行緒、asyncio.to_thread 的工作執行緒），輸出 collapsed stack 格式，可直接交給
+  flamegraph.pl 或 speedscope 產生火焰圖
+- cProfile：只分析事件迴圈執行緒，在指定秒數內啟用後輸出 pstats 文字報表
+- tracemalloc：開始追蹤後，每次取快照與上一次快照比較，找出持續成長的配置位置
+"""
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+# 輸出路徑時去掉這些前綴（本專案根目錄與 sys.path 中的目錄），較長的前綴優先
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ProfilerBusyError(RuntimeError):
+    """已有分析工作進行中"""
+
+
+def _short_path(filename: str, prefixes: List[str]) -> str:
+    for prefix in prefixes:
+        if filename.startswith(prefix):
+            return filename[len(prefix):].lstrip(os.sep)
+    return filename
+
+
+def _path_prefixes() -> List[str]:
+    paths = {_PROJECT_ROOT} | {os.path.abspath(path) for path in sys.path if path}
+    return sorted(paths, key=len, reverse=True)
+
+
+def sample_stacks(duration: float, interval: float = 0.005) -> Counter:
+    """在 duration 秒內每 interval 秒取樣所有執行緒的堆疊，回傳 collapsed stack 與次數
+
+    每個堆疊以執行緒名稱為根，框格式為「函式 (檔案:函式起始行)」，同一函式內不同行的取樣會合併。
+    """
+    prefixes = _path_prefixes()
+    own_thread = threading.get_ident()
+    labels: Dict[object, str] = {}
+    samples: Counter = Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = f"{code.co_name} ({_short_path(code.co_filename, prefixes)}:{code.co_firstlineno})"
+                    labels[code] = label
+                stack.append(label)
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            samples[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return samples
+
+
+def format_collapsed(samples: Counter) -> str:
+    """collapsed stack 文字：每行「框;框;框 次數」"""
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+class Profiler:
+    """同一時間只允許一個分析工作，避免多個請求疊加影響服務"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profiling session is already running")
+
+    async def sample(self, duration: float, interval: float = 0.005) -> str:
+        """所有執行緒的取樣分析，回傳 collapsed stack 文字"""
+        self._acquire()
+        try:
+            samples = await asyncio.to_thread(sample_stacks, duration, interval)
+        finally:
+            self._lock.release()
+        return format_collapsed(samples)
+
+    async def cprofile(self, duration: float, sort: str = "cumulative", limit: int = 100) -> str:
+        """事件迴圈執行緒的 cProfile，回傳 pstats 文字報表（依 sort 排序，前 limit 筆）"""
+        self._acquire()
+        try:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await asyncio.sleep(duration)
+            finally:
+                profile.disable()
+        finally:
+            self._lock.release()
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    """排除 tracemalloc 本身與匯入機制的配置"""
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+
+
+class MemoryTracker:
+    """tracemalloc 快照比較；每次 diff 後以新快照作為下一次比較的基準"""
+
+    def __init__(self):
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> Dict:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._baseline = _take_snapshot()
+        return self.status()
+
+    def stop(self) -> Dict:
+        with self._lock:
+            tracemalloc.stop()
+            self._baseline = None
+        return self.status()
+
+    def status(self) -> Dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+        }
+
+    def diff(self, limit: int = 30, group_by: str = "lineno") -> Dict:
+        """與上一次快照比較，回傳成長最多的前 limit 個配置位置"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is not tracing; start it first")
+            snapshot = _take_snapshot()
+            baseline, self._baseline = self._baseline, snapshot
+        prefixes = _path_prefixes()
+        stats = snapshot.compare_to(baseline, group_by) if baseline is not None else [
+            tracemalloc.StatisticDiff(stat.traceback, stat.size, stat.size, stat.count, stat.count)
+            for stat in snapshot.statistics(group_by)
+        ]
+        top = []
+        for stat in stats[:limit]:
+            top.append({
+                "location": [f"{_short_path(frame.filename, prefixes)}:{frame.lineno}"
+                             for frame in stat.traceback],
+                "size_bytes": stat.size,
+                "size_diff_bytes": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            })
+        return {**self.status(), "top": top}
+
+
+# 全域分析實例
+profiler = Profiler()
+memory_tracker = MemoryTracker()
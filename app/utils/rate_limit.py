@@ -0,0 +1,53 @@
+import threading
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """權杖桶：以固定速率補充權杖，容量即允許的突發數量
+
+    Args:
+        rate: 每秒補充的權杖數
+        capacity: 權杖上限（初始為滿）
+        clock: 時間來源（預設 time.monotonic，測試與模擬可替換）
+    """
+
+    __slots__ = ("rate", "capacity", "_tokens", "_updated", "_clock", "_lock")
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """有足夠權杖時扣除並回傳 True，否則不扣除並回傳 False"""
+        with self._lock:
+            self._refill(self._clock())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """距離可取得 tokens 個權杖還需等待的秒數（0 表示立即可取得）"""
+        with self._lock:
+            self._refill(self._clock())
+            if self._tokens >= tokens:
+                return 0.0
+            if self.rate <= 0:
+                return float("inf")
+            return (tokens - self._tokens) / self.rate
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill(self._clock())
+            return self._tokens
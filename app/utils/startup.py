@@ -0,0 +1,81 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from .metrics import metrics_registry
+
+STARTUP_PHASE_SECONDS = metrics_registry.gauge(
+    "device_service_startup_phase_seconds",
+    "Duration of each startup phase of the current process",
+    ["phase"]
+)
+
+
+def process_age() -> Optional[float]:
+    """行程已執行的秒數（含直譯器啟動與匯入）；僅支援 Linux，其他平台回傳 None"""
+    try:
+        with open("/proc/self/stat", "rb") as stat_file:
+            # 第 22 欄為開機後的啟動時間（clock ticks）；行程名稱可能含空白，從最後一個 ')' 之後切
+            fields = stat_file.read().rsplit(b")", 1)[1].split()
+        with open("/proc/uptime", "rb") as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    """記錄啟動各階段的開始時間與耗時（相對於 app.main 開始匯入的時間點）"""
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self._clock = clock
+        self.origin = clock()
+        # 匯入 app.main 之前行程已執行的秒數（直譯器啟動、uvicorn 等）
+        self.before_import = process_age()
+        self.phases: Dict[str, Dict] = {}
+        self.ready_at: Optional[float] = None
+
+    def _offset_ms(self, moment: float) -> float:
+        return round((moment - self.origin) * 1000, 1)
+
+    def start(self, name: str):
+        self.phases[name] = {"start_ms": self._offset_ms(self._clock()), "status": "running"}
+
+    def finish(self, name: str, error: Optional[BaseException] = None):
+        phase = self.phases.setdefault(name, {"start_ms": 0.0})
+        ended = self._clock()
+        duration = (ended - self.origin) - phase["start_ms"] / 1000
+        phase["duration_ms"] = round(duration * 1000, 1)
+        phase["status"] = "failed" if error is not None else "ok"
+        if error is not None:
+            phase["error"] = str(error)
+        STARTUP_PHASE_SECONDS.labels(name).set(duration)
+
+    @contextmanager
+    def phase(self, name: str):
+        """以 with 區塊記錄一個階段（async 函式中也可使用）"""
+        self.start(name)
+        try:
+            yield
+        except BaseException as e:
+            self.finish(name, e)
+            raise
+        self.finish(name)
+
+    def ready(self):
+        """標記服務已可接受請求"""
+        self.ready_at = self._clock()
+        STARTUP_PHASE_SECONDS.labels("total").set(self.ready_at - self.origin)
+
+    def report(self) -> Dict:
+        return {
+            "process_before_import_ms": round(self.before_import * 1000, 1) if self.before_import is not None else None,
+            "ready": self.ready_at is not None,
+            "ready_ms": self._offset_ms(self.ready_at) if self.ready_at is not None else None,
+            "phases": {name: dict(phase) for name, phase in self.phases.items()},
+        }
+
+
+# 全域啟動計時實例（於 app.main 開始匯入時建立）
+startup_timer = StartupTimer()
@@ -0,0 +1,240 @@
+"""
+輕量的行程內追蹤
+
+- 以 contextvars 記錄目前的 span，async 程式中各 task 互不干擾
+- 結束的 span 放進固定大小的環形緩衝區（deque），不寫檔、不經過網路
+- 取樣在 trace 的起點決定（例如每次設備探測），未取樣的 span 不進緩衝區，子 span 也不記錄
+- 可依 proxyid 查詢，並轉成 OTLP/JSON（ExportTraceServiceRequest）格式匯出
+"""
+import json
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterator, List, Optional
+
+from ..config_mqtt import settings
+
+SERVICE_NAME = "device-service"
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+
+class Span:
+    """一段計時區間；proxyid 未指定時沿用父 span 的值"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "proxyid", "sampled",
+                 "start_ns", "end_ns", "attributes", "status", "error")
+
+    def __init__(self, name: str, trace_id: int, parent_id: Optional[int], proxyid: Optional[int],
+                 sampled: bool, attributes: Dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent_id
+        self.proxyid = proxyid
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.status = STATUS_OK
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_error(self, error):
+        self.status = STATUS_ERROR
+        self.error = str(error)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return round((self.end_ns - self.start_ns) / 1e6, 3) if self.end_ns is not None else None
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": f"{self.trace_id:032x}",
+            "span_id": f"{self.span_id:016x}",
+            "parent_id": f"{self.parent_id:016x}" if self.parent_id is not None else None,
+            "proxyid": self.proxyid,
+            "start": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.start_ns / 1e9))
+                     + f".{self.start_ns // 1_000_000 % 1000:03d}",
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": dict(self.attributes),
+        }
+
+
+class _NonRecordingSpan:
+    """未取樣時使用的 span，不配置物件、不進緩衝區"""
+
+    sampled = False
+    proxyid = None
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def set_error(self, error):
+        pass
+
+
+_NON_RECORDING = _NonRecordingSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class Tracer:
+    """記錄 span 到環形緩衝區
+
+    Args:
+        capacity: 緩衝區保留的 span 數
+        sample_rate: trace 起點的取樣比例（0 表示停用）
+    """
+
+    def __init__(self, capacity: int = 10000, sample_rate: float = 0.1):
+        self.sample_rate = sample_rate
+        self.spans: Deque[Span] = deque(maxlen=capacity)
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def sample(self) -> bool:
+        """依取樣比例決定是否記錄一個新的 trace"""
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    @contextmanager
+    def span(self, name: str, proxyid: Optional[int] = None, sampled: Optional[bool] = None,
+             **attributes) -> Iterator[Span]:
+        """開始一個 span；sampled 未指定時沿用父 span，沒有父 span 時依取樣比例決定
+
+        指定 sampled 的 span 會重新決定是否記錄，但仍掛在已記錄的父 span 之下（同一個 trace）。
+        區塊內拋出的例外會將 span 標記為 error 後繼續往外拋。
+        """
+        parent = _current_span.get()
+        if sampled is None:
+            sampled = parent.sampled if parent is not None else self.sample()
+        if not sampled:
+            token = _current_span.set(_NON_RECORDING)
+            try:
+                yield _NON_RECORDING
+            finally:
+                _current_span.reset(token)
+            return
+
+        if parent is not None and parent.sampled:
+            span = Span(name, parent.trace_id, parent.span_id,
+                        proxyid if proxyid is not None else parent.proxyid, True, attributes)
+        else:
+            span = Span(name, random.getrandbits(128), None, proxyid, True, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self.spans.append(span)
+
+    @contextmanager
+    def child_span(self, name: str, **attributes) -> Iterator[Span]:
+        """只在目前有已記錄的 span 時才記錄的子 span（例如探測內的各步驟），否則幾乎沒有成本"""
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            yield _NON_RECORDING
+            return
+        with self.span(name, **attributes) as span:
+            yield span
+
+    def find(self, proxyid: Optional[int] = None, trace_id: Optional[str] = None,
+             limit: int = 1000) -> List[Span]:
+        """最近結束的 span（新到舊），可依 proxyid 或 trace_id 篩選"""
+        trace = int(trace_id, 16) if trace_id else None
+        result = []
+        for span in reversed(list(self.spans)):
+            if proxyid is not None and span.proxyid != proxyid:
+                continue
+            if trace is not None and span.trace_id != trace:
+                continue
+            result.append(span)
+            if len(result) >= limit:
+                break
+        return result
+
+    def clear(self):
+        self.spans.clear()
+
+
+def group_by_trace(spans: List[Span]) -> List[Dict]:
+    """依 trace 分組，各組內依開始時間排序；組的順序依 spans 中第一次出現的順序"""
+    traces: Dict[int, List[Span]] = {}
+    for span in spans:
+        traces.setdefault(span.trace_id, []).append(span)
+    result = []
+    for trace_id, members in traces.items():
+        members.sort(key=lambda span: span.start_ns)
+        result.append({
+            "trace_id": f"{trace_id:032x}",
+            "duration_ms": round((max(span.end_ns for span in members) - members[0].start_ns) / 1e6, 3),
+            "spans": [span.to_dict() for span in members],
+        })
+    return result
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: List[Span]) -> Dict:
+    """轉成 OTLP/JSON 的 ExportTraceServiceRequest，可直接送往 collector 的 /v1/traces"""
+    otlp_spans = []
+    for span in sorted(spans, key=lambda span: span.start_ns):
+        attributes = dict(span.attributes)
+        if span.proxyid is not None:
+            attributes["proxyid"] = span.proxyid
+        otlp_span = {
+            "traceId": f"{span.trace_id:032x}",
+            "spanId": f"{span.span_id:016x}",
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.status == STATUS_ERROR else {"code": 1},
+        }
+        if span.parent_id is not None:
+            otlp_span["parentSpanId"] = f"{span.parent_id:016x}"
+        otlp_spans.append(otlp_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}],
+        }]
+    }
+
+
+def export_otlp(path: str, spans: List[Span]) -> int:
+    """將 spans 以 OTLP/JSON 寫入檔案，回傳筆數"""
+    with open(path, "w", encoding="utf-8") as export_file:
+        json.dump(to_otlp(spans), export_file)
+    return len(spans)
+
+
+# 全域追蹤實例
+tracer = Tracer(capacity=settings.TRACE_BUFFER_SIZE, sample_rate=settings.TRACE_SAMPLE_RATE)
@@ -0,0 +1 @@
+"""效能量測工具（模擬代理服務叢集與基準測試執行器）"""
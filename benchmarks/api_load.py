@@ -0,0 +1,298 @@
+"""
+REST API 負載測試
+
+以固定亂數種子建立 N 台設備資料，並以指定的並行數對各路由發送請求。每個情境輸出：
+- 請求數與錯誤數
+- 吞吐量
+- p50/p95/p99 延遲
+
+結果可存成基準檔；之後的執行會與基準比較，任一情境退化超過門檻時以非零狀態結束，供 CI 使用。
+
+目標：
+- 預設在行程內以 httpx.ASGITransport 呼叫 app.main.app。資料庫改用暫存 SQLite 檔案，不會啟動背景工作程序與 MQTT。
+- --url http://host:port：對執行中的服務施壓。此模式不建立資料，需預先建立 N 台設備。
+
+用法：
+    python -m benchmarks.api_load --devices 10000 --concurrency 32 --save-baseline baseline.json
+    python -m benchmarks.api_load --devices 10000 --concurrency 32 --baseline baseline.json --threshold 0.25
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.stats import summarize_ms
+
+# 可比較的指標：延遲越高越差，吞吐量越低越差
+_LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+_THROUGHPUT_METRIC = "throughput_rps"
+
+DEFAULT_SCENARIOS = ("health", "list", "detail", "proxy_status", "proxy_status_detail", "crud")
+
+
+def _device_payload(rng: random.Random, index: int) -> Dict:
+    return {
+        "proxy_ip": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}",
+        "proxy_port": 8000 + index % 1000,
+        "Controller_type": rng.choice(["E82", "E88", "E84", "E87"]),
+        "Controller_ip": f"10.200.{index // 256 % 256}.{index % 256}",
+        "Controller_port": 9000 + index % 1000,
+        "remark": f"load-test device {index}",
+        "enable": 1 if rng.random() < 0.9 else 0,
+        "createUser": "benchmark",
+    }
+
+
+class InProcessTarget:
+    """行程內目標：暫存 SQLite 資料庫 + ASGITransport"""
+
+    def __init__(self, devices: int, seed: int, concurrency: int = 16):
+        self.devices = devices
+        self.seed = seed
+        self.concurrency = concurrency
+        self._directory = tempfile.TemporaryDirectory(prefix="api_load_")
+        self._previous_override = None
+        self.engine = None
+
+    def __enter__(self) -> httpx.AsyncClient:
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from app.main import app
+        from app.database import Base, get_db
+        from app.models.device import Device
+        from app.services.device_processor import device_processor
+
+        # 連線池至少容納 concurrency 個請求：async 路由在事件迴圈上等待連線時，
+        # 其他請求在執行緒池中關閉 session 的步驟無法排入，池太小會互相卡住
+        self.engine = create_engine(
+            f"sqlite:///{os.path.join(self._directory.name, 'load.db')}",
+            connect_args={"check_same_thread": False},
+            pool_size=max(5, self.concurrency)
+        )
+        Base.metadata.create_all(bind=self.engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+
+        rng = random.Random(self.seed)
+        with session_factory() as session:
+            session.add_all([Device(proxyid=index + 1, **_device_payload(rng, index)) for index in range(self.devices)])
+            session.commit()
+            device_processor.load_devices_to_cache(session.query(Device).all())
+
+        def override_get_db():
+            db = session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        self._app = app
+        self._get_db = get_db
+        self._previous_override = app.dependency_overrides.get(get_db)
+        app.dependency_overrides[get_db] = override_get_db
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test")
+        return self.client
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._previous_override is not None:
+            self._app.dependency_overrides[self._get_db] = self._previous_override
+        else:
+            self._app.dependency_overrides.pop(self._get_db, None)
+        self.engine.dispose()
+        self._directory.cleanup()
+
+
+class RemoteTarget:
+    """執行中服務的目標（資料需預先建立）"""
+
+    def __init__(self, url: str, concurrency: int):
+        self.url = url
+        self.concurrency = concurrency
+
+    def __enter__(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        self.client = httpx.AsyncClient(base_url=self.url, limits=limits, timeout=30.0)
+        return self.client
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+def _scenario_steps(name: str, devices: int, rng: random.Random, sequence: int) -> List[Tuple[str, str, str, Optional[Dict]]]:
+    """回傳 [(操作名稱, HTTP 方法, 路徑, JSON 內容)]；crud 依序送出建立、更新、刪除"""
+    proxyid = rng.randint(1, max(devices, 1))
+    if name == "health":
+        return [("health", "GET", "/health", None)]
+    if name == "list":
+        # 頁碼限制在實際資料範圍內（--url 模式需預先建立 devices 台設備）
+        pages = max(1, (devices + 19) // 20)
+        return [("list", "GET", f"/DeviceServiceConfig?page={rng.randint(1, pages)}&size=20", None)]
+    if name == "detail":
+        return [("detail", "GET", f"/DeviceServiceConfig/{proxyid}", None)]
+    if name == "proxy_status":
+        return [("proxy_status", "GET", "/ProxyStatus", None)]
+    if name == "proxy_status_detail":
+        return [("proxy_status_detail", "GET", f"/ProxyStatus/{proxyid}", None)]
+    if name == "crud":
+        new_id = devices + 1_000_000 + sequence
+        payload = dict(_device_payload(rng, new_id), proxyid=new_id, enable=0)
+        return [
+            ("crud_create", "POST", "/DeviceServiceConfig", payload),
+            ("crud_update", "PUT", f"/DeviceServiceConfig/{new_id}", {"remark": "updated by load test"}),
+            ("crud_delete", "DELETE", f"/DeviceServiceConfig/{new_id}", None),
+        ]
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, devices: int, requests: int,
+                       concurrency: int, seed: int) -> Dict[str, Dict]:
+    """以 concurrency 個並行工作者執行 requests 次情境，回傳各操作的統計"""
+    rng = random.Random(f"{seed}:{name}")
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    counter = iter(range(requests))
+
+    async def worker():
+        for sequence in counter:
+            for operation, method, path, body in _scenario_steps(name, devices, rng, sequence):
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                latencies.setdefault(operation, []).append(time.perf_counter() - started)
+                if operation == "list" and not failed and not response.json()["data"]:
+                    failed = True  # 空白頁表示頁碼超出實際資料，量到的不是列表成本
+                if failed:
+                    errors[operation] = errors.get(operation, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for operation, values in latencies.items():
+        summary = summarize_ms(values)
+        summary["errors"] = errors.get(operation, 0)
+        summary[_THROUGHPUT_METRIC] = round(len(values) / elapsed, 1) if elapsed else 0.0
+        results[operation] = summary
+    return results
+
+
+def compare_to_baseline(current: Dict, baseline: Dict, threshold: float, min_delta_ms: float) -> List[str]:
+    """比較兩次結果，回傳退化描述清單
+
+    延遲需同時超過 (1 + threshold) 倍與 min_delta_ms 的絕對增量才算退化（避免微秒級雜訊）；
+    吞吐量低於 (1 - threshold) 倍即算退化。僅比較設備數相同的結果。
+    """
+    if current["meta"]["devices"] != baseline["meta"]["devices"]:
+        return [f"baseline was recorded with {baseline['meta']['devices']} devices, "
+                f"current run uses {current['meta']['devices']}"]
+
+    regressions = []
+    for operation, base in baseline["operations"].items():
+        now = current["operations"].get(operation)
+        if now is None:
+            continue
+        for metric in _LATENCY_METRICS:
+            if now[metric] > base[metric] * (1 + threshold) and now[metric] - base[metric] >= min_delta_ms:
+                regressions.append(f"{operation} {metric}: {base[metric]} -> {now[metric]}")
+        if now[_THROUGHPUT_METRIC] < base[_THROUGHPUT_METRIC] * (1 - threshold):
+            regressions.append(f"{operation} {_THROUGHPUT_METRIC}: {base[_THROUGHPUT_METRIC]} -> {now[_THROUGHPUT_METRIC]}")
+        if now["errors"] > base["errors"]:
+            regressions.append(f"{operation} errors: {base['errors']} -> {now['errors']}")
+    return regressions
+
+
+async def run(args) -> Dict:
+    target = RemoteTarget(args.url, args.concurrency) if args.url else InProcessTarget(args.devices, args.seed, args.concurrency)
+    operations: Dict[str, Dict] = {}
+    with target as client:
+        async with client:
+            # 暖機：避免首次請求的匯入與連線成本計入
+            await client.get("/health")
+            for name in args.scenarios:
+                results = await run_scenario(client, name, args.devices, args.requests, args.concurrency, args.seed)
+                operations.update(results)
+                for operation, summary in results.items():
+                    print(f"{operation}: {summary[_THROUGHPUT_METRIC]} req/s, p50={summary['p50_ms']} "
+                          f"p95={summary['p95_ms']} p99={summary['p99_ms']} ms, errors={summary['errors']}",
+                          file=sys.stderr)
+    return {
+        "meta": {
+            "devices": args.devices,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "target": args.url or "in-process",
+        },
+        "operations": operations,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Device Service REST API")
+    parser.add_argument("--devices", type=int, default=1000, help="Fleet size to seed (or already seeded with --url)")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS),
+                        type=lambda value: [name for name in value.split(",") if name])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="Target a running service instead of the in-process app")
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    parser.add_argument("--save-baseline", help="Write results as the new baseline")
+    parser.add_argument("--baseline", help="Compare against this baseline and exit 1 on regression")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression (0.2 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore latency increases smaller than this")
+    parser.add_argument("--log-level", default="INFO",
+                        help="Application log level; records are formatted and discarded")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    result = asyncio.run(run(args))
+
+    for path in (args.json_path, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as output:
+                json.dump(result, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_to_baseline(result, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print("Performance regressions against baseline:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            return 1
+        print("No regressions against baseline", file=sys.stderr)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+def _discard_logs(level: str):
+    """匯入 app 時會設定檔案與主控台日誌；改為格式化後丟棄，保留日誌成本但不寫檔"""
+    import app.main  # noqa: F401
+
+    handler = logging.FileHandler(os.devnull)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logging.basicConfig(level=getattr(logging, level.upper(), logging.INFO), handlers=[handler], force=True)
+    mqtt_logger = logging.getLogger("mqtt")
+    for mqtt_handler in mqtt_logger.handlers[:]:
+        mqtt_logger.removeHandler(mqtt_handler)
+    mqtt_logger.propagate = True
+
+
+if __name__ == "__main__":
+    _discard_logs(parse_args().log_level)
+    sys.exit(main())
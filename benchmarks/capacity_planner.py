@@ -0,0 +1,160 @@
+"""
+監控端容量規劃
+
+以 benchmarks.simulator 在虛擬時間中執行真實的巡檢邏輯，預測指定設備數與故障模型下的：
+- 巡檢一輪所需時間與巡檢週期
+- 故障偵測延遲與恢復偵測延遲（p50/p95/p99）
+- 探測流量（TCP 連線、HTTP 請求、MQTT 訊息每秒數）
+
+設備數很大時只模擬 --sample 台，每台代表 devices / sample 台（見 simulator 模組說明）。
+模擬每台設備的 CPU 成本取自本機實際執行時間；--no-cpu 可只計算網路耗時。
+
+用法：
+    python -m benchmarks.capacity_planner --devices 100000 --mtbf 86400 --mttr 300
+    python -m benchmarks.capacity_planner --devices 5000 --blackhole-fraction 0.02 --port-timeout 0.5 \\
+        --target-detection 60 --json plan.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Dict
+
+from app.config_mqtt import settings
+from benchmarks.simulator import STATE_REFUSED, FleetModel, MonitorSimulation, measure_client_setup
+from benchmarks.virtual_clock import run_virtual
+
+# 命令列選項 → 模擬期間暫時覆寫的設定
+_SETTING_OPTIONS = {
+    "interval": "BACKGROUND_WORKER_INTERVAL",
+    "port_timeout": "PROBE_PORT_TIMEOUT",
+    "health_timeout": "PROBE_HEALTH_TIMEOUT",
+    "start_timeout": "PROBE_START_TIMEOUT",
+    "probe_mode": "PROBE_MODE",
+    "down_after": "STATUS_DOWN_AFTER",
+    "up_after": "STATUS_UP_AFTER",
+}
+
+
+def plan(args) -> Dict:
+    sample = min(args.devices, args.sample) if args.sample else args.devices
+    weight = args.devices / sample
+    client_setup = measure_client_setup() if args.client_setup_ms == "auto" else float(args.client_setup_ms) / 1000.0
+
+    fleet = FleetModel(
+        sample,
+        latency=args.latency,
+        connect_ms=args.connect_ms,
+        refused_fraction=args.refused_fraction,
+        blackhole_fraction=args.blackhole_fraction,
+        hang_fraction=args.hang_fraction,
+        http_error_fraction=args.http_error_fraction,
+        mtbf=args.mtbf,
+        mttr=args.mttr,
+        failure_mode=args.failure_mode,
+        seed=args.seed,
+    )
+    simulation = MonitorSimulation(fleet, args.duration, weight=weight,
+                                   max_sweeps=args.max_sweeps or None, client_setup=client_setup)
+
+    saved = {name: getattr(settings, name) for name in _SETTING_OPTIONS.values()}
+    try:
+        for option, name in _SETTING_OPTIONS.items():
+            if getattr(args, option) is not None:
+                setattr(settings, name, getattr(args, option))
+        effective = {name: getattr(settings, name) for name in _SETTING_OPTIONS.values()}
+        report = run_virtual(simulation.run(), cpu_scale=0.0 if args.no_cpu else weight)
+    finally:
+        for name, value in saved.items():
+            setattr(settings, name, value)
+
+    report["settings"] = effective
+    report["client_setup_ms"] = round(client_setup * 1000, 3)
+    report["verdict"] = _verdict(report, effective["BACKGROUND_WORKER_INTERVAL"], args.target_detection)
+    return report
+
+
+def _verdict(report: Dict, interval: float, target_detection: float) -> Dict:
+    """依偵測延遲目標與巡檢耗時給出結論"""
+    sweep = report["sweeps"]["duration"]
+    detection = report["detection_latency"]
+    notes = []
+    if sweep.get("count") and sweep["p50_s"] > interval:
+        notes.append(f"a sweep takes {sweep['p50_s']}s, longer than the {interval}s interval; "
+                     f"the cycle period is bound by probe time")
+    meets_target = None
+    if target_detection and detection.get("count"):
+        meets_target = detection["p95_s"] <= target_detection
+        if not meets_target:
+            notes.append(f"p95 detection latency {detection['p95_s']}s exceeds the {target_detection}s target")
+    if report["outages"]["undetected"]:
+        notes.append(f"{report['outages']['undetected']} outages ended before any sweep saw them")
+    return {"meets_detection_target": meets_target, "notes": notes}
+
+
+def _print_summary(report: Dict):
+    sweep = report["sweeps"]
+    traffic = report["probe_traffic"]
+    print(f"devices: {report['devices']} (simulated {report['simulated_devices']}, "
+          f"{report['simulated_seconds']}s of virtual time)")
+    print(f"sweep duration: {sweep['duration']}  per device: {sweep['per_device_ms']} ms")
+    print(f"cycle period: {sweep['cycle_period']}")
+    print(f"detection latency: {report['detection_latency']}")
+    print(f"recovery latency: {report['recovery_latency']}")
+    print(f"outages: {report['outages']}")
+    print(f"probe traffic: {traffic['tcp_connects_per_s']} tcp/s, {traffic['http_requests_per_s']} http/s, "
+          f"{traffic['mqtt_messages_per_s']} mqtt/s")
+    for note in report["verdict"]["notes"]:
+        print(f"  ! {note}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Predict sweep duration, detection latency and probe traffic "
+                                                 "by simulating the monitor in virtual time")
+    parser.add_argument("--devices", type=int, default=1000, help="Fleet size to plan for")
+    parser.add_argument("--sample", type=int, default=2000,
+                        help="Devices actually simulated; each stands for devices/sample devices (0 = all)")
+    parser.add_argument("--duration", type=float, default=86400.0, help="Maximum simulated seconds")
+    parser.add_argument("--max-sweeps", type=int, default=30, help="Stop after this many sweeps (0 = run the full duration)")
+    parser.add_argument("--interval", type=float, help="Override BACKGROUND_WORKER_INTERVAL")
+    parser.add_argument("--port-timeout", type=float, help="Override PROBE_PORT_TIMEOUT")
+    parser.add_argument("--health-timeout", type=float, help="Override PROBE_HEALTH_TIMEOUT")
+    parser.add_argument("--start-timeout", type=float, help="Override PROBE_START_TIMEOUT")
+    parser.add_argument("--probe-mode", choices=("tcp_http", "http"), help="Override PROBE_MODE")
+    parser.add_argument("--down-after", type=int, help="Override STATUS_DOWN_AFTER")
+    parser.add_argument("--up-after", type=int, help="Override STATUS_UP_AFTER")
+    parser.add_argument("--latency", default="lognormal:2:0.5", help="Proxy response time distribution")
+    parser.add_argument("--connect-ms", type=float, default=0.3, help="TCP connect time")
+    parser.add_argument("--refused-fraction", type=float, default=0.0, help="Devices whose port is always closed")
+    parser.add_argument("--blackhole-fraction", type=float, default=0.0, help="Devices that drop packets")
+    parser.add_argument("--hang-fraction", type=float, default=0.0, help="Devices that accept but never answer HTTP")
+    parser.add_argument("--http-error-fraction", type=float, default=0.0, help="Devices whose /Health returns 500")
+    parser.add_argument("--mtbf", type=float, default=3600.0, help="Mean seconds between failures (0 = no failures)")
+    parser.add_argument("--mttr", type=float, default=300.0, help="Mean outage length in seconds")
+    parser.add_argument("--failure-mode", default=STATE_REFUSED,
+                        choices=["refused", "blackhole", "hang", "http_error"], help="How a failing device behaves")
+    parser.add_argument("--client-setup-ms", default="auto",
+                        help="Cost of building one httpx.AsyncClient; 'auto' measures it on this machine")
+    parser.add_argument("--no-cpu", action="store_true", help="Do not charge local CPU time to the virtual clock")
+    parser.add_argument("--target-detection", type=float, default=0.0, help="p95 detection latency target in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="WARNING",
+                        help="Application log level; records are formatted and discarded")
+    parser.add_argument("--json", dest="json_path", help="Write the report to this JSON file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+
+    handler = logging.FileHandler(os.devnull)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logging.basicConfig(level=getattr(logging, arguments.log_level.upper(), logging.WARNING), handlers=[handler], force=True)
+
+    capacity_report = plan(arguments)
+    _print_summary(capacity_report)
+    if arguments.json_path:
+        with open(arguments.json_path, "w", encoding="utf-8") as output:
+            json.dump({"options": vars(arguments), "report": capacity_report}, output, indent=2)
+    sys.exit(0)
@@ -0,0 +1,351 @@
+"""
+模擬代理服務叢集
+
+以 asyncio 實作最小 HTTP 伺服器，模擬大量下位代理服務的 /Health、/start 與 /stop、/pause、/resume API。
+
+兩種部署模式：
+- ports：每台設備各自監聽 127.0.0.1 上的一個連接埠
+- virtual：所有設備共用一個連接埠，以 127.x.y.z 不同位址區分（依連線的本地位址路由，僅限 Linux）
+
+每台設備可設定回應延遲分佈、逾時（不回應）、拒絕連線、狀態抖動（週期性回 503）與 /start 失敗。
+"""
+import asyncio
+import json
+import math
+import random
+import socket
+import time
+from typing import Dict, List, Optional, Tuple
+
+# 設備行為類型
+KIND_OK = "ok"
+KIND_HANG = "hang"            # /Health 永不回應（觸發監控端逾時）
+KIND_REFUSE = "refuse"        # 連接埠拒絕連線
+KIND_FLAP = "flap"            # 週期性在正常與 503 之間切換
+KIND_START_ERROR = "start_error"  # /Health 正常但 /start 回 500
+
+_REASONS = {200: "OK", 404: "Not Found", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class LatencyDistribution:
+    """回應延遲分佈（毫秒）
+
+    規格字串：
+    - fixed:5
+    - uniform:1:20
+    - lognormal:5:0.5   （中位數毫秒, sigma）
+    - exponential:5     （平均毫秒）
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        parts = spec.split(":")
+        self.kind = parts[0]
+        try:
+            self.params = [float(value) for value in parts[1:]]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec: {spec}")
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "exponential": 1}
+        if expected.get(self.kind) != len(self.params):
+            raise ValueError(f"Invalid latency spec: {spec}")
+        self.spec = spec
+
+    def sample(self, rng: random.Random) -> float:
+        """取得一次延遲（秒）"""
+        if self.kind == "fixed":
+            millis = self.params[0]
+        elif self.kind == "uniform":
+            millis = rng.uniform(self.params[0], self.params[1])
+        elif self.kind == "lognormal":
+            millis = rng.lognormvariate(math.log(max(self.params[0], 1e-6)), self.params[1])
+        else:
+            millis = rng.expovariate(1.0 / self.params[0]) if self.params[0] > 0 else 0.0
+        return max(millis, 0.0) / 1000.0
+
+
+class FakeProxy:
+    """單一模擬代理服務的行為設定"""
+
+    __slots__ = ("index", "ip", "port", "kind", "flap_period", "flap_offset", "requests")
+
+    def __init__(self, index: int, ip: str, port: int, kind: str = KIND_OK,
+                 flap_period: float = 10.0, flap_offset: float = 0.0):
+        self.index = index
+        self.ip = ip
+        self.port = port
+        self.kind = kind
+        self.flap_period = flap_period
+        self.flap_offset = flap_offset
+        self.requests = 0
+
+    def is_up(self, now: float) -> bool:
+        """抖動設備在週期前半段正常、後半段異常"""
+        if self.kind != KIND_FLAP:
+            return True
+        return ((now + self.flap_offset) % (2 * self.flap_period)) < self.flap_period
+
+    def as_dict(self) -> Dict:
+        return {"index": self.index, "ip": self.ip, "port": self.port, "kind": self.kind}
+
+
+class FakeProxyFleet:
+    """模擬代理服務叢集
+
+    Args:
+        count: 設備數量
+        mode: "ports" 或 "virtual"
+        latency: 延遲分佈規格（見 LatencyDistribution）
+        hang_fraction / refuse_fraction / flap_fraction / start_error_fraction: 各異常行為的設備比例
+        flap_period: 抖動半週期（秒）
+        base_port: ports 模式的起始連接埠（0 表示由系統分配）
+        seed: 亂數種子，相同參數產生相同的叢集
+    """
+
+    def __init__(self, count: int, mode: str = "ports", latency: str = "fixed:0",
+                 hang_fraction: float = 0.0, refuse_fraction: float = 0.0,
+                 flap_fraction: float = 0.0, start_error_fraction: float = 0.0,
+                 flap_period: float = 10.0, base_port: int = 0, seed: int = 1):
+        if mode not in ("ports", "virtual"):
+            raise ValueError(f"Unknown fleet mode: {mode}")
+        self.count = count
+        self.mode = mode
+        self.latency = LatencyDistribution(latency)
+        self.hang_fraction = hang_fraction
+        self.refuse_fraction = refuse_fraction
+        self.flap_fraction = flap_fraction
+        self.start_error_fraction = start_error_fraction
+        self.flap_period = flap_period
+        self.base_port = base_port
+        self.rng = random.Random(seed)
+
+        self.proxies: List[FakeProxy] = []
+        self._routes: Dict[Tuple[str, int], FakeProxy] = {}
+        self._servers: List[asyncio.base_events.Server] = []
+        self._closed_socket: Optional[socket.socket] = None
+        self._writers = set()
+        self.request_count = 0
+
+    def _assign_kinds(self) -> List[str]:
+        """依比例決定每台設備的行為（順序打散但可重現）"""
+        kinds = []
+        for kind, fraction in ((KIND_HANG, self.hang_fraction), (KIND_REFUSE, self.refuse_fraction),
+                               (KIND_FLAP, self.flap_fraction), (KIND_START_ERROR, self.start_error_fraction)):
+            kinds.extend([kind] * int(round(self.count * fraction)))
+        kinds = kinds[:self.count]
+        kinds.extend([KIND_OK] * (self.count - len(kinds)))
+        self.rng.shuffle(kinds)
+        return kinds
+
+    @staticmethod
+    def virtual_ip(index: int) -> str:
+        """virtual 模式下第 index 台設備的位址（127.1.0.1 起）"""
+        return f"127.{1 + index // 62500}.{(index // 250) % 250}.{index % 250 + 1}"
+
+    async def start(self):
+        """建立監聽並產生設備清單"""
+        _raise_open_file_limit(self.count + 1024)
+
+        # 綁定但不監聽的 socket：連到此連接埠必定被拒絕
+        self._closed_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._closed_socket.bind(("127.0.0.1", 0))
+        closed_port = self._closed_socket.getsockname()[1]
+
+        kinds = self._assign_kinds()
+        if self.mode == "virtual":
+            # 綁定 0.0.0.0 才能接受 127.0.0.0/8 內任一位址的連線
+            server = await asyncio.start_server(self._handle, "0.0.0.0", self.base_port, backlog=4096)
+            self._servers.append(server)
+            shared_port = server.sockets[0].getsockname()[1]
+
+        for index, kind in enumerate(kinds):
+            if self.mode == "virtual":
+                ip, port = self.virtual_ip(index), shared_port
+            elif kind == KIND_REFUSE:
+                ip, port = "127.0.0.1", closed_port
+            else:
+                ip = "127.0.0.1"
+                server = await asyncio.start_server(
+                    self._handle, ip, self.base_port + index if self.base_port else 0
+                )
+                self._servers.append(server)
+                port = server.sockets[0].getsockname()[1]
+            if kind == KIND_REFUSE:
+                port = closed_port
+
+            proxy = FakeProxy(index, ip, port, kind, self.flap_period, self.rng.uniform(0, 2 * self.flap_period))
+            self.proxies.append(proxy)
+            if kind != KIND_REFUSE:
+                self._routes[(ip, port)] = proxy
+
+    async def stop(self):
+        """關閉所有監聽"""
+        for server in self._servers:
+            server.close()
+        for writer in list(self._writers):
+            writer.close()
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers.clear()
+        if self._closed_socket is not None:
+            self._closed_socket.close()
+            self._closed_socket = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def kind_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for proxy in self.proxies:
+            counts[proxy.kind] = counts.get(proxy.kind, 0) + 1
+        return counts
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """處理單一連線（支援 keep-alive）"""
+        sockname = writer.get_extra_info("sockname")
+        proxy = self._routes.get((sockname[0], sockname[1]))
+        self._writers.add(writer)
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, body = request
+                self.request_count += 1
+                if proxy is None:
+                    await _write_response(writer, 404, {"message": "Unknown proxy"})
+                    continue
+                proxy.requests += 1
+                if not await self._respond(proxy, writer, method, path, body):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, proxy: FakeProxy, writer: asyncio.StreamWriter,
+                       method: str, path: str, body: bytes) -> bool:
+        """依設備行為回應；回傳 False 表示應關閉連線"""
+        route = path.split("?", 1)[0]
+        if proxy.kind == KIND_HANG and route == "/Health":
+            # 不回應，直到客戶端逾時斷線
+            await writer.wait_closed()
+            return False
+
+        delay = self.latency.sample(self.rng)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if route == "/Health" and method == "GET":
+            if proxy.is_up(time.monotonic()):
+                await _write_response(writer, 200, {"message": "OK", "index": proxy.index})
+            else:
+                await _write_response(writer, 503, {"message": "Service Unavailable"})
+        elif route == "/start" and method == "POST":
+            if proxy.kind == KIND_START_ERROR:
+                await _write_response(writer, 500, {"message": "Start failed"})
+            else:
+                try:
+                    start_data = json.loads(body or b"{}")
+                except ValueError:
+                    start_data = {}
+                await _write_response(writer, 200, {
+                    "message": "Proxy service started",
+                    "proxyid": start_data.get("proxyid")
+                })
+        elif route in ("/stop", "/pause", "/resume") and method == "POST":
+            await _write_response(writer, 200, {"message": f"Proxy service {route[1:]} accepted"})
+        else:
+            await _write_response(writer, 404, {"message": "Not Found"})
+        return True
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, bytes]]:
+    """讀取一個 HTTP/1.1 請求；連線結束時回傳 None"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    method, path, _ = lines[0].split(" ", 2)
+    content_length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            content_length = int(value.strip())
+    body = await reader.readexactly(content_length) if content_length else b""
+    return method, path, body
+
+
+async def _write_response(writer: asyncio.StreamWriter, status: int, payload: Dict):
+    body = json.dumps(payload).encode()
+    writer.write(
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+
+
+def _raise_open_file_limit(required: int):
+    """大量監聽時提高檔案描述元上限（至多到硬上限）"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = required if hard == resource.RLIM_INFINITY else min(required, hard)
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+
+def serve_in_process(options: Dict, connection):
+    """在子行程中執行叢集（multiprocessing 目標函數）
+
+    啟動後經由 connection 送回設備清單，收到任何訊息即關閉。
+    """
+    async def main():
+        fleet = FakeProxyFleet(**options)
+        async with fleet:
+            connection.send([proxy.as_dict() for proxy in fleet.proxies])
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, connection.recv)
+            connection.send({"requests": fleet.request_count})
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake proxy fleet until interrupted")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--mode", choices=["ports", "virtual"], default="ports")
+    parser.add_argument("--latency", default="fixed:0")
+    parser.add_argument("--hang-fraction", type=float, default=0.0)
+    parser.add_argument("--refuse-fraction", type=float, default=0.0)
+    parser.add_argument("--flap-fraction", type=float, default=0.0)
+    parser.add_argument("--start-error-fraction", type=float, default=0.0)
+    parser.add_argument("--flap-period", type=float, default=10.0)
+    parser.add_argument("--base-port", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    async def run_forever():
+        fleet = FakeProxyFleet(
+            args.count, args.mode, args.latency, args.hang_fraction, args.refuse_fraction,
+            args.flap_fraction, args.start_error_fraction, args.flap_period, args.base_port, args.seed
+        )
+        async with fleet:
+            for proxy in fleet.proxies[:10]:
+                print(proxy.as_dict())
+            print(f"Fleet ready: {len(fleet.proxies)} proxies, {fleet.kind_counts()}")
+            await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,280 @@
+"""
+行程內最小 MQTT 3.1.1 Broker
+
+用於離線測試與 MQTT 發佈效能量測，取代需要外部 Broker（127.0.0.1:2834）的情境。
+
+支援：
+- CONNECT / CONNACK
+- PUBLISH QoS 0/1/2（PUBACK、PUBREC/PUBREL/PUBCOMP）
+- SUBSCRIBE / UNSUBSCRIBE（含 + 與 # 萬用字元）
+- PINGREQ / PINGRESP、DISCONNECT
+
+不支援保留訊息、遺囑訊息、持久 session 與認證（帳號密碼會被接受但不檢查）。
+"""
+import asyncio
+import logging
+import struct
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """判斷主題是否符合訂閱過濾條件（MQTT 3.1.1 第 4.7 節）"""
+    if topic.startswith("$") and topic_filter[:1] in ("+", "#"):
+        return False
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for index, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[index]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def _encode_remaining_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        encoded.append(byte)
+        if not length:
+            return bytes(encoded)
+
+
+def _packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    return bytes([(packet_type << 4) | flags]) + _encode_remaining_length(len(body)) + body
+
+
+def _read_string(data: bytes, offset: int) -> Tuple[str, int]:
+    length = struct.unpack_from("!H", data, offset)[0]
+    start = offset + 2
+    return data[start:start + length].decode("utf-8"), start + length
+
+
+class _Session:
+    """單一客戶端連線"""
+
+    __slots__ = ("writer", "client_id", "subscriptions", "_next_packet_id")
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.client_id = ""
+        self.subscriptions: Dict[str, int] = {}
+        self._next_packet_id = 0
+
+    def next_packet_id(self) -> int:
+        self._next_packet_id = self._next_packet_id % 65535 + 1
+        return self._next_packet_id
+
+
+class MiniMQTTBroker:
+    """最小 MQTT Broker
+
+    可直接在目前事件迴圈中 `async with MiniMQTTBroker() as broker`，
+    或以 `start_in_thread()` 在獨立執行緒中執行（paho 客戶端以同步方式發佈時使用）。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.sessions: List[_Session] = []
+        self.received = 0      # 收到的 PUBLISH 數
+        self.delivered = 0     # 轉送給訂閱者的 PUBLISH 數
+        self.connections = 0   # 累計 CONNECT 數
+        self._publish_listeners: List[Callable[[str, bytes], None]] = []
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def add_publish_listener(self, listener: Callable[[str, bytes], None]):
+        """註冊收到 PUBLISH 時的回呼（在 Broker 的事件迴圈中呼叫）"""
+        self._publish_listeners.append(listener)
+
+    async def start(self):
+        """開始監聽（停止後再次呼叫會使用相同連接埠，可模擬 Broker 重啟）"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"[MQTT_BROKER] Listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        """關閉監聽並中斷所有客戶端"""
+        if self._server is not None:
+            self._server.close()
+        for session in list(self.sessions):
+            session.writer.close()
+        self.sessions.clear()
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+        logger.info("[MQTT_BROKER] Stopped")
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def start_in_thread(self) -> "MiniMQTTBroker":
+        """在獨立執行緒的事件迴圈中啟動"""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="mini-mqtt-broker", daemon=True)
+        self._thread.start()
+        ready.wait(timeout=10)
+        return self
+
+    def call(self, coroutine_function: Callable, *args, timeout: float = 10.0):
+        """在 Broker 執行緒中執行協程並等待結果（例如 broker.call(broker.stop)）"""
+        return asyncio.run_coroutine_threadsafe(coroutine_function(*args), self._loop).result(timeout)
+
+    def stop_in_thread(self):
+        """停止 Broker 並結束執行緒"""
+        if self._loop is None:
+            return
+        self.call(self.stop)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._loop = None
+        self._thread = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = _Session(writer)
+        self.sessions.append(session)
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                remaining, multiplier = 0, 1
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    remaining += (byte & 0x7F) * multiplier
+                    multiplier *= 128
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(remaining) if remaining else b""
+                if not self._dispatch(session, header[0] >> 4, header[0] & 0x0F, body):
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"[MQTT_BROKER] Protocol error from client {session.client_id}: {e}")
+        finally:
+            if session in self.sessions:
+                self.sessions.remove(session)
+            writer.close()
+
+    def _dispatch(self, session: _Session, packet_type: int, flags: int, body: bytes) -> bool:
+        """處理單一封包；回傳 False 表示結束連線"""
+        writer = session.writer
+        if packet_type == CONNECT:
+            _, offset = _read_string(body, 0)               # 協定名稱 "MQTT"
+            offset += 4                                     # 協定等級、連線旗標、keepalive
+            session.client_id, _ = _read_string(body, offset)
+            self.connections += 1
+            writer.write(_packet(CONNACK, 0, b"\x00\x00"))
+        elif packet_type == PUBLISH:
+            qos = (flags >> 1) & 0x03
+            topic, offset = _read_string(body, 0)
+            if qos:
+                packet_id = struct.unpack_from("!H", body, offset)[0]
+                offset += 2
+                ack_type = PUBACK if qos == 1 else PUBREC
+                writer.write(_packet(ack_type, 0, struct.pack("!H", packet_id)))
+            self._route(topic, body[offset:], qos)
+        elif packet_type == PUBREL:
+            writer.write(_packet(PUBCOMP, 0, body[:2]))
+        elif packet_type == PUBREC:
+            writer.write(_packet(PUBREL, 0x02, body[:2]))
+        elif packet_type == SUBSCRIBE:
+            packet_id = body[:2]
+            offset, granted = 2, bytearray()
+            while offset < len(body):
+                topic_filter, offset = _read_string(body, offset)
+                requested_qos = body[offset] & 0x03
+                offset += 1
+                session.subscriptions[topic_filter] = min(requested_qos, 1)
+                granted.append(min(requested_qos, 1))
+            writer.write(_packet(SUBACK, 0, packet_id + bytes(granted)))
+        elif packet_type == UNSUBSCRIBE:
+            offset = 2
+            while offset < len(body):
+                topic_filter, offset = _read_string(body, offset)
+                session.subscriptions.pop(topic_filter, None)
+            writer.write(_packet(UNSUBACK, 0, body[:2]))
+        elif packet_type == PINGREQ:
+            writer.write(_packet(PINGRESP, 0, b""))
+        elif packet_type == DISCONNECT:
+            return False
+        # PUBACK / PUBCOMP 來自訂閱者，不需處理
+        return True
+
+    def _route(self, topic: str, payload: bytes, qos: int):
+        """轉送給符合的訂閱者（每個連線最多一份，QoS 取發佈與訂閱的較小值）"""
+        self.received += 1
+        for listener in self._publish_listeners:
+            listener(topic, payload)
+
+        encoded_topic = topic.encode("utf-8")
+        topic_header = struct.pack("!H", len(encoded_topic)) + encoded_topic
+        for session in self.sessions:
+            granted = [sub_qos for topic_filter, sub_qos in session.subscriptions.items()
+                       if topic_matches(topic_filter, topic)]
+            if not granted:
+                continue
+            delivery_qos = min(qos, max(granted))
+            if delivery_qos:
+                body = topic_header + struct.pack("!H", session.next_packet_id()) + payload
+            else:
+                body = topic_header + payload
+            session.writer.write(_packet(PUBLISH, delivery_qos << 1, body))
+            self.delivered += 1
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the minimal MQTT broker until interrupted")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2834)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def run_forever():
+        async with MiniMQTTBroker(args.host, args.port):
+            await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run_forever())
+    except KeyboardInterrupt:
+        pass
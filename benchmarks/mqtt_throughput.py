@@ -0,0 +1,263 @@
+"""
+MQTT 發佈效能基準測試
+
+以行程內 MiniMQTTBroker 取代外部 Broker，量測：
+- MQTTClient.publish 與 MQTTEventPublisher.publish_proxy_status_update 在不同目標速率下的
+  實際吞吐量、單次呼叫耗時與端到端延遲（發佈呼叫 → 訂閱者收到）
+- Broker 中斷再恢復期間的發佈行為：失敗次數、遺失訊息數與重連所需時間
+
+用法：
+    python -m benchmarks.mqtt_throughput --rates 100,1000,5000,0 --count 5000 --qos 0
+    python -m benchmarks.mqtt_throughput --reconnect-only --outage 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, List
+
+import paho.mqtt.client as mqtt
+
+from app.config_mqtt import settings
+from app.mqtt.client import mqtt_client
+from app.mqtt.publisher import mqtt_publisher
+from benchmarks.mqtt_broker import MiniMQTTBroker
+from benchmarks.stats import summarize_ms
+
+_TOPIC_FILTER = "mcs/events/#"
+
+
+class _LatencySubscriber:
+    """訂閱所有事件並依 bench_seq 記錄收到時間"""
+
+    def __init__(self, host: str, port: int, qos: int):
+        self.received: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._subscribed = threading.Event()
+        self.client = mqtt.Client(client_id=f"bench_subscriber_{os.getpid()}")
+        self.client.on_connect = lambda client, userdata, flags, rc: client.subscribe(_TOPIC_FILTER, qos)
+        self.client.on_subscribe = lambda client, userdata, mid, granted_qos: self._subscribed.set()
+        self.client.on_message = self._on_message
+        self.client.connect(host, port)
+        self.client.loop_start()
+        if not self._subscribed.wait(timeout=10):
+            raise RuntimeError("Benchmark subscriber could not subscribe")
+
+    def _on_message(self, client, userdata, message):
+        received_at = time.perf_counter()
+        try:
+            seq = json.loads(message.payload)["bench_seq"]
+        except (ValueError, KeyError, TypeError):
+            return
+        with self._lock:
+            self.received.setdefault(seq, received_at)
+
+    def reset(self):
+        with self._lock:
+            self.received.clear()
+
+    def wait_for(self, expected: int, timeout: float) -> int:
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            with self._lock:
+                if len(self.received) >= expected:
+                    break
+            time.sleep(0.01)
+        with self._lock:
+            return len(self.received)
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+def _publish_one(api: str, seq: int, qos: int) -> bool:
+    if api == "client":
+        return mqtt_client.publish(
+            f"mcs/events/ProxyService/status/{seq % 1000}",
+            {"message": "OK", "proxyid": seq % 1000, "status": "running", "bench_seq": seq},
+            qos=qos
+        )
+    # MQTTEventPublisher 固定使用 QoS 0
+    return mqtt_publisher.publish_proxy_status_update(
+        proxyid=seq % 1000,
+        status="running",
+        message="OK",
+        controller_type="E82",
+        proxy_ip="127.0.0.1",
+        proxy_port="8080",
+        remark="benchmark",
+        bench_seq=seq
+    )
+
+
+async def _paced_publish(api: str, rate: float, count: int, qos: int, first_seq: int = 0,
+                         on_tick=None) -> Dict:
+    """以目標速率（0 表示不限速）發佈 count 則訊息，回傳送出時間與每次呼叫耗時"""
+    sent_at: Dict[int, float] = {}
+    call_durations: List[float] = []
+    failures = 0
+    started = time.perf_counter()
+    for index in range(count):
+        seq = first_seq + index
+        if rate:
+            delay = started + index / rate - time.perf_counter()
+            if delay > 0.001:
+                await asyncio.sleep(delay)
+        elif index % 200 == 0:
+            await asyncio.sleep(0)
+        if on_tick is not None:
+            await on_tick(time.perf_counter() - started)
+        before = time.perf_counter()
+        ok = _publish_one(api, seq, qos)
+        after = time.perf_counter()
+        call_durations.append(after - before)
+        if ok:
+            sent_at[seq] = before
+        else:
+            failures += 1
+    return {"sent_at": sent_at, "call_durations": call_durations,
+            "failures": failures, "elapsed": time.perf_counter() - started}
+
+
+async def run_rate(api: str, rate: float, count: int, qos: int, subscriber: _LatencySubscriber,
+                   drain_timeout: float) -> Dict:
+    subscriber.reset()
+    result = await _paced_publish(api, rate, count, qos)
+    delivered = subscriber.wait_for(len(result["sent_at"]), drain_timeout)
+    latencies = [subscriber.received[seq] - sent for seq, sent in result["sent_at"].items()
+                 if seq in subscriber.received]
+    return {
+        "api": api,
+        "qos": qos if api == "client" else 0,
+        "target_rate": rate or "unthrottled",
+        "messages": count,
+        "achieved_rate": round(count / result["elapsed"], 1) if result["elapsed"] else 0.0,
+        "publish_failures": result["failures"],
+        "delivered": delivered,
+        "lost": len(result["sent_at"]) - delivered,
+        "publish_call": summarize_ms(result["call_durations"]),
+        "end_to_end": summarize_ms(latencies),
+    }
+
+
+async def run_reconnect(broker: MiniMQTTBroker, subscriber: _LatencySubscriber, rate: float,
+                        duration: float, outage: float, qos: int) -> Dict:
+    """發佈期間中斷 Broker，量測中斷期間的失敗與遺失以及重連時間"""
+    subscriber.reset()
+    state = {"stopped_at": None, "restarted_at": None, "reconnected_at": None}
+    outage_start = duration / 3
+
+    async def on_tick(elapsed: float):
+        if state["stopped_at"] is None and elapsed >= outage_start:
+            broker.call(broker.stop)
+            state["stopped_at"] = time.perf_counter()
+        elif state["stopped_at"] is not None and state["restarted_at"] is None \
+                and elapsed >= outage_start + outage:
+            broker.call(broker.start)
+            state["restarted_at"] = time.perf_counter()
+        elif state["restarted_at"] is not None and state["reconnected_at"] is None and mqtt_client.is_connected:
+            state["reconnected_at"] = time.perf_counter()
+
+    count = int(rate * duration)
+    result = await _paced_publish("client", rate, count, qos, on_tick=on_tick)
+
+    # 訂閱者也會斷線，需等它重新訂閱後才能判斷遺失
+    delivered = subscriber.wait_for(len(result["sent_at"]), 5.0)
+    attempted_during_outage = sum(
+        1 for sent in result["sent_at"].values()
+        if state["stopped_at"] and state["stopped_at"] <= sent <= (state["reconnected_at"] or sent)
+    )
+    return {
+        "scenario": "broker_restart",
+        "qos": qos,
+        "rate": rate,
+        "messages": count,
+        "outage_s": outage,
+        "publish_failures": result["failures"],
+        "accepted_during_outage": attempted_during_outage,
+        "delivered": delivered,
+        "lost": count - delivered,
+        "reconnect_after_restart_s": round(state["reconnected_at"] - state["restarted_at"], 3)
+        if state["reconnected_at"] and state["restarted_at"] else None,
+    }
+
+
+async def main(args) -> Dict:
+    broker = MiniMQTTBroker().start_in_thread()
+    settings.MQTT_BROKER_HOST = broker.host
+    settings.MQTT_BROKER_PORT = broker.port
+    subscriber = _LatencySubscriber(broker.host, broker.port, qos=1)
+    if not await mqtt_client.connect():
+        raise RuntimeError("MQTTClient could not connect to the in-process broker")
+
+    results = {"throughput": [], "reconnect": None}
+    try:
+        if not args.reconnect_only:
+            for api in args.apis:
+                for rate in args.rates:
+                    result = await run_rate(api, rate, args.count, args.qos, subscriber, args.drain_timeout)
+                    results["throughput"].append(result)
+                    print(f"{api} rate={result['target_rate']}: {result['achieved_rate']} msg/s, "
+                          f"e2e p99={result['end_to_end']['p99_ms']} ms, lost={result['lost']}", file=sys.stderr)
+        if args.outage > 0:
+            results["reconnect"] = await run_reconnect(
+                broker, subscriber, args.reconnect_rate, args.reconnect_duration, args.outage, args.qos
+            )
+            print(f"reconnect: {results['reconnect']}", file=sys.stderr)
+    finally:
+        await mqtt_client.disconnect()
+        subscriber.close()
+        broker.stop_in_thread()
+    return results
+
+
+def _print_table(results: Dict):
+    columns = ["api", "qos", "target_rate", "achieved_rate", "publish_failures", "delivered", "lost"]
+    print(" ".join(f"{column:>16}" for column in columns + ["call_p99_ms", "e2e_p50_ms", "e2e_p99_ms"]))
+    for result in results["throughput"]:
+        row = [str(result[column]) for column in columns] + [
+            str(result["publish_call"]["p99_ms"]), str(result["end_to_end"]["p50_ms"]),
+            str(result["end_to_end"]["p99_ms"])
+        ]
+        print(" ".join(f"{value:>16}" for value in row))
+    if results["reconnect"]:
+        print(json.dumps(results["reconnect"], indent=2))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure MQTT publish throughput and latency against an in-process broker")
+    parser.add_argument("--rates", default="100,1000,5000,0",
+                        type=lambda value: [float(rate) for rate in value.split(",") if rate],
+                        help="Target messages per second; 0 means unthrottled")
+    parser.add_argument("--count", type=int, default=2000, help="Messages per rate")
+    parser.add_argument("--apis", default="client,publisher",
+                        type=lambda value: [api for api in value.split(",") if api in ("client", "publisher")])
+    parser.add_argument("--qos", type=int, choices=[0, 1], default=0, help="QoS for MQTTClient.publish")
+    parser.add_argument("--drain-timeout", type=float, default=5.0)
+    parser.add_argument("--outage", type=float, default=2.0, help="Broker outage in seconds; 0 skips the reconnect scenario")
+    parser.add_argument("--reconnect-rate", type=float, default=200.0)
+    parser.add_argument("--reconnect-duration", type=float, default=8.0)
+    parser.add_argument("--reconnect-only", action="store_true")
+    parser.add_argument("--log-level", default="INFO",
+                        help="Application log level; records are formatted and discarded")
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+
+    handler = logging.FileHandler(os.devnull)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logging.basicConfig(level=getattr(logging, arguments.log_level.upper(), logging.INFO), handlers=[handler], force=True)
+
+    benchmark_results = asyncio.run(main(arguments))
+    _print_table(benchmark_results)
+    if arguments.json_path:
+        with open(arguments.json_path, "w", encoding="utf-8") as output:
+            json.dump({"options": vars(arguments), "results": benchmark_results}, output, indent=2)
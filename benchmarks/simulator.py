@@ -0,0 +1,389 @@
+"""
+監控端離散事件模擬器
+
+在虛擬時鐘事件迴圈（benchmarks.virtual_clock）中執行真實的 BackgroundWorker 排程與
+DeviceServiceProcessor 狀態邏輯。網路部分改用代理服務模型：
+- 連接埠檢查：取代 processor.port_probe，以虛擬時鐘的 sleep 模擬連線耗時
+- HTTP：以 httpx transport 取代 processor.http_transport
+
+代理服務模型：
+- 固定比例的設備長期處於拒絕連線、封包丟棄（連線逾時）、HTTP 逾時或 HTTP 錯誤
+- 其餘設備依 MTBF/MTTR（指數分佈）交替正常與故障，故障時的行為由 failure_mode 決定
+
+抽樣：模擬 sample 台設備，每台代表 weight = devices / sample 台。巡檢為逐台依序執行，
+因此每台模擬設備的網路耗時與 CPU 耗時都乘上 weight，流量與故障數亦同；延遲分佈則直接取自樣本。
+
+量測：
+- 每輪巡檢耗時與週期
+- 故障偵測延遲與恢復偵測延遲（狀態快取由正常變為異常的時間減去模型中故障發生的時間）
+- 未偵測到的短暫故障數
+- 探測流量：TCP 連線、HTTP 請求與 MQTT 訊息
+"""
+import asyncio
+import math
+import random
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.models.device import Device
+from app.mqtt.client import MQTT_PUBLISH_TOTAL
+from app.services.adaptive_timeouts import AdaptiveTimeouts
+from app.services.availability import AvailabilityTracker
+from app.services.background_worker import BackgroundWorker
+from app.services.command_queue import command_queue
+from app.services.device_processor import device_processor
+from app.services.flap_damping import FlapDamper
+from app.services.start_limiter import StartRateLimiter
+from app.utils.http_pool import http_client_pool
+from benchmarks.fake_proxy_fleet import LatencyDistribution
+from benchmarks.stats import percentile
+
+STATE_OK = "ok"
+STATE_REFUSED = "refused"        # 連接埠立即拒絕
+STATE_BLACKHOLE = "blackhole"    # 封包丟棄，連線逾時
+STATE_HANG = "hang"              # 可連線但 HTTP 不回應
+STATE_HTTP_ERROR = "http_error"  # /Health 回 500
+
+_FAILURE_STATES = (STATE_REFUSED, STATE_BLACKHOLE, STATE_HANG, STATE_HTTP_ERROR)
+_PUBLISH_RESULTS = ("success", "failed", "not_connected", "error")
+_SIMULATED_PORT = 8000
+
+
+class _Outage:
+    __slots__ = ("start", "end", "detected_at")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.end: Optional[float] = None
+        self.detected_at: Optional[float] = None
+
+
+class _ProxyModel:
+    """單一設備的行為模型（故障時間軸於查詢時才產生）"""
+
+    __slots__ = ("static_state", "down", "next_change", "outages")
+
+    def __init__(self, static_state: str, first_failure: float):
+        self.static_state = static_state
+        self.down = False
+        self.next_change = first_failure
+        self.outages: List[_Outage] = []
+
+
+class FleetModel:
+    """模擬叢集：設備位址對應與各時間點的行為"""
+
+    def __init__(self, count: int, latency: str = "lognormal:2:0.5", connect_ms: float = 0.3,
+                 refused_fraction: float = 0.0, blackhole_fraction: float = 0.0,
+                 hang_fraction: float = 0.0, http_error_fraction: float = 0.0,
+                 mtbf: float = 0.0, mttr: float = 300.0, failure_mode: str = STATE_REFUSED, seed: int = 1):
+        if failure_mode not in _FAILURE_STATES:
+            raise ValueError(f"Unknown failure mode: {failure_mode}")
+        self.count = count
+        self.latency = LatencyDistribution(latency)
+        self.connect_time = connect_ms / 1000.0
+        self.mtbf = mtbf
+        self.mttr = mttr
+        self.failure_mode = failure_mode
+        self.rng = random.Random(seed)
+
+        states = []
+        for state, fraction in ((STATE_REFUSED, refused_fraction), (STATE_BLACKHOLE, blackhole_fraction),
+                                (STATE_HANG, hang_fraction), (STATE_HTTP_ERROR, http_error_fraction)):
+            states.extend([state] * int(round(count * fraction)))
+        states = states[:count]
+        states.extend([STATE_OK] * (count - len(states)))
+        self.rng.shuffle(states)
+
+        self.proxies = [
+            _ProxyModel(state, self.rng.expovariate(1.0 / mtbf) if mtbf > 0 and state == STATE_OK else math.inf)
+            for state in states
+        ]
+
+    @staticmethod
+    def address(index: int) -> str:
+        return f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+
+    @staticmethod
+    def index_of(ip: str) -> int:
+        _, a, b, c = (int(part) for part in ip.split("."))
+        return a * 65536 + b * 256 + c
+
+    def state(self, index: int, now: float) -> str:
+        """設備在 now 時的行為，並推進故障時間軸"""
+        proxy = self.proxies[index]
+        while proxy.next_change <= now:
+            changed_at = proxy.next_change
+            if proxy.down:
+                proxy.down = False
+                proxy.outages[-1].end = changed_at
+                proxy.next_change = changed_at + self.rng.expovariate(1.0 / self.mtbf)
+            else:
+                proxy.down = True
+                proxy.outages.append(_Outage(changed_at))
+                proxy.next_change = changed_at + self.rng.expovariate(1.0 / self.mttr)
+        return self.failure_mode if proxy.down else proxy.static_state
+
+    def current_outage(self, index: int) -> Optional[_Outage]:
+        proxy = self.proxies[index]
+        return proxy.outages[-1] if proxy.down and proxy.outages else None
+
+    def last_outage(self, index: int) -> Optional[_Outage]:
+        proxy = self.proxies[index]
+        return proxy.outages[-1] if proxy.outages else None
+
+    def sample_latency(self) -> float:
+        return self.latency.sample(self.rng)
+
+
+def measure_client_setup() -> float:
+    """量測本機建立預設 httpx.AsyncClient（含 TLS context）的耗時（秒）"""
+    import time
+
+    started = time.perf_counter()
+    for _ in range(5):
+        httpx.AsyncClient()
+    return (time.perf_counter() - started) / 5
+
+
+class SimulatedNetwork(httpx.AsyncBaseTransport):
+    """以叢集模型回應 HTTP 請求並模擬連接埠檢查，同時統計探測流量
+
+    Args:
+        fleet: 叢集模型
+        weight: 每台模擬設備代表的設備數，所有網路耗時乘上此倍數
+        client_setup: 每次 `async with httpx.AsyncClient(...)` 的建立成本（秒）；
+            processor 每次呼叫都建立新的 client，此成本在正式環境中來自 TLS context 初始化
+    """
+
+    def __init__(self, fleet: FleetModel, weight: float = 1.0, client_setup: float = 0.0):
+        self.fleet = fleet
+        self.weight = weight
+        self.client_setup = client_setup
+        self.tcp_connects = 0
+        self.http_clients = 0
+        self.http_requests: Dict[str, int] = {}
+
+    async def _wait(self, seconds: float):
+        await asyncio.sleep(seconds * self.weight)
+
+    async def __aenter__(self):
+        self.http_clients += 1
+        if self.client_setup:
+            asyncio.get_running_loop().advance(self.client_setup * self.weight)
+        return self
+
+    async def __aexit__(self, exc_type=None, exc_value=None, traceback=None):
+        pass
+
+    async def port_probe(self, ip: str, port: int, timeout: float = 0.5) -> bool:
+        """取代 is_port_open_async：連線耗時以虛擬時鐘的 sleep 表示"""
+        loop = asyncio.get_running_loop()
+        self.tcp_connects += 1
+        state = self.fleet.state(self.fleet.index_of(ip), loop.time())
+        if state == STATE_BLACKHOLE:
+            await asyncio.sleep(timeout * self.weight)
+            return False
+        await asyncio.sleep(min(self.fleet.connect_time, timeout) * self.weight)
+        return state != STATE_REFUSED
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        loop = asyncio.get_running_loop()
+        path = request.url.path
+        self.http_requests[path] = self.http_requests.get(path, 0) + 1
+        self.tcp_connects += 1
+        timeouts = request.extensions.get("timeout", {})
+        connect_timeout = timeouts.get("connect") or 5.0
+        read_timeout = timeouts.get("read") or 5.0
+
+        state = self.fleet.state(self.fleet.index_of(request.url.host), loop.time())
+        if state == STATE_BLACKHOLE:
+            await self._wait(connect_timeout)
+            raise httpx.ConnectTimeout("Simulated connect timeout", request=request)
+        await self._wait(self.fleet.connect_time)
+        if state == STATE_REFUSED:
+            raise httpx.ConnectError("Simulated connection refused", request=request)
+        if state == STATE_HANG:
+            await self._wait(read_timeout)
+            raise httpx.ReadTimeout("Simulated read timeout", request=request)
+
+        latency = self.fleet.sample_latency()
+        if latency >= read_timeout:
+            await self._wait(read_timeout)
+            raise httpx.ReadTimeout("Simulated read timeout", request=request)
+        await self._wait(latency)
+        if state == STATE_HTTP_ERROR:
+            return httpx.Response(500, json={"message": "Internal Server Error"}, request=request)
+        if path == "/start":
+            return httpx.Response(200, json={"message": "Proxy service started"}, request=request)
+        return httpx.Response(200, json={"message": "OK"}, request=request)
+
+
+def _seconds_summary(values: List[float]) -> Dict:
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50_s": round(percentile(values, 0.50), 3),
+        "p95_s": round(percentile(values, 0.95), 3),
+        "p99_s": round(percentile(values, 0.99), 3),
+        "max_s": round(values[-1], 3),
+        "mean_s": round(sum(values) / len(values), 3),
+    }
+
+
+class MonitorSimulation:
+    """在虛擬時間中執行真實的背景巡檢，需在 VirtualClockEventLoop（cpu_scale=weight）中 await run()
+
+    Args:
+        fleet: 叢集模型（樣本）
+        duration: 最長模擬秒數
+        weight: 每台模擬設備代表的設備數
+        max_sweeps: 完成此輪數後提前結束（None 表示跑滿 duration）
+        client_setup: 見 SimulatedNetwork
+    """
+
+    def __init__(self, fleet: FleetModel, duration: float, weight: float = 1.0,
+                 max_sweeps: Optional[int] = None, client_setup: float = 0.0):
+        self.fleet = fleet
+        self.duration = duration
+        self.weight = weight
+        self.max_sweeps = max_sweeps
+        self.network = SimulatedNetwork(fleet, weight, client_setup)
+        self.elapsed = 0.0
+        self.sweeps: List[List[float]] = []
+        self.detection_latencies: List[float] = []
+        self.recovery_latencies: List[float] = []
+        self._last_alive: Dict[int, bool] = {}
+
+    def _build_devices(self) -> List[Device]:
+        controller_types = ("E82", "E84", "E87", "E88")
+        return [
+            Device(
+                proxyid=index + 1,
+                proxy_ip=self.fleet.address(index),
+                proxy_port=_SIMULATED_PORT,
+                Controller_type=controller_types[index % len(controller_types)],
+                Controller_ip=self.fleet.address(index),
+                Controller_port=_SIMULATED_PORT + 1,
+                remark="simulated",
+                enable=1,
+                createUser="simulator"
+            )
+            for index in range(self.fleet.count)
+        ]
+
+    def _on_status_change(self, proxyid, entry, version, removed):
+        """狀態快取變更時計算偵測延遲"""
+        if removed or entry is None:
+            return
+        alive = entry.get("proxyServiceAlive") == "1"
+        previous = self._last_alive.get(proxyid)
+        self._last_alive[proxyid] = alive
+        if previous is None or previous == alive:
+            return
+        now = asyncio.get_running_loop().time()
+        index = proxyid - 1
+        if not alive:
+            outage = self.fleet.current_outage(index)
+            if outage is not None and outage.detected_at is None:
+                outage.detected_at = now
+                self.detection_latencies.append(now - outage.start)
+        else:
+            outage = self.fleet.last_outage(index)
+            if outage is not None and outage.end is not None and outage.end <= now:
+                self.recovery_latencies.append(now - outage.end)
+
+    async def run(self) -> Dict:
+        loop = asyncio.get_running_loop()
+        processor = device_processor
+        saved = (processor.http_transport, processor.port_probe, processor.availability_tracker,
+                 processor.timeouts, processor.flap_damper, command_queue.start_limiter)
+        processor.http_transport = self.network
+        processor.port_probe = self.network.port_probe
+        processor.availability_tracker = AvailabilityTracker(clock=loop.time)
+        processor.flap_damper = FlapDamper(clock=loop.time)
+        # RTT 以實際時間量測，在虛擬時鐘下沒有意義：固定使用設定的逾時；/start 限流改用虛擬時鐘
+        processor.timeouts = AdaptiveTimeouts(enabled=False)
+        command_queue.start_limiter = StartRateLimiter(clock=loop.time)
+        processor.device_status_cache.add_listener(self._on_status_change)
+        messages_before = sum(MQTT_PUBLISH_TOTAL.labels(result).value for result in _PUBLISH_RESULTS)
+
+        worker = BackgroundWorker(None)
+        execute_tasks = worker._execute_tasks
+        enough_sweeps = asyncio.Event()
+
+        async def timed_execute_tasks():
+            started = loop.time()
+            await execute_tasks()
+            self.sweeps.append([started, loop.time()])
+            if self.max_sweeps and len(self.sweeps) >= self.max_sweeps:
+                enough_sweeps.set()
+
+        try:
+            processor.load_devices_to_cache(self._build_devices())
+            worker.devices_loaded = True
+            worker._execute_tasks = timed_execute_tasks
+            started = loop.time()
+            worker.start()
+            try:
+                await asyncio.wait_for(enough_sweeps.wait(), self.duration)
+            except asyncio.TimeoutError:
+                pass
+            self.elapsed = loop.time() - started
+            worker.stop()
+            try:
+                await worker.task
+            except asyncio.CancelledError:
+                pass
+            availability = processor.availability_tracker.summary()
+        finally:
+            processor.device_status_cache.remove_listener(self._on_status_change)
+            processor.load_devices_to_cache([])
+            await command_queue.stop()
+            (processor.http_transport, processor.port_probe, processor.availability_tracker,
+             processor.timeouts, processor.flap_damper, command_queue.start_limiter) = saved
+            await http_client_pool.aclose()
+
+        messages = sum(MQTT_PUBLISH_TOTAL.labels(result).value for result in _PUBLISH_RESULTS) - messages_before
+        return self._report(messages, availability)
+
+    def _report(self, mqtt_messages: float, availability: Dict) -> Dict:
+        completed = [end - start for start, end in self.sweeps]
+        starts = [start for start, _ in self.sweeps]
+        periods = [later - earlier for earlier, later in zip(starts, starts[1:])]
+
+        outages = [outage for proxy in self.fleet.proxies for outage in proxy.outages
+                   if outage.end is not None and outage.end <= self.elapsed]
+        missed = sum(1 for outage in outages if outage.detected_at is None)
+        devices = int(round(self.fleet.count * self.weight))
+        elapsed = self.elapsed or 1.0
+
+        def rate(count: float) -> float:
+            return round(count * self.weight / elapsed, 2)
+
+        return {
+            "devices": devices,
+            "simulated_devices": self.fleet.count,
+            "simulated_seconds": round(self.elapsed, 1),
+            "sweeps": {
+                "completed": len(completed),
+                "duration": _seconds_summary(completed),
+                "cycle_period": _seconds_summary(periods),
+                "per_device_ms": round(sum(completed) / len(completed) / devices * 1000, 3)
+                if completed and devices else None,
+            },
+            "detection_latency": _seconds_summary(self.detection_latencies),
+            "recovery_latency": _seconds_summary(self.recovery_latencies),
+            "outages": {"finished": int(len(outages) * self.weight), "undetected": int(missed * self.weight)},
+            "probe_traffic": {
+                "tcp_connects_per_s": rate(self.network.tcp_connects),
+                "http_clients_per_s": rate(self.network.http_clients),
+                "http_requests_per_s": rate(sum(self.network.http_requests.values())),
+                "http_requests_per_s_by_path": {path: rate(count) for path, count in self.network.http_requests.items()},
+                "mqtt_messages_per_s": rate(mqtt_messages),
+            },
+            "availability": availability,
+        }
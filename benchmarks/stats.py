@@ -0,0 +1,26 @@
+"""基準測試共用的統計函數"""
+import math
+from typing import Dict, Iterable, List
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """最近秩百分位數（sorted_values 需已排序）"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize_ms(seconds: Iterable[float]) -> Dict[str, float]:
+    """將以秒為單位的延遲整理為毫秒的 p50/p95/p99/max/mean"""
+    values = sorted(seconds)
+    if not values:
+        return {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0, "mean_ms": 0.0}
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3),
+    }
@@ -0,0 +1,225 @@
+"""
+背景巡檢擴展性基準測試
+
+以模擬代理服務叢集（在子行程中執行，不影響量測）驅動真實的 BackgroundWorker，
+量測設備數 N 增加時每輪巡檢的：
+- 牆鐘時間
+- CPU 時間（僅監控行程）
+- 記憶體（RSS 與峰值 RSS）
+- MQTT 發佈次數（未連線時記為 not_connected，仍代表監控端產生的訊息量）
+
+用法：
+    python -m benchmarks.sweep_scaling --sizes 10,100,1000,10000 --latency lognormal:2:0.5
+    python -m benchmarks.sweep_scaling --mode virtual --refuse-fraction 0.05 --json result.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models.device import Device
+from app.mqtt.client import MQTT_PUBLISH_TOTAL, mqtt_client
+from app.services.background_worker import BackgroundWorker
+from app.services.device_processor import device_processor
+from benchmarks.fake_proxy_fleet import serve_in_process
+
+_PUBLISH_RESULTS = ("success", "failed", "not_connected", "error")
+
+
+def _mqtt_message_count() -> float:
+    return sum(MQTT_PUBLISH_TOTAL.labels(result).value for result in _PUBLISH_RESULTS)
+
+
+def _rss_mb() -> Optional[float]:
+    """目前 RSS（MB），僅支援 Linux"""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _create_session(proxies: List[Dict]):
+    """建立記憶體資料庫並寫入與叢集對應的設備資料"""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add_all([
+        Device(
+            proxyid=proxy["index"] + 1,
+            proxy_ip=proxy["ip"],
+            proxy_port=proxy["port"],
+            Controller_type=f"E8{proxy['index'] % 4}",
+            Controller_ip=proxy["ip"],
+            Controller_port=proxy["port"],
+            remark=proxy["kind"],
+            enable=1,
+            createUser="benchmark"
+        )
+        for proxy in proxies
+    ])
+    session.commit()
+    return engine, session
+
+
+class _FleetProcess:
+    """在子行程中啟動模擬叢集"""
+
+    def __init__(self, options: Dict):
+        self.options = options
+        self.connection = None
+        self.process = None
+
+    def __enter__(self) -> List[Dict]:
+        context = multiprocessing.get_context("spawn")
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=serve_in_process, args=(self.options, child_connection), daemon=True)
+        self.process.start()
+        return self.connection.recv()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.connection.send("stop")
+            self.fleet_stats = self.connection.recv()
+        except (EOFError, OSError):
+            self.fleet_stats = {}
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+async def run_size(count: int, fleet_options: Dict, sweeps: int) -> Dict:
+    """對 N 台設備執行數輪巡檢並回傳量測結果（摘要欄位取最後一輪）"""
+    fleet = _FleetProcess(dict(fleet_options, count=count))
+    with fleet as proxies:
+        engine, session = _create_session(proxies)
+        try:
+            worker = BackgroundWorker(session)
+            rounds = []
+            for _ in range(sweeps):
+                messages_before = _mqtt_message_count()
+                cpu_before = time.process_time()
+                wall_before = time.perf_counter()
+                await worker._execute_tasks()
+                wall = time.perf_counter() - wall_before
+                cpu = time.process_time() - cpu_before
+                rounds.append({
+                    "wall_s": round(wall, 4),
+                    "cpu_s": round(cpu, 4),
+                    "mqtt_messages": int(_mqtt_message_count() - messages_before),
+                })
+        finally:
+            session.close()
+            engine.dispose()
+
+    statuses = device_processor.get_all_device_status_from_cache()
+    alive = sum(1 for status in statuses.values() if status.get("proxyServiceAlive") == "1")
+    last = rounds[-1]
+    return {
+        "devices": count,
+        "swept_devices": len(statuses),
+        "sweeps": rounds,
+        "wall_s": last["wall_s"],
+        "per_device_ms": round(last["wall_s"] * 1000 / count, 3) if count else 0.0,
+        "cpu_s": last["cpu_s"],
+        "cpu_pct": round(100 * last["cpu_s"] / last["wall_s"], 1) if last["wall_s"] else 0.0,
+        "rss_mb": round(_rss_mb() or 0.0, 1),
+        "peak_rss_mb": round(_peak_rss_mb() or 0.0, 1),
+        "mqtt_messages": last["mqtt_messages"],
+        "alive": alive,
+        "not_alive": len(statuses) - alive,
+        "fleet_requests": getattr(fleet, "fleet_stats", {}).get("requests"),
+    }
+
+
+def _print_table(results: List[Dict]):
+    columns = ["devices", "swept_devices", "wall_s", "per_device_ms", "cpu_s", "cpu_pct",
+               "rss_mb", "peak_rss_mb", "mqtt_messages", "alive", "not_alive"]
+    print(" ".join(f"{column:>13}" for column in columns))
+    for result in results:
+        print(" ".join(f"{str(result[column]):>13}" for column in columns))
+
+
+async def main(args) -> List[Dict]:
+    if args.mqtt:
+        await mqtt_client.connect()
+
+    fleet_options = {
+        "mode": args.mode,
+        "latency": args.latency,
+        "hang_fraction": args.hang_fraction,
+        "refuse_fraction": args.refuse_fraction,
+        "flap_fraction": args.flap_fraction,
+        "start_error_fraction": args.start_error_fraction,
+        "flap_period": args.flap_period,
+        "seed": args.seed,
+    }
+    results = []
+    try:
+        for count in args.sizes:
+            result = await run_size(count, fleet_options, args.sweeps)
+            results.append(result)
+            print(f"N={count}: {result['wall_s']}s wall, {result['cpu_s']}s CPU, "
+                  f"{result['mqtt_messages']} MQTT messages", file=sys.stderr)
+    finally:
+        if args.mqtt:
+            await mqtt_client.disconnect()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure background sweep scaling against a fake proxy fleet")
+    parser.add_argument("--sizes", default="10,100,1000,10000",
+                        type=lambda value: [int(size) for size in value.split(",") if size],
+                        help="Comma separated device counts")
+    parser.add_argument("--sweeps", type=int, default=2,
+                        help="Sweeps per size; the first one also loads the device cache")
+    parser.add_argument("--mode", choices=["ports", "virtual"], default="ports")
+    parser.add_argument("--latency", default="fixed:0", help="fixed:MS | uniform:LO:HI | lognormal:MEDIAN:SIGMA | exponential:MEAN")
+    parser.add_argument("--hang-fraction", type=float, default=0.0)
+    parser.add_argument("--refuse-fraction", type=float, default=0.0)
+    parser.add_argument("--flap-fraction", type=float, default=0.0)
+    parser.add_argument("--start-error-fraction", type=float, default=0.0)
+    parser.add_argument("--flap-period", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mqtt", action="store_true", help="Connect to the configured MQTT broker before sweeping")
+    parser.add_argument("--log-level", default="INFO",
+                        help="Application log level; records are formatted and discarded to keep logging cost realistic")
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+
+    handler = logging.FileHandler(os.devnull)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logging.basicConfig(level=getattr(logging, arguments.log_level.upper(), logging.INFO), handlers=[handler], force=True)
+
+    benchmark_results = asyncio.run(main(arguments))
+    _print_table(benchmark_results)
+    if arguments.json_path:
+        with open(arguments.json_path, "w", encoding="utf-8") as output:
+            json.dump({"options": vars(arguments), "results": benchmark_results}, output, indent=2)
@@ -0,0 +1,67 @@
+"""
+虛擬時鐘事件迴圈
+
+事件迴圈沒有就緒工作時不實際等待，而是把時鐘直接推進到下一個排程時間點。
+asyncio.sleep、wait_for 等逾時都以虛擬時間計算，模擬數小時只需實際執行程式碼所花的時間。
+
+- advance(seconds)：同步程式碼（例如阻塞式連接埠檢查）以此模擬阻塞耗時
+- cpu_scale > 0 時，實際執行 Python 程式碼所花的時間乘上 cpu_scale 後計入虛擬時間，以反映本機的 CPU 成本
+  （抽樣模擬時每台模擬設備代表多台設備，cpu_scale 即為代表倍數；0 表示不計入）
+
+限制：
+- 不可使用真實網路或執行緒池（run_in_executor / to_thread），它們以真實時間完成
+- 所有 I/O 都需以模型取代
+"""
+import asyncio
+import selectors
+import time
+
+
+class _VirtualClockSelector(selectors.SelectSelector):
+    """只輪詢已登記的檔案描述元（事件迴圈的自我喚醒管道），等待改為推進虛擬時鐘"""
+
+    def __init__(self, loop: "VirtualClockEventLoop"):
+        super().__init__()
+        self._virtual_loop = loop
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events:
+            return events
+        if timeout is None:
+            raise RuntimeError("Virtual clock loop has no scheduled callbacks to advance to (deadlock)")
+        if timeout > 0:
+            self._virtual_loop.advance(timeout)
+        return []
+
+
+class VirtualClockEventLoop(asyncio.SelectorEventLoop):
+    """以虛擬時間運行的事件迴圈"""
+
+    def __init__(self, start: float = 0.0, cpu_scale: float = 1.0):
+        self._virtual_offset = start
+        self._cpu_scale = cpu_scale
+        self._real_started = time.perf_counter()
+        super().__init__(_VirtualClockSelector(self))
+
+    def time(self) -> float:
+        if self._cpu_scale:
+            return self._virtual_offset + (time.perf_counter() - self._real_started) * self._cpu_scale
+        return self._virtual_offset
+
+    def advance(self, seconds: float):
+        """將虛擬時鐘往前推進（不實際等待）"""
+        if seconds > 0:
+            self._virtual_offset += seconds
+
+
+def run_virtual(coroutine, start: float = 0.0, cpu_scale: float = 1.0):
+    """在新的虛擬時鐘事件迴圈中執行協程並回傳結果"""
+    loop = VirtualClockEventLoop(start=start, cpu_scale=cpu_scale)
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        asyncio.set_event_loop(None)
+        loop.close()
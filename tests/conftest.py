@@ -0,0 +1,13 @@
+import pytest
+from app.config_mqtt import settings
+from benchmarks.mqtt_broker import MiniMQTTBroker
+
+
+@pytest.fixture
+def mqtt_broker(monkeypatch):
+    """在獨立執行緒啟動行程內 MQTT Broker，並將設定指向它"""
+    broker = MiniMQTTBroker().start_in_thread()
+    monkeypatch.setattr(settings, "MQTT_BROKER_HOST", broker.host)
+    monkeypatch.setattr(settings, "MQTT_BROKER_PORT", broker.port)
+    yield broker
+    broker.stop_in_thread()
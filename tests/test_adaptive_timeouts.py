@@ -0,0 +1,62 @@
+from app.services.adaptive_timeouts import AdaptiveTimeouts, RttEstimator
+
+
+def test_estimator_tracks_mean_and_variance():
+    """測試 RTT 估計：第一個樣本初始化，穩定樣本使變異量收斂，逾時退避加倍後於成功量測恢復"""
+    estimator = RttEstimator()
+    estimator.observe(0.1)
+    assert (estimator.srtt, estimator.rttvar) == (0.1, 0.05)
+    for _ in range(50):
+        estimator.observe(0.01)
+    assert abs(estimator.srtt - 0.01) < 0.001
+    assert estimator.timeout(4) < 0.02
+
+    base = estimator.timeout(4)
+    estimator.timed_out()
+    estimator.timed_out()
+    assert estimator.timeout(4) == base * 4
+    estimator.observe(0.01)
+    assert estimator.backoff == 1
+
+
+def test_timeouts_are_per_device_and_clamped():
+    """測試逾時依設備與步驟分別推導，樣本不足時沿用預設值，並限制在上下限之間"""
+    timeouts = AdaptiveTimeouts(enabled=True, min_timeout=0.05, max_timeout=2.0, multiplier=4, min_samples=3)
+    for _ in range(3):
+        timeouts.observe(1, "connect", 0.002)   # 快速區網
+        timeouts.observe(1, "health", 0.3)
+        timeouts.observe(2, "health", 1.5)      # 慢速連線
+        timeouts.observe(2, "health", 0.5)
+
+    assert timeouts.timeout(1, "connect", 0.2) == 0.05
+    assert 0.3 <= timeouts.timeout(1, "health", 5.0) < 1.0
+    assert timeouts.timeout(2, "health", 5.0) == 2.0
+    assert timeouts.timeout(3, "health", 5.0) == 5.0
+
+    http = timeouts.http_timeout(1, "health", 5.0)
+    assert (http.connect, http.read) == (0.05, timeouts.timeout(1, "health", 5.0))
+
+    timeouts.forget(1)
+    assert timeouts.timeout(1, "connect", 0.2) == 0.2
+    assert AdaptiveTimeouts(enabled=False, min_samples=1).timeout(2, "health", 5.0) == 5.0
+
+
+def test_per_kind_floor_and_side_effect_requests_keep_fixed_timeout():
+    """測試依步驟的逾時下限，/start 與指令的逾時不低於固定值，事件迴圈延遲時的樣本不計入"""
+    lag = [0.0]
+    timeouts = AdaptiveTimeouts(enabled=True, min_timeout=0.05, max_timeout=5.0, multiplier=4, min_samples=3,
+                                min_timeouts={"health": 0.25}, max_loop_lag=0.05, loop_lag=lambda: lag[0])
+    for _ in range(3):
+        timeouts.observe(1, "health", 0.001)
+        timeouts.observe(1, "start", 0.001)
+        timeouts.observe(1, "connect", 0.001)
+
+    assert timeouts.timeout(1, "connect", 0.2) == 0.05
+    assert timeouts.timeout(1, "health", 5.0) == 0.25
+    assert timeouts.timeout(1, "start", 2.0) == 0.05
+    start = timeouts.http_timeout(1, "start", 2.0, at_least_default=True)
+    assert (start.read, start.connect) == (2.0, 2.0)
+
+    lag[0] = 0.3  # 迴圈阻塞期間量到的 RTT 含排程延遲
+    timeouts.observe(2, "health", 0.3)
+    assert timeouts.estimator(2, "health") is None
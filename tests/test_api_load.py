@@ -0,0 +1,38 @@
+import asyncio
+from app.services.device_processor import device_processor
+from benchmarks.api_load import compare_to_baseline, parse_args, run
+
+
+def _result(p95_ms, throughput_rps, devices=100):
+    return {
+        "meta": {"devices": devices},
+        "operations": {"list": {"p50_ms": 1.0, "p95_ms": p95_ms, "p99_ms": p95_ms,
+                                "throughput_rps": throughput_rps, "errors": 0}},
+    }
+
+
+def test_compare_to_baseline_flags_only_real_regressions():
+    """測試基準比較：超過門檻才算退化，微小絕對差異忽略"""
+    baseline = _result(p95_ms=10.0, throughput_rps=500)
+    assert compare_to_baseline(_result(11.0, 480), baseline, threshold=0.2, min_delta_ms=1.0) == []
+    assert compare_to_baseline(_result(20.0, 500), baseline, threshold=0.2, min_delta_ms=1.0) == [
+        "list p95_ms: 10.0 -> 20.0", "list p99_ms: 10.0 -> 20.0"
+    ]
+    assert compare_to_baseline(_result(10.0, 300), baseline, threshold=0.2, min_delta_ms=1.0) == [
+        "list throughput_rps: 500 -> 300"
+    ]
+    assert compare_to_baseline(_result(10.0, 500, devices=10), baseline, 0.2, 1.0)
+
+
+def test_in_process_load_run_reports_each_operation():
+    """測試行程內負載測試對種子資料執行各情境且無錯誤"""
+    args = parse_args(["--devices", "20", "--requests", "4", "--concurrency", "2",
+                       "--scenarios", "health,list,detail,proxy_status_detail,crud"])
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        device_processor.load_devices_to_cache([])
+
+    operations = result["operations"]
+    assert set(operations) == {"health", "list", "detail", "proxy_status_detail", "crud_create", "crud_update", "crud_delete"}
+    assert all(summary["count"] == 4 and summary["errors"] == 0 for summary in operations.values())
@@ -0,0 +1,53 @@
+from app.services.availability import AvailabilityTracker, SlidingWindow
+
+
+def test_sliding_window_expires_old_buckets():
+    """測試滑動視窗會淘汰過期的桶"""
+    window = SlidingWindow(span=60, bucket_count=6)
+    window.add_duration(0, 30, up=True)
+    window.add_transition(30, failure=True)
+    window.add_duration(30, 40, up=False)
+    assert window.up_seconds == 30
+    assert window.down_seconds == 10
+    assert window.failures == 1
+
+    # 推進超過一個視窗長度後，所有舊資料都應過期
+    window.expire(200)
+    assert window.up_seconds == 0
+    assert window.down_seconds == 0
+    assert window.failures == 0
+
+
+def test_device_availability_mtbf_mttr():
+    """測試設備可用率、MTBF、MTTR 計算"""
+    tracker = AvailabilityTracker()
+    tracker.record(1, "E82", True, now=0)
+    tracker.record(1, "E82", False, now=300)   # 上線 300 秒後故障
+    tracker.record(1, "E82", True, now=400)    # 離線 100 秒後修復
+
+    report = tracker.device_report(1, now=400)
+    hour = report["windows"]["1h"]
+    assert report["current_state"] == "up"
+    assert hour["up_seconds"] == 300
+    assert hour["down_seconds"] == 100
+    assert hour["availability"] == 0.75
+    assert hour["failures"] == 1
+    assert hour["repairs"] == 1
+    assert hour["mtbf_seconds"] == 300
+    assert hour["mttr_seconds"] == 100
+
+
+def test_controller_type_availability_includes_ongoing_state():
+    """測試 Controller_type 合計統計包含進行中的狀態"""
+    tracker = AvailabilityTracker()
+    tracker.record(1, "E82", True, now=0)
+    tracker.record(2, "E82", False, now=0)
+
+    report = tracker.controller_type_report("E82", now=100)
+    assert report["device_count"] == 2
+    assert report["devices_up"] == 1
+    assert report["windows"]["1h"]["availability"] == 0.5
+
+    tracker.forget(2)
+    report = tracker.controller_type_report("E82", now=100)
+    assert report["device_count"] == 1
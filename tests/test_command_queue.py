@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.services.command_queue import IdempotencyKeyConflict, ProxyCommandQueue
+
+
+class FakeCommandService:
+    """記錄送出的指令與同時送出的最大數量"""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    async def execute(self, device, command):
+        self.calls.append((device.proxyid, command))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return {"proxyid": device.proxyid, "command": command, "status": "success", "message": "OK"}
+
+
+def _device(proxyid):
+    return SimpleNamespace(proxyid=proxyid, Controller_type="E82", remark=None)
+
+
+def test_pending_commands_coalesce_to_last():
+    """測試同一設備等待中的指令合併：Start、Start、Stop 只送出 Stop"""
+    service = FakeCommandService()
+    queue = ProxyCommandQueue(service, workers=4, idempotency_ttl=60)
+
+    async def scenario():
+        return await asyncio.gather(
+            queue.submit(_device(1), "start"),
+            queue.submit(_device(1), "start"),
+            queue.submit(_device(1), "stop"),
+        )
+
+    results = asyncio.run(scenario())
+    assert service.calls == [(1, "stop")]
+    assert [result["command"] for result in results] == ["start", "start", "stop"]
+    assert [result.get("superseded_by") for result in results] == ["stop", "stop", None]
+    assert queue.holds_service_stopped(1)
+
+
+def test_commands_serialize_per_device_and_share_worker_pool():
+    """測試同一設備依序送出、送出中的相同指令共用結果，全域同時送出數受限"""
+    service = FakeCommandService()
+    queue = ProxyCommandQueue(service, workers=2, idempotency_ttl=60)
+
+    async def scenario():
+        first = asyncio.create_task(queue.submit(_device(1), "stop"))
+        await asyncio.sleep(0.005)  # stop 已送出
+        joined = queue.submit(_device(1), "stop")
+        queued = queue.submit(_device(1), "start")
+        others = [queue.submit(_device(proxyid), "pause") for proxyid in range(2, 7)]
+        return await asyncio.gather(first, joined, queued, *others)
+
+    results = asyncio.run(scenario())
+    device_one = [call for call in service.calls if call[0] == 1]
+    assert device_one == [(1, "stop"), (1, "start")]
+    assert results[1] == results[0]
+    assert service.max_active == 2
+    assert len(service.calls) == 7
+
+
+def test_idempotency_key_and_sweep_start_hold():
+    """測試 Idempotency-Key 重送不重複執行，Stop 後巡檢不自動 /start，Resume 後恢復"""
+    service = FakeCommandService(delay=0)
+    queue = ProxyCommandQueue(service, workers=2, idempotency_ttl=60)
+
+    async def scenario():
+        await queue.submit(_device(1), "stop", idempotency_key="retry-1")
+        await queue.submit(_device(1), "stop", idempotency_key="retry-1")
+        skipped = await queue.run_sweep_start(_device(1))
+        await queue.submit(_device(1), "resume")
+        started = await queue.run_sweep_start(_device(1))
+        return skipped, started
+
+    skipped, started = asyncio.run(scenario())
+    assert skipped is None
+    assert started["status"] == "success"
+    assert service.calls == [(1, "stop"), (1, "resume"), (1, "start")]
+
+
+def test_idempotency_key_reused_for_other_device_or_command_is_rejected():
+    """測試 Idempotency-Key 用於其他設備或指令時拒絕，不重播第一次的結果也不送出"""
+    service = FakeCommandService(delay=0)
+    queue = ProxyCommandQueue(service, workers=2, idempotency_ttl=60)
+
+    async def scenario():
+        await queue.submit(_device(5), "stop", idempotency_key="k")
+        with pytest.raises(IdempotencyKeyConflict):
+            await queue.submit(_device(6), "start", idempotency_key="k")
+        with pytest.raises(IdempotencyKeyConflict):
+            await queue.submit(_device(5), "start", idempotency_key="k")
+
+    asyncio.run(scenario())
+    assert service.calls == [(5, "stop")]
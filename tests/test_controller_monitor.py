@@ -0,0 +1,51 @@
+import asyncio
+from app.models.device import Device
+from app.services.controller_monitor import ControllerMonitor
+from app.services.device_processor import device_processor
+
+
+def _device(proxyid, controller_ip, controller_port=5000, controller_type="E82", enable=1):
+    return Device(proxyid=proxyid, proxy_ip=f"10.0.0.{proxyid}", proxy_port=8080, Controller_type=controller_type,
+                  Controller_ip=controller_ip, Controller_port=controller_port, remark=None, enable=enable)
+
+
+def test_shared_controller_is_probed_once_and_published_to_every_proxy():
+    """測試共用控制器端點的設備每輪只探測一次，結果寫入每台設備的 controllerAlive"""
+    probed = []
+
+    async def connect(ip, port, timeout):
+        probed.append((ip, port))
+        await asyncio.sleep(0)
+        return ip == "192.168.1.10"
+
+    devices = [
+        _device(9101, "192.168.1.10"),
+        _device(9102, "192.168.1.10", controller_type="E84"),
+        _device(9103, "192.168.1.20"),
+        _device(9104, "192.168.1.30", enable=0),
+        _device(9105, "", controller_port=0),
+    ]
+    monitor = ControllerMonitor(processor=device_processor, interval=60, timeout=0.1, concurrency=4, connect=connect)
+    try:
+        device_processor.load_devices_to_cache(devices)
+        assert device_processor.get_device_status_from_cache(9101)["controllerAlive"] == "0"
+        assert device_processor.get_device_status_from_cache(9105)["controllerAlive"] == "unknown"
+
+        asyncio.run(monitor.probe_all())
+        assert sorted(probed) == [("192.168.1.10", 5000), ("192.168.1.20", 5000)]
+        alive = {proxyid: device_processor.get_device_status_from_cache(proxyid)["controllerAlive"]
+                 for proxyid in (9101, 9102, 9103)}
+        assert alive == {9101: "1", 9102: "1", 9103: "0"}
+
+        report = monitor.report(controller_type="E84")
+        assert [(item["controller_ip"], item["proxyids"], item["controllerAlive"]) for item in report] == [
+            ("192.168.1.10", [9101, 9102], "1")
+        ]
+        assert monitor.down_count() == 1
+
+        # 重新載入設備快取時保留最近一次的控制器狀態
+        device_processor.load_devices_to_cache(devices)
+        assert device_processor.get_device_status_from_cache(9102)["controllerAlive"] == "1"
+    finally:
+        device_processor.load_devices_to_cache([])
+        device_processor.controller_status.clear()
@@ -1,3 +1,7 @@
+import asyncio
+import json
+import time
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -100,6 +104,19 @@ def test_get_all_devices(client):
     data = response.json()
     assert len(data) >= 1
 
+def test_device_list_paginates_in_database(client):
+    """測試設備列表在資料庫分頁：超過 100 台時後面的頁面與總數仍正確"""
+    for proxyid in range(1, 131):
+        client.post("/DeviceServiceConfig", json={
+            "proxyid": proxyid, "proxy_ip": "127.0.0.1", "proxy_port": 6000 + proxyid,
+            "Controller_type": "E82", "Controller_ip": "127.0.0.1", "Controller_port": 5100,
+            "enable": 0, "createUser": "test_user"
+        })
+
+    data = client.get("/DeviceServiceConfig", params={"page": 7, "size": 20}).json()
+    assert data["total"] == 130
+    assert [device["proxyid"] for device in data["data"]] == list(range(121, 131))
+
 def test_get_device(client):
     """測試獲取特定設備服務配置"""
     # 先建立測試資料
@@ -180,7 +197,28 @@ def test_delete_device(client):
     data = response.json()
     assert "deleted successfully" in data["message"]
 
-def test_start_proxy(client):
+@pytest.fixture
+def proxy_api(monkeypatch):
+    """以 MockTransport 取代下位機 HTTP API，記錄收到的請求；port 9 的設備回應 500"""
+    from app.services.device_processor import device_processor
+    requests = []
+
+    async def handler(request):
+        requests.append((request.url.port, request.url.path))
+        await asyncio.sleep(0.05)
+        if request.url.port == 9:
+            return httpx.Response(500, json={"message": "failed"})
+        return httpx.Response(200, json={"message": f"{request.url.path[1:]} accepted"})
+
+    monkeypatch.setattr(device_processor, "http_transport", httpx.MockTransport(handler))
+
+    async def port_open(ip, port, timeout=0.5):
+        return True
+
+    monkeypatch.setattr(device_processor, "port_probe", port_open)
+    return requests
+
+def test_start_proxy(client, proxy_api):
     """測試啟動代理服務"""
     # 先建立測試資料
     device_data = {
@@ -202,6 +240,96 @@ def test_start_proxy(client):
     assert response.status_code == 200
     data = response.json()
     assert "start initiated" in data["message"]
+    assert proxy_api == [(5555, "/start")]
+
+    response = client.post("/Pause/1")
+    assert response.status_code == 200
+    assert client.post("/Stop/2").status_code == 404
+
+def test_group_command_streams_results_concurrently(client, proxy_api):
+    """測試群組指令依 Controller_type 並行送出，以 NDJSON 逐筆回傳結果與統計"""
+    for proxyid in range(1, 21):
+        client.post("/DeviceServiceConfig", json={
+            "proxyid": proxyid,
+            "proxy_ip": "127.0.0.1",
+            "proxy_port": 9 if proxyid == 3 else 6000 + proxyid,
+            "Controller_type": "E82" if proxyid <= 15 else "E88",
+            "Controller_ip": "127.0.0.1",
+            "Controller_port": 5100,
+            "enable": 0 if proxyid == 4 else 1,
+            "createUser": "test_user"
+        })
+
+    started = time.perf_counter()
+    response = client.post("/Stop", params={"controller_type": "E82", "concurrency": 20})
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results, summary = lines[:-1], lines[-1]["summary"]
+    assert sorted(result["proxyid"] for result in results) == [1, 2, 3] + list(range(5, 16))
+    assert {result["proxyid"] for result in results if result["status"] == "error"} == {3}
+    assert (summary["total"], summary["success"], summary["error"], summary["not_found"]) == (14, 13, 1, 0)
+    assert elapsed < 0.05 * 14 / 2  # 並行送出，遠少於逐台送出的時間
+
+    lines = [json.loads(line) for line in client.post("/Resume", params={"proxyid": [4, 99]}).text.splitlines()]
+    assert [(line.get("proxyid"), line.get("status")) for line in lines[:-1]] == [(99, "not_found"), (4, "success")]
+
+    # 未指定目標（或參數打錯）時不會對全部設備送出
+    assert client.post("/Stop").status_code == 422
+    assert client.post("/Pause", params={"proxyids": 5}).status_code == 422
+
+def test_group_start_overlaps_port_checks(client, proxy_api, monkeypatch):
+    """測試群組 Start 的連接埠檢查不阻塞事件迴圈，各設備的檢查同時進行"""
+    from app.services.device_processor import device_processor
+    probes = {"active": 0, "max_active": 0}
+
+    async def slow_port_probe(ip, port, timeout=0.5):
+        probes["active"] += 1
+        probes["max_active"] = max(probes["max_active"], probes["active"])
+        await asyncio.sleep(0.1)
+        probes["active"] -= 1
+        return True
+
+    monkeypatch.setattr(device_processor, "port_probe", slow_port_probe)
+    for proxyid in range(1, 11):
+        client.post("/DeviceServiceConfig", json={
+            "proxyid": proxyid, "proxy_ip": "127.0.0.1", "proxy_port": 6000 + proxyid,
+            "Controller_type": "E82", "Controller_ip": "127.0.0.1", "Controller_port": 5100,
+            "enable": 1, "createUser": "test_user"
+        })
+
+    started = time.perf_counter()
+    response = client.post("/Start", params={"proxyid": list(range(1, 11)), "concurrency": 10})
+    elapsed = time.perf_counter() - started
+    summary = json.loads(response.text.splitlines()[-1])["summary"]
+    assert summary["success"] == 10
+    assert probes["max_active"] == 10
+    assert elapsed < 0.1 * 10 / 2  # 逐台阻塞檢查至少需要 1 秒
+
+def test_probe_serves_fresh_result_from_cache(client, proxy_api):
+    """測試立即探測：期限內的重複請求回傳快取結果與 age_seconds，max_age=0 重新探測"""
+    client.post("/DeviceServiceConfig", json={
+        "proxyid": 31,
+        "proxy_ip": "127.0.0.1",
+        "proxy_port": 6031,
+        "Controller_type": "E82",
+        "Controller_ip": "127.0.0.1",
+        "Controller_port": 5100,
+        "enable": 1,
+        "createUser": "test_user"
+    })
+
+    first = client.post("/Probe/31").json()
+    second = client.post("/Probe/31").json()
+    assert (first["healthy"], first["source"]) == (True, "probe")
+    assert second["source"] == "cache" and second["checked_at"] == first["checked_at"]
+    assert second["age_seconds"] >= 0
+    assert client.post("/Probe/31", params={"max_age": 0}).json()["source"] == "probe"
+    assert proxy_api.count((6031, "/Health")) == 2
+    assert proxy_api.count((6031, "/start")) == 0  # /Probe 只探測，不啟動服務
+    assert client.post("/Probe/404").status_code == 404
 
 def test_get_proxy_status(client):
     """測試獲取代理服務狀態"""
@@ -0,0 +1,29 @@
+import asyncio
+import httpx
+import pytest
+from benchmarks.fake_proxy_fleet import FakeProxyFleet, KIND_OK, KIND_REFUSE, KIND_START_ERROR
+
+
+def test_fleet_serves_health_and_start_per_device_kind():
+    """測試模擬叢集依設備行為回應 /Health、/start 與拒絕連線"""
+    async def scenario():
+        fleet = FakeProxyFleet(12, mode="virtual", refuse_fraction=0.25, start_error_fraction=0.25, seed=3)
+        async with fleet:
+            assert fleet.kind_counts() == {KIND_OK: 6, KIND_REFUSE: 3, KIND_START_ERROR: 3}
+            by_kind = {proxy.kind: proxy for proxy in fleet.proxies}
+
+            async with httpx.AsyncClient() as client:
+                ok = by_kind[KIND_OK]
+                response = await client.get(f"http://{ok.ip}:{ok.port}/Health")
+                assert response.status_code == 200
+                assert response.json()["index"] == ok.index
+
+                failing = by_kind[KIND_START_ERROR]
+                response = await client.post(f"http://{failing.ip}:{failing.port}/start", json={"proxyid": "1"})
+                assert response.status_code == 500
+
+                refused = by_kind[KIND_REFUSE]
+                with pytest.raises(httpx.ConnectError):
+                    await client.get(f"http://{refused.ip}:{refused.port}/Health")
+
+    asyncio.run(scenario())
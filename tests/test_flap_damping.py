@@ -0,0 +1,48 @@
+from app.services.flap_damping import FlapDamper, STATUS_TRANSITIONS_SUPPRESSED
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _damper(clock):
+    return FlapDamper(down_after=2, up_after=2, penalty=1000, suppress_limit=2000, reuse_limit=750,
+                      half_life=60, max_suppress=600, clock=clock)
+
+
+def test_hysteresis_requires_consecutive_results():
+    """測試遲滯：單次失敗不改變狀態，連續兩次失敗才離線，連續兩次成功才上線"""
+    damper = _damper(FakeClock())
+    hysteresis = STATUS_TRANSITIONS_SUPPRESSED.labels("hysteresis")
+    before = hysteresis.value
+
+    assert damper.observe(1, True) is True
+    assert [damper.observe(1, up) for up in (False, True, False, False)] == [True, True, True, False]
+    assert [damper.observe(1, up) for up in (True, True)] == [False, True]
+    assert hysteresis.value - before == 3
+
+
+def test_flapping_device_is_held_down_until_penalty_decays():
+    """測試抖動抑制：反覆上下線超過門檻後維持離線，懲罰值衰減到 reuse 以下才恢復上線"""
+    clock = FakeClock()
+    damper = _damper(clock)
+    damper.observe(1, True)
+    for _ in range(3):  # 三次完整的離線→上線
+        damper.observe(1, False)
+        damper.observe(1, False)
+        damper.observe(1, True)
+        damper.observe(1, True)
+        clock.now += 1
+
+    report = damper.report(1)[1]
+    assert report["state"] == "down" and report["suppressed"]
+    assert damper.suppressed_count() == 1
+    assert damper.observe(1, True) is False  # 仍在抑制
+
+    clock.now += 120  # 兩個半衰期：~2960 → ~740
+    assert damper.observe(1, True) is True
+    assert damper.report(1)[1]["suppressed"] is False
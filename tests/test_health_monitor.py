@@ -0,0 +1,50 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from app.config_mqtt import settings
+from app.main import app
+from app.services.health_monitor import ComponentHealthMonitor, component_health_monitor
+
+
+def _worker(progress_age):
+    now = time.monotonic()
+    return SimpleNamespace(is_running=True, task=SimpleNamespace(done=lambda: False),
+                           started_at=now - 600, last_sweep_at=None, last_progress_at=now - progress_age)
+
+
+def test_monitor_reports_components_and_stale_worker(monkeypatch):
+    """測試元件檢查結果：資料庫可連線、背景巡檢停滯時未就緒"""
+    monkeypatch.setattr(settings, "HEALTH_WORKER_STALE_AFTER", 60.0)
+    monitor = ComponentHealthMonitor()
+    assert monitor.readiness()["status"] == "not_ready"
+
+    monitor.register_worker(_worker(progress_age=5))
+    asyncio.run(monitor.check_once())
+    result = monitor.readiness()
+    assert result["status"] == "ready"
+    assert result["components"]["database"]["status"] == "up"
+    assert result["components"]["background_worker"]["status"] == "up"
+    assert result["components"]["mqtt"]["status"] == "down"  # MQTT 未連線不影響就緒
+
+    monitor.register_worker(_worker(progress_age=300))
+    asyncio.run(monitor.check_once())
+    result = monitor.readiness()
+    assert result["status"] == "not_ready"
+    assert result["components"]["background_worker"]["status"] == "stale"
+
+
+def test_probe_endpoints_read_cached_results(monkeypatch):
+    """測試存活與就緒端點：就緒端點只回傳快取結果"""
+    monkeypatch.setattr(component_health_monitor, "components", dict(component_health_monitor.components))
+    monkeypatch.setattr(component_health_monitor, "checked_at", None)
+    client = TestClient(app)
+
+    assert client.get("/health/live").json() == {"status": "alive"}
+    assert client.get("/health/ready").status_code == 503
+
+    monkeypatch.setattr(component_health_monitor, "worker", None)
+    asyncio.run(component_health_monitor.check_once())
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["components"]["background_worker"]["status"] == "disabled"
@@ -0,0 +1,109 @@
+import asyncio
+import time
+import httpx
+from app.config_mqtt import settings
+from app.models.device import Device
+from app.services.adaptive_timeouts import AdaptiveTimeouts
+from app.services.device_processor import device_processor
+
+
+def _device(proxyid, port):
+    return Device(proxyid=proxyid, proxy_ip="192.0.2.20", proxy_port=port, Controller_type="E82",
+                  remark="http-probe", enable=1)
+
+
+def test_http_only_probe_skips_port_check_and_classifies_connect_errors(monkeypatch):
+    """測試 HTTP-only 模式不做 TCP 連接埠檢查，連線失敗仍回報連接埠無法存取"""
+    def handler(request):
+        if request.url.port == 9:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, json={"message": "OK"})
+
+    async def port_probe(ip, port, timeout=0.5):
+        raise AssertionError("port check must not run in HTTP-only mode")
+
+    monkeypatch.setattr(settings, "PROBE_MODE", "http")
+    monkeypatch.setattr(device_processor, "http_transport", httpx.MockTransport(handler))
+    monkeypatch.setattr(device_processor, "port_probe", port_probe)
+
+    healthy = asyncio.run(device_processor.check_proxy_health(_device(9201, 8080)))
+    unreachable = asyncio.run(device_processor.check_proxy_health(_device(9202, 9)))
+    assert healthy["healthy"] is True
+    assert (unreachable["status"], unreachable["message"]) == ("unreachable", "proxy Port not accessible")
+
+
+def test_health_request_is_hedged_for_jittery_devices(monkeypatch):
+    """測試 RTT 變異大的設備，第一個請求超過約 p95 未回應時送出對沖請求並採用先回應者"""
+    calls = []
+
+    async def handler(request):
+        calls.append(time.perf_counter())
+        if len(calls) == 1:
+            await asyncio.sleep(1.0)  # 第一個請求卡住
+        return httpx.Response(200, json={"message": "OK"})
+
+    timeouts = AdaptiveTimeouts(enabled=True, min_timeout=0.05, max_timeout=5.0, multiplier=4, min_samples=3)
+    for rtt in (0.01, 0.05, 0.01, 0.05, 0.01):
+        timeouts.observe(9203, "health", rtt)
+    monkeypatch.setattr(settings, "PROBE_HEDGE_ENABLED", True)
+    monkeypatch.setattr(device_processor, "timeouts", timeouts)
+    monkeypatch.setattr(device_processor, "http_transport", httpx.MockTransport(handler))
+
+    async def probe():
+        started = time.perf_counter()
+        response = await device_processor._request_health(
+            _device(9203, 8080), "http://192.0.2.20:8080/Health", {}, httpx.Timeout(2.0))
+        return response, time.perf_counter() - started
+
+    response, elapsed = asyncio.run(probe())
+    assert response.status_code == 200
+    assert len(calls) == 2
+    assert elapsed < 0.5
+    assert timeouts.hedge_delay(9204, "health", 0.5) is None
+
+
+def test_start_failure_keeps_damped_alive_state(monkeypatch):
+    """測試 /start 失敗只清除 proxyServiceStart，不覆寫巡檢決定的 proxyServiceAlive"""
+    def handler(request):
+        return httpx.Response(500, text="busy")
+
+    device = _device(9204, 8080)
+    monkeypatch.setattr(settings, "PROBE_MODE", "http")
+    monkeypatch.setattr(device_processor, "http_transport", httpx.MockTransport(handler))
+    try:
+        device_processor.load_devices_to_cache([device])
+        device_processor.update_device_status_cache(9204, "OK", "1", "1")
+
+        result = asyncio.run(device_processor.start_proxy_service(device))
+        status = device_processor.get_device_status_from_cache(9204)
+        assert result["status"] == "error"
+        assert (status["proxyServiceAlive"], status["proxyServiceStart"]) == ("1", "0")
+
+        version = device_processor.device_status_cache.version
+        asyncio.run(device_processor.start_proxy_service(device))
+        assert device_processor.device_status_cache.version == version  # 重複失敗不產生新版本
+    finally:
+        device_processor.load_devices_to_cache([])
+
+
+def test_availability_is_recorded_from_probe_results_only(monkeypatch):
+    """測試可用率只由巡檢結果計入，/start 或指令造成的快取寫入不算故障"""
+    def handler(request):
+        return httpx.Response(200, json={"message": "OK"})
+
+    device = _device(9205, 8080)
+    monkeypatch.setattr(settings, "PROBE_MODE", "http")
+    monkeypatch.setattr(device_processor, "http_transport", httpx.MockTransport(handler))
+    tracker = device_processor.availability_tracker
+    try:
+        device_processor.load_devices_to_cache([device])
+        device_processor.update_device_status_cache(9205, "Error: refused", "0", "0")
+        assert tracker.device_report(9205) is None
+
+        asyncio.run(device_processor.check_proxy_health(device))
+        device_processor.update_device_status_cache(9205, "Error: refused", "0", "0")
+        report = tracker.device_report(9205)
+        assert report["current_state"] == "up"
+        assert report["windows"]["1h"]["failures"] == 0
+    finally:
+        device_processor.load_devices_to_cache([])
@@ -0,0 +1,66 @@
+import gzip
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from app.utils import log_archive
+from app.utils.log_archive import INDEX_SUFFIX, RetentionPolicy, apply_retention, compress_file, search
+
+
+def _write_log(path, start, count):
+    with open(path, "w", encoding="utf-8") as log_file:
+        for index in range(count):
+            moment = start + timedelta(seconds=index)
+            log_file.write(f"{moment:%Y-%m-%d %H:%M:%S},000 - app - INFO - line {index}\n")
+            if index % 100 == 0:
+                log_file.write("Traceback continuation line\n")
+
+
+def test_compress_and_search_by_time_window(tmp_path, monkeypatch):
+    """測試壓縮檔為多 member gzip，並可依索引只讀取時間範圍內的紀錄"""
+    monkeypatch.setattr(log_archive, "MEMBER_BYTES", 4096)
+    start = datetime(2026, 10, 19, 7, 0, 0)
+    path = str(tmp_path / "device_service_20261019_07_20261019_080000.log")
+    _write_log(path, start, 1000)
+
+    archive = compress_file(path)
+    assert not os.path.exists(path)
+    with gzip.open(archive, "rt", encoding="utf-8") as stream:
+        assert sum(1 for _ in stream) == 1010
+    with open(archive + INDEX_SUFFIX, encoding="utf-8") as index_file:
+        index = json.load(index_file)
+    assert len(index["members"]) > 10
+    assert index["first"] == start.timestamp()
+    assert index["last"] == (start + timedelta(seconds=999)).timestamp()
+
+    since = (start + timedelta(seconds=500)).timestamp()
+    until = (start + timedelta(seconds=509)).timestamp()
+    lines = list(search(str(tmp_path), "device_service", since=since, until=until))
+    assert [line.decode().split(" - ")[-1].strip() for line in lines] == \
+        ["line 500", "Traceback continuation line"] + [f"line {index}" for index in range(501, 510)]
+    assert list(search(str(tmp_path), "device_service", since=since, until=until,
+                       pattern=re.compile(rb"line 505"))) == [lines[6]]
+
+
+def test_retention_by_count_size_and_age(tmp_path):
+    """測試保留策略依檔數、總大小與天數刪除最舊的輪替檔，並保留寫入中的檔案"""
+    now = datetime(2026, 10, 19, 12, 0, 0).timestamp()
+    names = []
+    for hours in range(6):
+        name = tmp_path / f"mqtt_20261019_07_20261019_{hours:02d}0000.log.gz"
+        name.write_bytes(b"x" * 100)
+        os.utime(name, (now - hours * 3600, now - hours * 3600))
+        names.append(str(name))
+    active = tmp_path / "mqtt_20261019_12.log"
+    active.write_bytes(b"x" * 1000)
+    old_run = tmp_path / "mqtt_20260901_07.log"
+    old_run.write_bytes(b"x")
+    os.utime(old_run, (now - 40 * 86400, now - 40 * 86400))
+
+    prefix = str(tmp_path / "mqtt_")
+    removed = apply_retention(prefix, ".log", RetentionPolicy(max_files=4), active=str(active), now=now)
+    assert sorted(removed) == sorted(names[4:])
+    removed = apply_retention(prefix, ".log", RetentionPolicy(max_total_bytes=250, max_age_days=30),
+                              active=str(active), now=now)
+    assert sorted(removed) == sorted(names[2:4] + [str(old_run)])
+    assert active.exists()
@@ -0,0 +1,67 @@
+import logging
+from app.utils.log_filters import LOG_RECORDS_SUPPRESSED, RateLimitFilter
+from app.utils.rate_limit import TokenBucket
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _record(message, level=logging.INFO, name="app.services.device_processor"):
+    return logging.LogRecord(name, level, __file__, 1, message, None, None)
+
+
+def test_token_bucket_refills_at_rate():
+    """測試權杖桶的突發容量與補充速率"""
+    clock = _Clock()
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.wait_time() == 0.5
+    clock.now = 0.5
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_rate_limit_is_per_proxyid_and_template():
+    """測試限速以 proxyid 與訊息範本區分，恢復輸出時附上被抑制的筆數"""
+    clock = _Clock()
+    log_filter = RateLimitFilter(interval=10, burst=2, clock=clock)
+    suppressed = LOG_RECORDS_SUPPRESSED.labels("rate_limited", "INFO")
+    before = suppressed.value
+
+    results = [log_filter.filter(_record(f"Health check response for proxy 1: {{'ms': {i}}}")) for i in range(5)]
+    assert results == [True, True, False, False, False]
+    # 不同設備、不同範本各自計算
+    assert log_filter.filter(_record("Health check response for proxy 2: {'ms': 1}"))
+    assert log_filter.filter(_record("Start API result for device 1: True"))
+    # 錯誤等級不受限
+    assert all(log_filter.filter(_record("Health check failed for proxy 1", logging.ERROR)) for _ in range(5))
+    assert suppressed.value - before == 3
+
+    clock.now = 10
+    record = _record("Health check response for proxy 1: {'ms': 9}")
+    assert log_filter.filter(record)
+    assert record.getMessage().endswith("[suppressed 3 similar messages]")
+
+
+def test_proxyid_is_taken_from_mqtt_topic_and_json_payload():
+    """測試從 MQTT 主題與 JSON 內容取出 proxyid，不同設備的發佈紀錄不共用限速 key"""
+    topic = _record("[MQTT_PUBLISH] Topic: mcs/events/ProxyService/status/12, QoS: 1, Payload: {}")
+    payload = _record('[MQTT_PUBLISH] Payload: {"proxyid": 34, "status": "1"}')
+    assert RateLimitFilter.key_for(topic)[3] == "12"
+    assert RateLimitFilter.key_for(payload)[3] == "34"
+    # 預設只限速 DEBUG/INFO
+    log_filter = RateLimitFilter(interval=10, burst=1, clock=_Clock())
+    assert all(log_filter.filter(_record("Health check failed for proxy 1", logging.WARNING)) for _ in range(5))
+
+
+def test_sampling_drops_configured_fraction():
+    """測試 DEBUG 抽樣只保留設定比例，其他等級不受影響"""
+    log_filter = RateLimitFilter(interval=0, sample_rates={"DEBUG": 0.1}, seed=1)
+    kept = sum(log_filter.filter(_record(f"debug {i}", logging.DEBUG)) for i in range(2000))
+    assert 100 < kept < 300
+    assert all(log_filter.filter(_record(f"info {i}")) for i in range(100))
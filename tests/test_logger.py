@@ -0,0 +1,71 @@
+import glob
+import json
+import logging
+import queue
+import pytest
+from app.utils.logger import DroppingQueueHandler, LOG_RECORDS_DROPPED, setup_logging, shutdown_logging
+
+
+@pytest.fixture
+def restore_logging():
+    root, mqtt = logging.getLogger(), logging.getLogger("mqtt")
+    saved = [(logger, logger.handlers[:], logger.level, logger.propagate) for logger in (root, mqtt)]
+    yield
+    shutdown_logging(reattach=False)
+    for logger, handlers, level, propagate in saved:
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+        for handler in handlers:
+            logger.addHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = propagate
+
+
+def _read_log(directory, prefix):
+    (path,) = glob.glob(str(directory / f"{prefix}_*.log"))
+    with open(path, encoding="utf-8") as log_file:
+        return log_file.read().splitlines()
+
+
+def test_setup_logging_writes_through_background_queue(tmp_path, restore_logging):
+    """測試日誌經由佇列在背景執行緒寫入，且 JSON Lines 格式可解析"""
+    setup_logging(log_file=str(tmp_path / "service.log"), mqtt_log_file=str(tmp_path / "mqtt.log"),
+                  batch_size=8, json_lines=True)
+    assert all(isinstance(handler, DroppingQueueHandler) for handler in logging.getLogger().handlers)
+
+    for index in range(50):
+        logging.getLogger("app.test").info("record %d", index)
+    logging.getLogger("mqtt").warning("mqtt record")
+    shutdown_logging(reattach=False)
+
+    lines = [json.loads(line) for line in _read_log(tmp_path, "service")]
+    assert [line["message"] for line in lines] == [f"record {index}" for index in range(50)]
+    assert lines[0]["level"] == "INFO" and lines[0]["logger"] == "app.test"
+    assert json.loads(_read_log(tmp_path, "mqtt")[0])["message"] == "mqtt record"
+
+
+def test_full_queue_drops_and_counts_records():
+    """測試佇列已滿時丟棄紀錄並累加丟棄計數，而非阻塞呼叫端"""
+    logger = logging.Logger("drop-test")
+    logger.addHandler(DroppingQueueHandler(queue.Queue(maxsize=2), "drop-test"))
+    dropped = LOG_RECORDS_DROPPED.labels("INFO")
+    before = dropped.value
+
+    for index in range(5):
+        logger.info("record %d", index)
+
+    assert dropped.value - before == 3
+
+
+def test_exception_is_formatted_by_listener_as_structured_field(tmp_path, restore_logging):
+    """測試例外資訊保留到背景執行緒才格式化，JSON 輸出保有獨立的 exception 欄位"""
+    setup_logging(log_file=str(tmp_path / "service.log"), mqtt_log_file=str(tmp_path / "mqtt.log"), json_lines=True)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logging.getLogger("app.test").exception("failed %s", "step")
+    shutdown_logging(reattach=False)
+
+    (line,) = [json.loads(line) for line in _read_log(tmp_path, "service")]
+    assert line["message"] == "failed step"
+    assert "ValueError: boom" in line["exception"]
@@ -0,0 +1,29 @@
+import asyncio
+import time
+from app.utils.loop_monitor import LoopLagMonitor
+
+
+def _blocking_call():
+    time.sleep(0.3)
+
+
+def test_monitor_captures_blocking_call():
+    """測試阻塞事件迴圈時記錄延遲，並擷取到阻塞位置"""
+    monitor = LoopLagMonitor(interval=0.02, threshold=0.1)
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.1)
+        _blocking_call()
+        await asyncio.sleep(0.1)
+        report = monitor.report()
+        await monitor.stop()
+        return report
+
+    report = asyncio.run(scenario())
+    assert report["stalls"] >= 1
+    offender = report["offenders"][-1]
+    assert "_blocking_call" in offender["location"]
+    assert offender["blocked_ms"] >= 250
+    assert report["max_lag_ms"] >= 200
+    assert not monitor.running
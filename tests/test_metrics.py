@@ -0,0 +1,47 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.utils.metrics import MetricsRegistry
+
+
+def test_registry_renders_prometheus_text():
+    """測試指標以 Prometheus 文字格式輸出"""
+    registry = MetricsRegistry()
+    requests = registry.counter("demo_requests_total", "Demo requests", ["result"])
+    latency = registry.histogram("demo_latency_seconds", "Demo latency", buckets=(0.1, 1.0))
+    requests.labels("ok").inc()
+    requests.labels(result="ok").inc(2)
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    text = registry.render()
+    assert "# TYPE demo_requests_total counter" in text
+    assert 'demo_requests_total{result="ok"} 3' in text
+    assert 'demo_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'demo_latency_seconds_bucket{le="1"} 2' in text
+    assert 'demo_latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "demo_latency_seconds_count 3" in text
+
+
+def test_metrics_endpoint_reports_route_latency():
+    """測試 /metrics 端點包含以路由樣板為標籤的請求延遲"""
+    client = TestClient(app)
+    client.get("/Availability/12345")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/Availability/{proxyid}"' in response.text
+    assert "device_service_mqtt_connected" in response.text
+
+
+def test_long_poll_is_kept_out_of_request_latency():
+    """測試長輪詢請求記到 held 直方圖，不混入一般請求延遲"""
+    from app.api.middleware import HELD_REQUEST_DURATION, REQUEST_LATENCY
+    client = TestClient(app)
+    held = HELD_REQUEST_DURATION.labels("/ProxyStatus", "long_poll")
+    plain = REQUEST_LATENCY.labels("GET", "/ProxyStatus", "200")
+    held_before, plain_before = held.snapshot()[2], plain.snapshot()[2]
+
+    version = client.get("/ProxyStatus", params={"since": 0}).json()["version"]
+    client.get("/ProxyStatus", params={"since": version, "wait": 0.05})
+    assert (held.snapshot()[2] - held_before, plain.snapshot()[2] - plain_before) == (1, 1)
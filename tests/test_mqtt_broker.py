@@ -0,0 +1,58 @@
+import asyncio
+import json
+import queue
+import paho.mqtt.client as mqtt
+from app.mqtt.client import mqtt_client
+from app.mqtt.publisher import mqtt_publisher
+from benchmarks.mqtt_broker import topic_matches
+
+
+def test_topic_wildcards():
+    """測試 + 與 # 萬用字元比對"""
+    assert topic_matches("mcs/events/ProxyService/status/+", "mcs/events/ProxyService/status/7")
+    assert not topic_matches("mcs/events/ProxyService/status/+", "mcs/events/ProxyService/status")
+    assert topic_matches("mcs/#", "mcs/events/deviceService/start")
+    assert topic_matches("mcs/#", "mcs")
+    assert not topic_matches("#", "$SYS/broker/uptime")
+
+
+def test_publish_reaches_subscriber_and_survives_broker_restart(mqtt_broker):
+    """測試發佈經 Broker 轉送給訂閱者，且 Broker 重啟後客戶端自動重連"""
+    messages = queue.Queue()
+    subscriber = mqtt.Client(client_id="test_subscriber")
+    subscriber.on_connect = lambda client, userdata, flags, rc: client.subscribe("mcs/events/ProxyService/status/+", 1)
+    subscriber.on_message = lambda client, userdata, message: messages.put((message.topic, json.loads(message.payload)))
+    subscriber.connect(mqtt_broker.host, mqtt_broker.port)
+    subscriber.loop_start()
+
+    async def scenario():
+        assert await mqtt_client.connect()
+        try:
+            while not mqtt_broker.sessions or not any(session.subscriptions for session in mqtt_broker.sessions):
+                await asyncio.sleep(0.05)
+            assert mqtt_publisher.publish_proxy_status_update(proxyid=7, status="running")
+            topic, payload = messages.get(timeout=5)
+            assert topic == "mcs/events/ProxyService/status/7"
+            assert payload["proxyid"] == 7
+
+            mqtt_broker.call(mqtt_broker.stop)
+            for _ in range(100):
+                if not mqtt_client.is_connected:
+                    break
+                await asyncio.sleep(0.05)
+            assert not mqtt_client.publish("mcs/events/ProxyService/status/7", {"proxyid": 7})
+
+            mqtt_broker.call(mqtt_broker.start)
+            for _ in range(100):
+                if mqtt_client.is_connected:
+                    break
+                await asyncio.sleep(0.05)
+            assert mqtt_client.is_connected
+        finally:
+            await mqtt_client.disconnect()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        subscriber.loop_stop()
+        subscriber.disconnect()
@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+from app.services.probe_coordinator import ProbeCoordinator
+
+
+class FakeProcessor:
+    """記錄探測次數的假 device_processor"""
+
+    def __init__(self):
+        self.calls = 0
+        self.starts = []
+
+    async def check_proxy_health(self, device, start=True):
+        self.calls += 1
+        self.starts.append(start)
+        await asyncio.sleep(0.02)
+        return {"proxyid": device.proxyid, "status": "healthy", "healthy": True}
+
+
+def test_concurrent_probes_share_one_in_flight_probe():
+    """測試同一設備同時的探測請求（含巡檢）只對下位機探測一次"""
+    processor = FakeProcessor()
+    coordinator = ProbeCoordinator(processor, freshness=5)
+    device = SimpleNamespace(proxyid=1)
+
+    async def scenario():
+        sweep = asyncio.create_task(coordinator.probe(device))
+        await asyncio.sleep(0)
+        requests = [coordinator.probe(device, max_age=5) for _ in range(5)]
+        return await asyncio.gather(sweep, *requests)
+
+    results = asyncio.run(scenario())
+    assert processor.calls == 1
+    assert [result["source"] for result in results] == ["probe"] + ["joined"] * 5
+    assert len({result["checked_at"] for result in results}) == 1
+
+    cached = asyncio.run(coordinator.probe(device, max_age=5))
+    assert (cached["source"], processor.calls) == ("cache", 1)
+    assert asyncio.run(coordinator.probe(device))["source"] == "probe"
+    assert processor.calls == 2
+
+
+def test_probe_only_request_does_not_swallow_sweep_start():
+    """測試 /Probe 的只探測請求可加入巡檢探測，巡檢遇到進行中的只探測請求則另外探測以送出 /start"""
+    processor = FakeProcessor()
+    coordinator = ProbeCoordinator(processor, freshness=0)
+    device = SimpleNamespace(proxyid=1)
+
+    async def scenario(first_start):
+        first = asyncio.create_task(coordinator.probe(device, max_age=0, start=first_start))
+        await asyncio.sleep(0)
+        second = coordinator.probe(device, start=not first_start)
+        return await asyncio.gather(first, second)
+
+    results = asyncio.run(scenario(first_start=True))
+    assert [result["source"] for result in results] == ["probe", "joined"]
+    assert processor.starts == [True]
+
+    results = asyncio.run(scenario(first_start=False))
+    assert [result["source"] for result in results] == ["probe", "probe"]
+    assert processor.starts == [True, False, True]
@@ -0,0 +1,56 @@
+import threading
+from fastapi.testclient import TestClient
+from app.config_mqtt import settings
+from app.main import app
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_admin_endpoints_disabled_by_default():
+    """測試管理端點未啟用時回應 404"""
+    client = TestClient(app)
+    assert client.get("/admin/profile", params={"seconds": 0.1}).status_code == 404
+    assert client.post("/admin/tracemalloc/start").status_code == 404
+
+
+def test_sampling_profile_covers_other_threads(monkeypatch):
+    """測試取樣分析涵蓋其他執行緒，輸出 collapsed stack"""
+    monkeypatch.setattr(settings, "ADMIN_ENDPOINTS_ENABLED", True)
+    client = TestClient(app)
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin, args=(stop,), name="spin-worker")
+    worker.start()
+    try:
+        response = client.get("/admin/profile", params={"seconds": 0.3, "interval_ms": 5})
+    finally:
+        stop.set()
+        worker.join()
+
+    assert response.status_code == 200
+    lines = [line for line in response.text.splitlines() if line.startswith("spin-worker;")]
+    assert any("_spin (tests/test_profiler.py:" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    assert client.get("/admin/profile", params={"seconds": 0.1, "mode": "cprofile"}).status_code == 200
+    assert client.get("/admin/profile", params={"seconds": settings.PROFILE_MAX_SECONDS + 1}).status_code == 400
+    assert client.get("/admin/profile", params={"seconds": 0.1, "mode": "cprofile", "sort": "bogus"}).status_code == 422
+
+
+def test_tracemalloc_diff_reports_growth(monkeypatch):
+    """測試 tracemalloc 快照比較找出成長的配置位置"""
+    monkeypatch.setattr(settings, "ADMIN_ENDPOINTS_ENABLED", True)
+    client = TestClient(app)
+    assert client.get("/admin/tracemalloc/diff").status_code == 409
+
+    assert client.post("/admin/tracemalloc/start").json()["tracing"] is True
+    try:
+        retained = [bytes(1024) for _ in range(2000)]
+        top = client.get("/admin/tracemalloc/diff", params={"limit": 10}).json()["top"]
+        growth = [item for item in top if item["location"][0].startswith("tests/test_profiler.py:")]
+        assert growth and growth[0]["size_diff_bytes"] >= 2000 * 1024
+        assert len(retained) == 2000
+    finally:
+        assert client.post("/admin/tracemalloc/stop").json()["tracing"] is False
@@ -0,0 +1,36 @@
+import asyncio
+from benchmarks.simulator import STATE_REFUSED, FleetModel, MonitorSimulation
+from benchmarks.virtual_clock import run_virtual
+from app.services.device_processor import device_processor
+
+
+def test_virtual_clock_skips_idle_waits():
+    """測試虛擬時鐘：sleep 與 wait_for 逾時不實際等待"""
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(3600)
+        try:
+            await asyncio.wait_for(asyncio.Event().wait(), 60)
+        except asyncio.TimeoutError:
+            pass
+        loop.advance(10)
+        return loop.time()
+
+    assert run_virtual(scenario(), cpu_scale=0) == 3670
+
+
+def test_simulation_runs_real_sweep_and_detects_outages():
+    """測試模擬器以真實巡檢邏輯偵測故障並統計探測流量"""
+    fleet = FleetModel(20, latency="fixed:2", refused_fraction=0.1, mtbf=120, mttr=60,
+                       failure_mode=STATE_REFUSED, seed=7)
+    simulation = MonitorSimulation(fleet, duration=900, weight=5)
+    report = run_virtual(simulation.run(), cpu_scale=0)
+
+    assert report["devices"] == 100
+    assert report["simulated_devices"] == 20
+    assert report["sweeps"]["completed"] > 10
+    assert report["detection_latency"]["count"] > 0
+    assert report["probe_traffic"]["http_requests_per_s"] > 0
+    # 模擬結束後還原 processor 的網路介面與快取
+    assert device_processor.http_transport is None
+    assert device_processor.device_cache == {}
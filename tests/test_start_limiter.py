@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+from app.services.start_limiter import StartRateLimiter
+
+
+def _device(proxyid, controller_type="E82", remark=None):
+    return SimpleNamespace(proxyid=proxyid, Controller_type=controller_type, remark=remark)
+
+
+def test_excess_starts_are_deferred_in_priority_order():
+    """測試超出權杖的啟動不丟棄，依優先序延後送出，並回報等待佇列"""
+    limiter = StartRateLimiter(rate=100, burst=2, type_rate=0, type_burst=0, type_rates={},
+                               priorities={"critical": 5})
+    immediate, deferred = [], []
+
+    async def start(device):
+        deferred.append(device.proxyid)
+
+    async def scenario():
+        devices = [_device(1), _device(2), _device(3), _device(4), _device(5), _device(6, remark="line-A critical")]
+        for device in devices:
+            if limiter.try_acquire(device):
+                immediate.append(device.proxyid)
+            else:
+                limiter.defer(device, start)
+        limiter.defer(_device(4), start)  # 重複排入只保留一筆
+        queued = [item["proxyid"] for item in limiter.report()["queued"]]
+        for _ in range(50):
+            if len(deferred) == 4:
+                break
+            await asyncio.sleep(0.01)
+        return queued
+
+    queued = asyncio.run(scenario())
+    assert immediate == [1, 2]
+    assert queued == [6, 3, 4, 5]
+    assert deferred == [6, 3, 4, 5]
+
+
+def test_exhausted_controller_type_does_not_block_other_types():
+    """測試某 Controller_type 權杖用完時，其他類型的延後啟動仍立即送出"""
+    limiter = StartRateLimiter(rate=0, burst=0, type_rate=0, type_burst=1, type_rates={"E82": 0.5},
+                               priorities={})
+    started = []
+
+    async def start(device):
+        started.append(device.proxyid)
+
+    async def scenario():
+        assert limiter.try_acquire(_device(1, "E82"))
+        assert not limiter.try_acquire(_device(2, "E82"))
+        limiter.defer(_device(2, "E82"), start)
+        assert not limiter.try_acquire(_device(3, "K25"))  # 佇列非空時一律排隊
+        limiter.defer(_device(3, "K25"), start)
+        await asyncio.sleep(0.05)
+        result = list(started), limiter.is_deferred(2)
+        await limiter.stop()
+        return result
+
+    started_early, still_deferred = asyncio.run(scenario())
+    assert started_early == [3]
+    assert still_deferred
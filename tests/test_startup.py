@@ -0,0 +1,43 @@
+import subprocess
+import sys
+import pytest
+from app.utils.startup import StartupTimer
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_startup_timer_records_phases_relative_to_origin():
+    """測試啟動計時器記錄各階段的開始時間、耗時與失敗原因"""
+    clock = _Clock()
+    timer = StartupTimer(clock=clock)
+    clock.now += 0.5
+    with timer.phase("db_schema"):
+        clock.now += 0.25
+    timer.start("mqtt_connect")
+    with pytest.raises(RuntimeError):
+        with timer.phase("cache_warmup"):
+            clock.now += 0.1
+            raise RuntimeError("database locked")
+    assert not timer.report()["ready"]
+
+    timer.ready()
+    report = timer.report()
+    assert report["ready_ms"] == 850.0
+    assert report["phases"]["db_schema"] == {"start_ms": 500.0, "status": "ok", "duration_ms": 250.0}
+    assert report["phases"]["cache_warmup"]["status"] == "failed"
+    assert report["phases"]["cache_warmup"]["error"] == "database locked"
+    assert report["phases"]["mqtt_connect"]["status"] == "running"
+
+
+def test_profiling_modules_are_not_imported_at_startup():
+    """測試匯入 app.main 不會載入只有管理端點使用的分析模組"""
+    code = ("import sys, app.main; "
+            "print(sorted(m for m in ('pstats', 'cProfile', 'tracemalloc', 'app.utils.profiler') if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
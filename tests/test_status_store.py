@@ -0,0 +1,115 @@
+import asyncio
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.device_processor import device_processor
+from app.services.status_store import VersionedStatusStore
+
+
+def test_version_only_bumps_on_change():
+    """測試內容未變更時版本不遞增"""
+    store = VersionedStatusStore()
+    start = store.version
+    assert store.set(1, {"proxyid": 1, "message": "OK"})
+    assert store.version == start + 1
+    assert not store.update(1, {"message": "OK"})
+    assert store.version == start + 1
+    assert store.update(1, {"message": "NG"})
+    assert store.entry_version(1) == store.version
+
+
+def test_changes_since_returns_changed_and_removed():
+    """測試增量查詢回傳變更與移除的項目"""
+    store = VersionedStatusStore()
+    store.set(1, {"proxyid": 1, "message": "OK"})
+    store.set(2, {"proxyid": 2, "message": "OK"})
+    checkpoint = store.version
+
+    store.update(2, {"message": "NG"})
+    store.remove(1)
+
+    changes = store.changes_since(checkpoint)
+    assert changes["reset"] is False
+    assert changes["changed"] == [{"proxyid": 2, "message": "NG"}]
+    assert changes["removed"] == [1]
+    assert store.changes_since(changes["version"])["changed"] == []
+
+
+def test_changes_since_unknown_version_requests_reset():
+    """測試過舊或未來的版本號要求完整同步"""
+    store = VersionedStatusStore(max_tombstones=1)
+    store.set(1, {"proxyid": 1})
+    store.set(2, {"proxyid": 2})
+    checkpoint = store.version
+    store.remove(1)
+    store.remove(2)  # 墓碑超過上限，proxyid 1 的移除紀錄被修剪
+
+    assert store.changes_since(checkpoint)["reset"] is True
+    assert store.changes_since(store.version + 100)["reset"] is True
+
+
+def test_proxy_status_etag_and_delta():
+    """測試 /ProxyStatus 的 ETag/304 與 since 增量模式"""
+    client = TestClient(app)
+    device_processor.device_status_cache.set(900, {"proxyid": 900, "message": "OK"})
+
+    response = client.get("/ProxyStatus")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    version = int(response.headers["x-status-version"])
+
+    response = client.get("/ProxyStatus", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    # RFC 9110：弱比較、逗號分隔的列表與 *
+    for header in (f"W/{etag}", f'"stale", {etag}', "*"):
+        assert client.get("/ProxyStatus", headers={"If-None-Match": header}).status_code == 304
+    assert client.get("/ProxyStatus", headers={"If-None-Match": '"stale", W/"other"'}).status_code == 200
+
+    device_processor.device_status_cache.update(900, {"message": "NG"})
+    response = client.get("/ProxyStatus", params={"since": version})
+    data = response.json()
+    assert data["changed"] == [{"proxyid": 900, "message": "NG"}]
+    assert data["version"] == version + 1
+
+    device_processor.device_status_cache.remove(900)
+
+
+def test_wait_for_change_wakes_on_update_and_times_out():
+    """測試長輪詢在變更時被喚醒、無變更時逾時"""
+    async def scenario():
+        store = VersionedStatusStore()
+        store.set(1, {"proxyid": 1, "message": "OK"})
+        store.set(2, {"proxyid": 2, "message": "OK"})
+        since = store.version
+
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, store.update, 2, {"message": "NG"})
+        assert await store.wait_for_change(since, timeout=5) is True
+
+        # 只等待 proxyid 1：proxyid 2 的變更不應喚醒
+        since = store.version
+        loop.call_later(0.01, store.update, 2, {"message": "OK"})
+        assert await store.wait_for_change(since, timeout=0.1, key=1) is False
+
+    asyncio.run(scenario())
+
+
+def test_wait_for_pruned_key_returns_immediately_and_events_are_per_loop():
+    """測試指定 key 的紀錄已被修剪時長輪詢立即返回；不同事件迴圈各自建立等待用的 Event"""
+    store = VersionedStatusStore(max_tombstones=1)
+    store.set(1, {"proxyid": 1})
+    store.set(2, {"proxyid": 2})
+    since = store.version
+    store.remove(1)
+    store.remove(2)  # proxyid 1 的墓碑被修剪
+
+    assert store.changed_after(since, key=1)
+    assert asyncio.run(store.wait_for_change(since, timeout=5, key=1)) is True
+
+    async def wait_for_update():
+        current = store.version
+        asyncio.get_running_loop().call_later(0.01, store.set, 3, {"proxyid": 3, "round": current})
+        return await store.wait_for_change(current, timeout=1)
+
+    # 前一個事件迴圈逾時留下的 Event 不會被新的事件迴圈使用
+    assert asyncio.run(store.wait_for_change(store.version, timeout=0.01)) is False
+    assert asyncio.run(wait_for_update()) is True
@@ -0,0 +1,60 @@
+import asyncio
+import json
+from app.config_mqtt import settings
+from app.services.status_store import VersionedStatusStore
+from app.services.status_stream import StatusBroadcaster
+
+
+def test_broadcaster_filters_and_evicts_slow_clients(monkeypatch):
+    """測試推播篩選條件與慢速客戶端中斷"""
+    monkeypatch.setattr(settings, "STATUS_STREAM_BUFFER_SIZE", 2)
+
+    async def scenario():
+        store = VersionedStatusStore()
+        store.set(1, {"proxyid": 1, "controller_type": "E82", "message": "OK"})
+        store.set(2, {"proxyid": 2, "controller_type": "E88", "message": "OK"})
+        broadcaster = StatusBroadcaster(store)
+
+        e82_client = broadcaster.subscribe(controller_types=["E82"])
+        slow_client = broadcaster.subscribe()
+        stream = broadcaster.stream(e82_client)
+
+        snapshot = json.loads((await stream.__anext__())[2])
+        assert [entry["proxyid"] for entry in snapshot["statuses"]] == [1]
+
+        store.update(2, {"message": "NG"})   # 不符合 E82 篩選
+        store.update(1, {"message": "NG"})
+        event_type, version, payload = await stream.__anext__()
+        assert event_type == "change"
+        assert json.loads(payload)["proxyid"] == 1
+
+        # slow_client 從未讀取，第三個事件超過緩衝上限而被中斷
+        store.update(1, {"message": "OK"})
+        assert slow_client.evicted
+        assert broadcaster.subscriber_count == 1
+        assert slow_client.queue.get_nowait()[0] == "evicted"
+        await stream.aclose()
+        assert broadcaster.subscriber_count == 0
+
+    asyncio.run(scenario())
+
+
+def test_sse_subscribes_only_when_streaming_starts():
+    """測試 SSE 在串流開始時才訂閱，客戶端在回應送出前斷線不會留下訂閱"""
+    from types import SimpleNamespace
+    from app.api.routes.stream import stream_proxy_status
+    from app.services.status_stream import status_broadcaster
+
+    async def scenario():
+        before = status_broadcaster.subscriber_count
+        request = SimpleNamespace(headers={})
+        response = await stream_proxy_status(request, proxyid=None, controller_type=None, since=None)
+        assert status_broadcaster.subscriber_count == before  # 尚未開始串流
+
+        body = response.body_iterator
+        assert (await body.__anext__()).startswith("id: ")
+        assert status_broadcaster.subscriber_count == before + 1
+        await body.aclose()  # 客戶端斷線
+        assert status_broadcaster.subscriber_count == before
+
+    asyncio.run(scenario())
@@ -0,0 +1,72 @@
+import asyncio
+import os
+from collections import deque
+import httpx
+from fastapi.testclient import TestClient
+from app.config_mqtt import settings
+from app.main import app
+from app.models.device import Device
+from app.services.device_processor import device_processor
+from app.utils.tracing import Tracer, to_otlp, tracer
+
+
+def test_spans_nest_and_respect_sampling():
+    """測試 span 巢狀關係、proxyid 沿用與取樣決定"""
+    local = Tracer(capacity=100, sample_rate=1.0)
+    with local.child_span("orphan"):
+        pass
+    with local.span("sweep"):
+        with local.span("probe", proxyid=7):
+            with local.child_span("tcp_connect") as span:
+                span.set_attribute("port_open", True)
+        with local.span("probe", proxyid=8, sampled=False):
+            with local.child_span("tcp_connect"):
+                pass
+
+    spans = {span.name: span for span in local.find()}
+    assert [span.name for span in local.find()] == ["sweep", "probe", "tcp_connect"]
+    assert spans["tcp_connect"].proxyid == 7
+    assert spans["tcp_connect"].parent_id == spans["probe"].span_id
+    assert spans["probe"].parent_id == spans["sweep"].span_id
+    assert len({span.trace_id for span in spans.values()}) == 1
+
+    exported = to_otlp(local.find(proxyid=7))["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [span["name"] for span in exported] == ["probe", "tcp_connect"]
+    assert exported[1]["parentSpanId"] == exported[0]["spanId"]
+    assert {"key": "proxyid", "value": {"intValue": "7"}} in exported[1]["attributes"]
+
+
+def test_probe_records_step_spans_queryable_by_proxyid(monkeypatch, tmp_path):
+    """測試設備探測記錄各步驟的 span，並可依 proxyid 查詢"""
+    def handler(request):
+        return httpx.Response(200, json={"message": "OK"})
+
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    monkeypatch.setattr(tracer, "spans", deque(maxlen=1000))
+    monkeypatch.setattr(device_processor, "http_transport", httpx.MockTransport(handler))
+
+    async def port_open(ip, port, timeout=0.5):
+        return True
+
+    monkeypatch.setattr(device_processor, "port_probe", port_open)
+    device = Device(proxyid=9101, proxy_ip="192.0.2.10", proxy_port=8080, Controller_type="E82",
+                    remark="trace", enable=1)
+
+    result = asyncio.run(device_processor.check_proxy_health(device))
+    assert result["healthy"] is True
+
+    client = TestClient(app)
+    traces = client.get("/debug/traces", params={"proxyid": 9101}).json()["traces"]
+    assert len(traces) == 1
+    names = [span["name"] for span in traces[0]["spans"]]
+    assert names[0] == "probe"
+    assert {"tcp_connect", "http.health", "start", "http.start", "cache_update", "mqtt_publish"} <= set(names)
+    assert client.get("/debug/traces", params={"proxyid": 9102}).json()["traces"] == []
+
+    trace_id = traces[0]["trace_id"]
+    assert len(client.get("/debug/traces", params={"trace_id": trace_id}).json()["traces"]) == 1
+    assert client.get("/debug/traces", params={"trace_id": "not-a-trace"}).status_code == 422
+
+    monkeypatch.setattr(settings, "TRACE_EXPORT_DIR", str(tmp_path))
+    exported = client.post("/debug/traces/export", params={"proxyid": 9101}).json()
+    assert exported["spans"] == len(names) and os.path.exists(exported["path"])